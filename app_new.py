@@ -1,13 +1,17 @@
 """
 ChatGPT Team 自动邀请系统 - 主应用
 """
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, Response, stream_with_context, make_response
 from curl_cffi import requests as cf_requests
 import json
 import sqlite3
 from functools import wraps
-from database import init_db, Team, AccessKey, Invitation, AutoKickConfig, KickLog, LoginAttempt, MemberNote, Source, MaterialShare, ProxyAddress
-from utils import get_proxies_by_account
+from contextlib import contextmanager
+import concurrent.futures
+from database import init_db, Team, AccessKey, Invitation, AutoKickConfig, KickLog, LoginAttempt, MemberNote, MemberRoster, Source, MaterialShare, ProxyAddress
+from database import get_db, begin_unit_of_work, commit_unit_of_work, end_unit_of_work, flush_unit_of_work, SeatReservation, TEAM_CAPACITY
+from chatgpt_client import ChatGPTTeamClient
+from members_cache import members_cache, FRESH
 from datetime import datetime, timedelta
 import time
 import pytz
@@ -16,6 +20,9 @@ import uuid
 from werkzeug.utils import secure_filename
 from config import *
 from auto_kick_service import auto_kick_service
+from member_sync_service import member_sync_service, sync_team_members, get_team_members
+from temp_expiry import temp_expiry_scheduler
+from jobs import job_registry
 import threading
 from database import SystemConfig
 import mail_service
@@ -69,6 +76,41 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB limit to allow 5MB f
 init_db()
 
 
+@app.before_request
+def open_unit_of_work():
+    """每个请求开启一个工作单元：请求内所有模型调用共享一个连接，结束时统一提交"""
+    view = app.view_functions.get(request.endpoint)
+    if view is not None and getattr(view, 'no_unit_of_work', False):
+        return
+    begin_unit_of_work()
+
+
+@app.after_request
+def commit_request_unit_of_work(response):
+    """
+    响应发出前提交工作单元，提交失败时改为返回 500，避免告诉客户端成功但实际没有保存
+    (视图抛出异常时不会走到这里，由 close_unit_of_work 回滚)
+    """
+    try:
+        commit_unit_of_work()
+    except sqlite3.Error as e:
+        print(f"❌ 工作单元提交失败: {e}")
+        response = make_response(jsonify({"success": False, "error": "保存数据失败，请重试"}), 500)
+    return response
+
+
+@app.teardown_appcontext
+def close_unit_of_work(exc):
+    """请求结束：有异常回滚，归还连接"""
+    end_unit_of_work(exc)
+
+
+def no_unit_of_work(f):
+    """显式退出请求级工作单元的装饰器（每次模型调用各自提交）"""
+    f.no_unit_of_work = True
+    return f
+
+
 def admin_required(f):
     """管理员权限装饰器"""
     @wraps(f)
@@ -79,155 +121,99 @@ def admin_required(f):
     return decorated_function
 
 
-def invite_to_team(access_token, account_id, email, team_id=None):
-    """调用 ChatGPT API 邀请成员"""
-    url = f"https://chatgpt.com/backend-api/accounts/{account_id}/invites"
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "content-type": "application/json",
-        "oai-device-id": "a9c9e9a0-f72d-4fbc-800e-2d0e1e3c3b54",
-        "oai-language": "zh-CN",
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-    
-    payload = {
-        "email_addresses": [email],
-        "role": "standard-user",
-        "resend_emails": False
+def get_page_args(params):
+    """
+    从请求参数 (request.args 或 JSON) 中读取通用的分页参数
+    cursor 为上一页返回的 next_cursor；date_from/date_to 为 UTC 时间，范围 [date_from, date_to)
+    """
+    try:
+        limit = int(params.get('limit') or PAGE_SIZE)
+    except (TypeError, ValueError):
+        limit = PAGE_SIZE
+    return {
+        'page_cursor': params.get('cursor') or None,
+        'limit': limit,
+        'date_from': params.get('date_from') or None,
+        'date_to': params.get('date_to') or None,
     }
-    
+
+
+def get_int_arg(params, key):
+    """读取可选的整数筛选参数，为空或格式不对时返回 None"""
     try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.post(url, headers=headers, json=payload, impersonate="chrome110", proxies=proxies)
-        
-        if response.status_code in [200, 201]:
-            data = response.json()
-            invites = data.get('account_invites', [])
-            # 成功时重置错误计数
-            if team_id:
-                Team.reset_token_error(team_id)
-            if invites:
-                return {"success": True, "invite_id": invites[0].get('id')}
-            return {"success": True}
-        elif response.status_code == 401:
-            # 检测到401，增加错误计数
-            if team_id:
-                status = Team.increment_token_error(team_id)
-                if status and status['token_status'] == 'expired':
-                    return {
-                        "success": False, 
-                        "error": "Token已过期，请更新该Team的Token",
-                        "error_code": "TOKEN_EXPIRED",
-                        "status_code": 401
-                    }
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-        else:
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+        return int(params.get(key)) if params.get(key) not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def invite_to_team(access_token, account_id, email, team_id=None):
+    """
+    调用 ChatGPT API 邀请成员
+    email 也可以是邮箱列表（一次请求邀请多个邮箱），invite_ids 为 {小写邮箱: invite_id}
+    """
+    result = ChatGPTTeamClient(access_token, account_id).invite(email)
+
+    if result.success:
+        invites = (result.data or {}).get('account_invites', [])
+        # 成功时重置错误计数
+        if team_id:
+            Team.reset_token_error(team_id)
+            # 成员列表即将变化，下次读取时后台刷新
+            members_cache.expire(team_id)
+        if invites:
+            return {
+                "success": True,
+                "invite_id": invites[0].get('id'),
+                "invite_ids": {(inv.get('email_address') or '').lower(): inv.get('id') for inv in invites}
+            }
+        return {"success": True}
+    if result.status_code is None:
+        return {"success": False, "error": result.error}
+    if result.unauthorized and team_id:
+        # 检测到401，增加错误计数
+        status = Team.increment_token_error(team_id)
+        if status and status['token_status'] == 'expired':
+            return {
+                "success": False, 
+                "error": "Token已过期，请更新该Team的Token",
+                "error_code": "TOKEN_EXPIRED",
+                "status_code": 401
+            }
+    return {"success": False, "error": result.error, "status_code": result.status_code}
 
 
 def cancel_invite_from_openai(access_token, account_id, email):
     """调用 ChatGPT API 撤销邀请"""
-    url = f"https://chatgpt.com/backend-api/accounts/{account_id}/invites"
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "content-type": "application/json",
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-    
-    payload = {
-        "email_address": email
-    }
-    
-    try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.delete(url, headers=headers, json=payload, impersonate="chrome110", proxies=proxies)
-        
-        if response.status_code in [200, 204]:
-            return {"success": True}
-        else:
-            return {"success": False, "error": response.text}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    result = ChatGPTTeamClient(access_token, account_id).cancel_invite(email)
+    if result.success:
+        return {"success": True}
+    return {"success": False, "error": result.error}
 
 
 def get_team_subscription(access_token, account_id):
     """获取 Team 订阅信息"""
-    url = f"https://chatgpt.com/backend-api/subscriptions?account_id={account_id}"
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "content-type": "application/json",
-        "oai-device-id": "a9c9e9a0-f72d-4fbc-800e-2d0e1e3c3b54",
-        "oai-language": "zh-CN",
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-    
-    try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.get(url, headers=headers, impersonate="chrome110", proxies=proxies)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                "success": True, 
-                "active_start": convert_to_beijing_time(data.get('active_start')),
-                "active_until": convert_to_beijing_time(data.get('active_until')),
-                "will_renew": data.get('will_renew', True)
-            }
-        else:
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    result = ChatGPTTeamClient(access_token, account_id).get_subscription()
+    if result.success:
+        data = result.data or {}
+        return {
+            "success": True, 
+            "active_start": convert_to_beijing_time(data.get('active_start')),
+            "active_until": convert_to_beijing_time(data.get('active_until')),
+            "will_renew": data.get('will_renew', True)
+        }
+    if result.status_code is None:
+        return {"success": False, "error": result.error}
+    return {"success": False, "error": result.error, "status_code": result.status_code}
 
 
 def cancel_subscription_from_openai(access_token, account_id):
     """调用 ChatGPT API 取消订阅"""
-    url = "https://chatgpt.com/backend-api/subscriptions/cancel"
-    
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "content-type": "application/json",
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin/billing",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-    
-    payload = {
-        "account_id": account_id
-    }
-    
-    try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.post(url, headers=headers, json=payload, impersonate="chrome110", proxies=proxies)
-        
-        if response.status_code == 200:
-            return {"success": True}
-        else:
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    result = ChatGPTTeamClient(access_token, account_id).cancel_subscription()
+    if result.success:
+        return {"success": True}
+    if result.status_code is None:
+        return {"success": False, "error": result.error}
+    return {"success": False, "error": result.error, "status_code": result.status_code}
 
 
 # ==================== 用户端路由 ====================
@@ -285,8 +271,9 @@ def join_team():
 
         # 2. 只选择通过我们系统邀请的成员数 < 4 的Team
         available_teams = []
+        success_counts = Invitation.get_success_counts()
         for team in all_teams:
-            invited_count = Invitation.get_success_count_by_team(team['id'])
+            invited_count = success_counts.get(team['id'], 0)
             if invited_count < 4:
                 team['invited_count'] = invited_count  # 保存邀请数
                 available_teams.append(team)
@@ -303,15 +290,10 @@ def join_team():
     tried_teams = []
     last_error = None
 
-    # 遍历可用Team，最多尝试3次
-    for i, team in enumerate(available_teams):
-        if i >= max_attempts:
-            break  # 限制最多尝试3次
-
+    # 并发获取前 max_attempts 个候选Team的成员列表（只用新鲜期内的成员缓存），按返回顺序挑选有空位的Team
+    for team, members_result in probe_team_members(available_teams[:max_attempts]):
         tried_teams.append(team['name'])
 
-        # 检查实际成员数（API获取）
-        members_result = get_team_members(team['access_token'], team['account_id'], team['id'])
         if not members_result['success']:
             last_error = f"无法获取{team['name']}成员列表"
             continue
@@ -343,92 +325,100 @@ def join_team():
                 "email": email
             })
 
-        # 尝试邀请
-        result = invite_to_team(
-            team['access_token'],
-            team['account_id'],
-            email,
-            team['id']
-        )
-
-        if result['success']:
-            # 邀请成功！计算过期时间
-            temp_expire_at = None
-            if key_info['is_temp'] and key_info['temp_hours'] > 0:
-                now = datetime.utcnow()
-                temp_expire_at = (now + timedelta(hours=key_info['temp_hours'])).strftime('%Y-%m-%d %H:%M:%S')
+        # 邀请前先预占名额（并发请求可能刚占用了最后一个位置）
+        with reserve_seat(team['id'], email) as reservation_id:
+            if not reservation_id:
+                last_error = f"{team['name']}名额已被占用"
+                continue
 
-            # 记录邀请
-            Invitation.create(
-                team_id=team['id'],
-                email=email,
-                key_id=key_info['id'],
-                invite_id=result.get('invite_id'),
-                status='success',
-                is_temp=key_info['is_temp'],
-                temp_expire_at=temp_expire_at
+            # 尝试邀请
+            result = invite_to_team(
+                team['access_token'],
+                team['account_id'],
+                email,
+                team['id']
             )
 
-            # 邀请码使用一次后立即取消
-            AccessKey.cancel(key_info['id'])
-            Team.update_last_invite(team['id'])
-
-            message = f"🎉 加入成功！\n\n📧 请立即查收邮箱 {email} 的邀请邮件并确认加入。\n\n💡 提示：邮件可能在垃圾箱中，请注意查看。"
-            if key_info['is_temp'] and key_info['temp_hours'] > 0:
-                message += f"\n\n⏰ 注意：这是一个 {key_info['temp_hours']} 小时临时邀请，到期后如果管理员未确认，将自动踢出。"
-
-            if len(tried_teams) > 1:
-                message += f"\n\n💡 尝试了 {len(tried_teams)} 个Team后成功"
-
-            return jsonify({
-                "success": True,
-                "message": message,
-                "team_name": team['name'],
-                "email": email
-            })
-        else:
-            # 邀请失败，验证是否实际成功
-            import time
-            time.sleep(1)
+            if result['success']:
+                # 邀请成功！计算过期时间
+                temp_expire_at = None
+                if key_info['is_temp'] and key_info['temp_hours'] > 0:
+                    now = datetime.utcnow()
+                    temp_expire_at = (now + timedelta(hours=key_info['temp_hours'])).strftime('%Y-%m-%d %H:%M:%S')
 
-            # 检查pending列表
-            pending_result = get_pending_invites(team['access_token'], team['account_id'])
-            if pending_result['success']:
-                pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
-                if email.lower() in pending_emails:
-                    # 实际已成功
-                    temp_expire_at = None
-                    if key_info['is_temp'] and key_info['temp_hours'] > 0:
-                        now = datetime.utcnow()
-                        temp_expire_at = (now + timedelta(hours=key_info['temp_hours'])).strftime('%Y-%m-%d %H:%M:%S')
+                # 记录邀请
+                Invitation.create(
+                    team_id=team['id'],
+                    email=email,
+                    key_id=key_info['id'],
+                    invite_id=result.get('invite_id'),
+                    status='success',
+                    is_temp=key_info['is_temp'],
+                    temp_expire_at=temp_expire_at
+                )
+                SeatReservation.commit(reservation_id)
 
-                    Invitation.delete_by_email(team['id'], email)
-                    Invitation.create(
-                        team_id=team['id'],
-                        email=email,
-                        key_id=key_info['id'],
-                        invite_id=None,
-                        status='success',
-                        is_temp=key_info['is_temp'],
-                        temp_expire_at=temp_expire_at
-                    )
-                    AccessKey.cancel(key_info['id'])
-                    Team.update_last_invite(team['id'])
+                # 邀请码使用一次后立即取消
+                AccessKey.cancel(key_info['id'])
+                Team.update_last_invite(team['id'])
 
-                    message = f"🎉 加入成功！（验证确认）\n\n📧 请立即查收邮箱 {email} 的邀请邮件并确认加入。"
-                    if key_info['is_temp'] and key_info['temp_hours'] > 0:
-                        message += f"\n\n⏰ 注意：这是一个 {key_info['temp_hours']} 小时临时邀请。"
+                message = f"🎉 加入成功！\n\n📧 请立即查收邮箱 {email} 的邀请邮件并确认加入。\n\n💡 提示：邮件可能在垃圾箱中，请注意查看。"
+                if key_info['is_temp'] and key_info['temp_hours'] > 0:
+                    message += f"\n\n⏰ 注意：这是一个 {key_info['temp_hours']} 小时临时邀请，到期后如果管理员未确认，将自动踢出。"
 
-                    return jsonify({
-                        "success": True,
-                        "message": message,
-                        "team_name": team['name'],
-                        "email": email
-                    })
+                if len(tried_teams) > 1:
+                    message += f"\n\n💡 尝试了 {len(tried_teams)} 个Team后成功"
 
-            # 确实失败，记录错误并尝试下一个Team
-            last_error = f"{team['name']}: {result.get('error', '未知错误')}"
-            continue
+                return jsonify({
+                    "success": True,
+                    "message": message,
+                    "team_name": team['name'],
+                    "email": email
+                })
+            else:
+                # 邀请失败，验证是否实际成功
+                import time
+                time.sleep(1)
+
+                # 检查pending列表
+                pending_result = get_pending_invites(team['access_token'], team['account_id'])
+                if pending_result['success']:
+                    pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
+                    if email.lower() in pending_emails:
+                        # 实际已成功
+                        temp_expire_at = None
+                        if key_info['is_temp'] and key_info['temp_hours'] > 0:
+                            now = datetime.utcnow()
+                            temp_expire_at = (now + timedelta(hours=key_info['temp_hours'])).strftime('%Y-%m-%d %H:%M:%S')
+
+                        Invitation.delete_by_email(team['id'], email)
+                        Invitation.create(
+                            team_id=team['id'],
+                            email=email,
+                            key_id=key_info['id'],
+                            invite_id=None,
+                            status='success',
+                            is_temp=key_info['is_temp'],
+                            temp_expire_at=temp_expire_at
+                        )
+                        SeatReservation.commit(reservation_id)
+                        AccessKey.cancel(key_info['id'])
+                        Team.update_last_invite(team['id'])
+
+                        message = f"🎉 加入成功！（验证确认）\n\n📧 请立即查收邮箱 {email} 的邀请邮件并确认加入。"
+                        if key_info['is_temp'] and key_info['temp_hours'] > 0:
+                            message += f"\n\n⏰ 注意：这是一个 {key_info['temp_hours']} 小时临时邀请。"
+
+                        return jsonify({
+                            "success": True,
+                            "message": message,
+                            "team_name": team['name'],
+                            "email": email
+                        })
+
+                # 确实失败，记录错误并尝试下一个Team
+                last_error = f"{team['name']}: {result.get('error', '未知错误')}"
+                continue
 
     # 所有Team都试过了，仍然失败
     return jsonify({
@@ -579,14 +569,15 @@ def upload_material():
 def list_materials():
     """
     素材查询接口
-    - 参数: category (可选), source (可选)
-    - 返回: 包含完整 URL 的列表，按时间倒序
+    - 参数: category (可选), source (可选), cursor/limit/date_from/date_to (分页)
+    - 返回: 包含完整 URL 的列表，按时间倒序；next_cursor 不为空时还有下一页
     """
     category = request.args.get('category')
     source = request.args.get('source')
     
     try:
-        materials = MaterialShare.get_all(category=category, source=source)
+        page = MaterialShare.get_page(category=category, source=source, **get_page_args(request.args))
+        materials = page['items']
         
         # 处理返回数据
         # 1. 拼接完整 URL
@@ -603,7 +594,9 @@ def list_materials():
             # 格式化时间
             item['created_at_str'] = convert_to_beijing_time(item['created_at'])
             
-        return jsonify({"success": True, "data": materials})
+        return jsonify({"success": True, "data": materials, "next_cursor": page['next_cursor']})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -873,8 +866,13 @@ def update_team_proxy(team_id):
 @app.route('/api/admin/teams', methods=['GET'])
 @admin_required
 def get_teams():
-    """获取所有 Teams (新逻辑: 读取数据库成员数，不实时查询)"""
+    """
+    获取所有 Teams (新逻辑: 读取数据库成员数，不实时查询)
+    每个 Team 只附带邀请概况（按状态计数 + 最近几条），完整邀请列表通过 /api/admin/teams/<id>/invitations 按需加载
+    """
     teams = Team.get_all()
+    latest = min(max(request.args.get('invitations', 5, type=int), 0), 50)
+    summaries = Invitation.get_team_summaries(latest)
 
     # 为每个 Team 添加成员信息
     for team in teams:
@@ -885,16 +883,26 @@ def get_teams():
             member_count = 0
             
         team['member_count'] = member_count
-        
-        # 仍然获取邀请记录，以防前端其他地方需要
-        invitations = Invitation.get_by_team(team['id'])
-        team['invitations'] = invitations
+
+        summary = summaries.get(team['id'], {'total': 0, 'counts': {}, 'latest': []})
+        team['invitation_total'] = summary['total']
+        team['invitation_counts'] = summary['counts']
+        team['invitations'] = summary['latest']
         
         team['available_slots'] = max(0, 4 - team['member_count'])
 
     return jsonify({"success": True, "teams": teams})
 
 
+@app.route('/api/admin/teams/<int:team_id>/invitations', methods=['GET'])
+@admin_required
+def get_team_invitations(team_id):
+    """获取单个 Team 的完整邀请列表（团队列表中只返回概况，这里按需加载）"""
+    if not Team.get_by_id(team_id):
+        return jsonify({"success": False, "error": "Team 不存在"}), 404
+    return jsonify({"success": True, "invitations": Invitation.get_by_team(team_id)})
+
+
 @app.route('/api/admin/teams', methods=['POST'])
 @admin_required
 def create_team():
@@ -1054,6 +1062,58 @@ def update_team_token(team_id):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def relogin_team_job(job, team, email, password, proxy_str):
+    """
+    后台任务：用账号密码重新登录 Team 并更新 Token
+    登录流程包含多次跳转、固定等待和 PoW 计算，耗时十秒以上，不能占用请求线程
+    失败时抛出异常，错误信息作为任务的 error 返回给前端
+    """
+    team_id = team['id']
+    from login_package.login import login
+    job.advance(0, '登录中')
+    print(f"尝试重新登录 Team {team_id}: {email} (Proxy: {'Yes' if proxy_str else 'No'})")
+    session_data = login(email, password, proxy_str=proxy_str)
+    if not session_data:
+        raise Exception('登录失败，未获取到 Session')
+
+    # login 返回 Session 信息的 JSON 字符串，兼容直接返回 dict 的情况
+    access_token = None
+    if isinstance(session_data, dict):
+        access_token = session_data.get('accessToken')
+    elif isinstance(session_data, str):
+        try:
+            data = json.loads(session_data)
+            if isinstance(data, dict):
+                access_token = data.get('accessToken')
+        except ValueError:
+            pass
+
+    if not access_token:
+        print(f"解析 Session 失败，类型: {type(session_data)}")
+        if isinstance(session_data, dict):
+            print(f"Keys: {session_data.keys()}")
+        raise Exception('登录成功但无法解析 accessToken')
+
+    Team.update_token(team_id, access_token)
+
+    # 刷新关联信息
+    job.advance(0, '刷新成员与订阅信息')
+    members_result = get_team_members(access_token, team['account_id'], team_id)
+    if members_result['success']:
+        members = members_result.get('members', [])
+        non_owner_members = [m for m in members if m.get('role') != 'account-owner']
+        Team.update_member_count(team_id, len(non_owner_members))
+
+    sub_info = get_team_subscription(access_token, team['account_id'])
+    if sub_info['success']:
+        Team.update_subscription_info(team_id, sub_info['active_start'], sub_info['active_until'], sub_info.get('will_renew'))
+
+    return {'message': '重新登录成功，Token 已更新'}
+
+
+job_registry.set_limit('relogin', RELOGIN_WORKERS)
+
+
 @app.route('/api/admin/teams/<int:team_id>/relogin', methods=['POST'])
 @admin_required
 def relogin_team(team_id):
@@ -1061,8 +1121,8 @@ def relogin_team(team_id):
     重新登录 Team
     1. 获取 Team 信息 (备注、代理)
     2. 解析账号密码
-    3. 调用登录接口
-    4. 更新 Token
+    3. 发起后台登录任务，立即返回任务信息，前端通过 /api/admin/jobs/<job_id> 轮询结果
+    同时进行的登录数由 RELOGIN_WORKERS 限制，同一个 Team 重复提交时返回进行中的任务
     """
     # 1. 获取 Team 信息
     team = Team.get_by_id(team_id)
@@ -1096,69 +1156,9 @@ def relogin_team(team_id):
             
             proxy_str = f"{protocol},{ip},{port},{username},{pwd}"
 
-    # 4. 调用登录接口
-    try:
-        from login_package.login import login
-        print(f"尝试重新登录 Team {team_id}: {email} (Proxy: {'Yes' if proxy_str else 'No'})")
-        session_data = login(email, password, proxy_str=proxy_str)
-        
-        if session_data:
-            # 5. 更新 Token
-            # session_data 可能是 dict 也可能是 json 字符串
-            # 尝试解析，如果失败则假设它是 accessToken 字符串? 
-            # 或者是直接包含accessToken的dict?
-            # 用户提示: "login 函数返回的就是一个json字符串 可以直接使用的"
-            # 这里的 "json字符串" 可能指 json.loads 后得到的 dict，或者就是 str
-            
-            access_token = None
-            if isinstance(session_data, dict):
-                 access_token = session_data.get('accessToken')
-            elif isinstance(session_data, str):
-                # 尝试解析 JSON
-                try:
-                    data = json.loads(session_data)
-                    if isinstance(data, dict):
-                         access_token = data.get('accessToken')
-                except:
-                     pass
-            
-            # 如果上面没解析出来，且 session_data 本身就是 accessToken 字符串 (虽然不太可能，做个防御)
-            # 或者 login 返回的是整个 Session 信息的 JSON 结构
-            
-            if not access_token:
-                 # 兜底：打印一下看看结构，或者报错
-                 print(f"解析 Session 失败，类型: {type(session_data)}")
-                 if isinstance(session_data, dict):
-                     print(f"Keys: {session_data.keys()}")
-                 
-                 return jsonify({'success': False, 'error': '登录成功但无法解析 accessToken'})
-
-            if access_token:
-                Team.update_token(team_id, access_token)
-                
-                # 刷新关联信息
-                # 刷新成员数
-                members_result = get_team_members(access_token, team['account_id'], team_id)
-                if members_result['success']:
-                    members = members_result.get('members', [])
-                    non_owner_members = [m for m in members if m.get('role') != 'account-owner']
-                    Team.update_member_count(team_id, len(non_owner_members))
-                    
-                # 刷新订阅信息
-                sub_info = get_team_subscription(access_token, team['account_id'])
-                if sub_info['success']:
-                    Team.update_subscription_info(team_id, sub_info['active_start'], sub_info['active_until'], sub_info.get('will_renew'))
-
-                return jsonify({'success': True, 'message': '重新登录成功，Token 已更新'})
-            else:
-                 return jsonify({'success': False, 'error': '登录成功但未获取到 accessToken'})
-        else:
-            return jsonify({'success': False, 'error': '登录失败，未获取到 Session'})
-            
-    except Exception as e:
-        print(f"重新登录异常: {e}")
-        # 如果是已知错误信息（不包含 traceback 的简单消息），直接显示
-        return jsonify({'success': False, 'error': str(e)})
+    # 4. 发起后台登录任务
+    job = job_registry.start('relogin', relogin_team_job, team, email, password, proxy_str, key=team_id)
+    return jsonify({'success': True, 'job': job.to_dict()})
 
 
 
@@ -1380,9 +1380,18 @@ def delete_invite_key(key_id):
 @app.route('/api/admin/invitations', methods=['GET'])
 @admin_required
 def get_invitations():
-    """获取所有邀请记录"""
-    invitations = Invitation.get_all()
-    return jsonify({"success": True, "invitations": invitations})
+    """分页获取邀请记录，支持按状态、Team、来源、时间范围筛选"""
+    try:
+        page = Invitation.get_page(
+            status=request.args.get('status') or None,
+            team_id=get_int_arg(request.args, 'team_id'),
+            source=request.args.get('source') or None,
+            email=request.args.get('email') or None,
+            **get_page_args(request.args)
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "invitations": page['items'], "next_cursor": page['next_cursor']})
 
 
 @app.route('/api/admin/invitations/<int:invitation_id>/confirm', methods=['POST'])
@@ -1396,96 +1405,93 @@ def confirm_invitation(invitation_id):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-def get_team_members(access_token, account_id, team_id=None):
-    """获取 Team 成员列表"""
-    url = f"https://chatgpt.com/backend-api/accounts/{account_id}/users"
+def get_cached_team_members(team, allow_stale=True):
+    """
+    只读场景获取 Team 成员列表：优先使用成员缓存
+    缓存已过新鲜期时先返回旧数据并在后台刷新 (allow_stale=False 时改为同步拉取)，没有缓存时同步拉取
+    """
+    members, state = members_cache.lookup(team['id'])
+    if state == FRESH or (state and allow_stale):
+        if state != FRESH:
+            members_cache.revalidate(team['id'], lambda: get_team_members(
+                team['access_token'], team['account_id'], team['id'], background=True))
+        return {"success": True, "members": members, "cached": True}
+    return get_team_members(team['access_token'], team['account_id'], team['id'])
+
 
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
+# 并发探测候选 Team 成员列表的线程池
+_probe_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TEAM_PROBE_WORKERS, thread_name_prefix='team-probe')
+
+
+def probe_team_members(teams):
+    """
+    并发获取多个候选 Team 的成员列表，按完成顺序逐个产出 (team, members_result)
+    用于邀请前判断空位和是否已在组内，只使用新鲜期内的缓存，过期的缓存同步重新拉取
+    缓存命中的 Team 不占用线程；调用方提前结束遍历时，剩余请求在后台完成并写入成员缓存
+    """
+    cached, missing = [], []
+    for team in teams:
+        (cached if members_cache.lookup(team['id'])[1] == FRESH else missing).append(team)
 
+    futures = {}
+    if missing:
+        # 工作线程有自己的数据库连接，先提交当前请求的写入，避免互相等待写锁
+        flush_unit_of_work()
+        futures = {_probe_executor.submit(get_cached_team_members, team, False): team for team in missing}
+
+    for team in cached:
+        yield team, get_cached_team_members(team, allow_stale=False)
+
+    for future in concurrent.futures.as_completed(futures):
+        team = futures[future]
+        try:
+            members_result = future.result()
+        except Exception as e:
+            members_result = {"success": False, "error": str(e)}
+        yield team, members_result
+
+
+@contextmanager
+def reserve_seat(team_id, email):
+    """
+    邀请前在数据库中原子地预占 Team 的一个名额，yield 预占 id（已满时为 None）
+    邀请记录写入后调用 SeatReservation.commit 转正；退出时释放预占，
+    释放走独立事务，会先提交当前工作单元，此后其他请求统计名额时已能看到新的邀请记录
+    """
+    reservation_id = SeatReservation.claim(team_id, email)
     try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.get(url, headers=headers, impersonate="chrome110", proxies=proxies)
-        if response.status_code == 200:
-            data = response.json()
-            # 成功时重置检查成员的错误计数
-            if team_id:
-                Team.reset_member_check_error(team_id)
-            return {"success": True, "members": data.get('items', [])}
-        elif response.status_code == 401:
-            # 检测到401，增加检查成员的错误计数（10分钟内超过3次才标记为过期）
-            if team_id:
-                status = Team.increment_member_check_error(team_id)
-                if status and status['token_status'] == 'expired':
-                    return {
-                        "success": False,
-                        "error": "Token已过期（检查成员失败次数过多），请更新该Team的Token",
-                        "error_code": "TOKEN_EXPIRED",
-                        "status_code": 401
-                    }
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-        else:
-            return {"success": False, "error": response.text, "status_code": response.status_code}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+        yield reservation_id
+    finally:
+        if reservation_id:
+            SeatReservation.release(reservation_id)
 
 
 def get_pending_invites(access_token, account_id):
     """获取待处理的邀请列表"""
-    url = f"https://chatgpt.com/backend-api/accounts/{account_id}/invites"
-
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
-
-    try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.get(url, headers=headers, impersonate="chrome110", proxies=proxies)
-        if response.status_code == 200:
-            data = response.json()
-            return {"success": True, "invites": data.get('items', [])}
-        else:
-            return {"success": False, "error": response.text}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    result = ChatGPTTeamClient(access_token, account_id).get_pending_invites()
+    if result.success:
+        return {"success": True, "invites": result.data}
+    return {"success": False, "error": result.error}
 
 
-def kick_member(access_token, account_id, user_id):
+def kick_member(access_token, account_id, user_id, team_id=None):
     """踢出成员"""
-    url = f"https://chatgpt.com/backend-api/accounts/{account_id}/users/{user_id}"
-
-    headers = {
-        "accept": "*/*",
-        "accept-language": "zh-CN,zh;q=0.9",
-        "authorization": f"Bearer {access_token}",
-        "chatgpt-account-id": account_id,
-        "origin": "https://chatgpt.com",
-        "referer": "https://chatgpt.com/admin",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-    }
+    result = ChatGPTTeamClient(access_token, account_id).kick(user_id)
+    if result.success:
+        if team_id:
+            # 同步更新成员缓存和 member_notes (邮箱反向索引)
+            members_cache.remove_member(team_id, user_id)
+            MemberNote.delete_by_user_id(team_id, user_id)
+        return {"success": True}
+    return {"success": False, "error": result.error}
 
-    try:
-        proxies = get_proxies_by_account(account_id)
-        response = cf_requests.delete(url, headers=headers, impersonate="chrome110", proxies=proxies)
-        if response.status_code == 200:
-            return {"success": True}
-        else:
-            return {"success": False, "error": response.text}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+
+# 邀请记录状态在成员列表中的显示文本 (success 表示已发送邀请，但未同步到member_notes)
+INVITE_STATUS_TEXT = {
+    'success': '已发送邀请',
+    'failed': '邀请失败',
+    'expired': '已过期',
+}
 
 
 @app.route('/api/admin/teams/<int:team_id>/members', methods=['GET'])
@@ -1496,104 +1502,78 @@ def get_members(team_id):
     if not team:
         return jsonify({"success": False, "error": "Team 不存在"}), 404
 
-    # 1. 获取已加入成员 (Status: 2)
-    db_members = MemberNote.get_all(team_id)
-    
+    # 一次查询取出名册：已加入成员 (Status: 2) 在前，待处理邀请 (Status: 1) 在后
     # 使用字典去重，key为小写邮箱
     merged_members = {}
-    
-    for member_data in db_members:
-        # 构造返回对象
-        member = {
-            'id': member_data['user_id'],
-            'user_id': member_data['user_id'],
-            'email': member_data['email'],
-            'role': member_data['role'],
-            'note': member_data['note'],
-            'source': member_data['source'],
-            # 使用 join_time 如果存在，否则使用 updated_at
-            'created': member_data.get('join_time'),
-            'status': 2,  # 2-已加入
-            'status_text': '已加入'
-        }
-        
-        # 处理时间显示
-        if member['created']:
-             try:
-                member['created_at'] = convert_to_beijing_time(member['created'])
-             except:
-                member['created_at'] = member['created']
-        else:
-             # 如果没有 join_time，尝试使用 updated_at
-             member['created_at'] = convert_to_beijing_time(member_data['updated_at'])
-
-        # 获取邀请信息 (补充 is_temp 等信息)
-        invitation = Invitation.get_by_user_id(team_id, member['user_id'])
-        if invitation:
-            member['invitation_id'] = invitation['id']
-            member['is_temp'] = invitation['is_temp']
-            member['is_confirmed'] = invitation['is_confirmed']
-            member['temp_expire_at'] = invitation['temp_expire_at']
-        else:
-            member['invitation_id'] = None
-            member['is_temp'] = False
-            member['is_confirmed'] = False
-            member['temp_expire_at'] = None
-            
-        email_key = member['email'].strip().lower() if member['email'] else ''
-        if email_key:
-            merged_members[email_key] = member
-        else:
-            # 如果没有邮箱（极少情况），用user_id做key
-            merged_members[member['user_id']] = member
 
-    # 2. 获取待处理邀请 (Status: 1)
-    invitations = Invitation.get_by_team(team_id)
-    
-    for inv in invitations:
-        email = inv.get('email', '').strip().lower()
-        if not email:
+    for row in MemberRoster.get(team_id):
+        if row['kind'] == 'member':
+            member = {
+                'id': row['user_id'],
+                'user_id': row['user_id'],
+                'email': row['email'],
+                'role': row['role'],
+                'note': row['note'],
+                'source': row['source'],
+                # 使用 join_time 如果存在，否则使用 updated_at
+                'created': row['join_time'],
+                'status': 2,  # 2-已加入
+                'status_text': '已加入'
+            }
+
+            # 处理时间显示
+            if member['created']:
+                try:
+                    member['created_at'] = convert_to_beijing_time(member['created'])
+                except:
+                    member['created_at'] = member['created']
+            else:
+                # 如果没有 join_time，尝试使用 updated_at
+                member['created_at'] = convert_to_beijing_time(row['updated_at'])
+
+            # 邀请信息 (补充 is_temp 等信息)，名册中已按 user_id 或邮箱关联最近一条邀请
+            has_invitation = row['invitation_id'] is not None
+            member['invitation_id'] = row['invitation_id']
+            member['is_temp'] = row['is_temp'] if has_invitation else False
+            member['is_confirmed'] = row['is_confirmed'] if has_invitation else False
+            member['temp_expire_at'] = row['temp_expire_at'] if has_invitation else None
+
+            email_key = member['email'].strip().lower() if member['email'] else ''
+            # 如果没有邮箱（极少情况），用user_id做key
+            merged_members[email_key or member['user_id']] = member
             continue
-            
+
+        email = (row['email'] or '').strip().lower()
         # 如果该邮箱已经在 merged_members 中，说明已加入，跳过（以 MemberNote 为准）
-        if email in merged_members:
+        if not email or email in merged_members:
             continue
-            
-        # 确定状态文本
-        status_text = '已邀请'
-        if inv.get('status') == 'success':
-             status_text = '已发送邀请' # 但未同步到member_notes
-        elif inv.get('status') == 'failed':
-             status_text = '邀请失败'
-        elif inv.get('status') == 'expired':
-             status_text = '已过期'
-        
+
         invite_obj = {
-            'id': inv.get('user_id') or f"invite_{inv.get('id')}",
-            'user_id': inv.get('user_id'),
-            'email': inv.get('email'),
+            'id': row['user_id'] or f"invite_{row['invitation_id']}",
+            'user_id': row['user_id'],
+            'email': row['email'],
             'role': 'member', # 默认角色
             'note': '',
-            'source': inv.get('source'),
-            'created': inv.get('created_at'),
+            'source': row['source'],
+            'created': row['invited_at'],
             'status': 1, # 1-已邀请/待进组
-            'status_text': status_text,
-            'invite_status': inv.get('status'),
-            
+            'status_text': INVITE_STATUS_TEXT.get(row['invite_status'], '已邀请'),
+            'invite_status': row['invite_status'],
+
             # 邀请相关字段
-            'invitation_id': inv.get('id'),
-            'is_temp': inv.get('is_temp'),
-            'is_confirmed': inv.get('is_confirmed'),
-            'temp_expire_at': inv.get('temp_expire_at')
+            'invitation_id': row['invitation_id'],
+            'is_temp': row['is_temp'],
+            'is_confirmed': row['is_confirmed'],
+            'temp_expire_at': row['temp_expire_at']
         }
-        
+
         # 处理时间
         if invite_obj['created']:
-             try:
+            try:
                 invite_obj['created_at'] = convert_to_beijing_time(invite_obj['created'])
-             except:
+            except:
                 invite_obj['created_at'] = invite_obj['created']
-                
+
         merged_members[email] = invite_obj
 
     # 转为列表并按时间排序 (倒序)
@@ -1620,50 +1600,8 @@ def refresh_members(team_id):
     result = get_team_members(team['access_token'], team['account_id'], team_id)
 
     if result['success']:
-        members = result.get('members', [])
-        
-        # 更新数据库中的成员数量
-        non_owner_members = [m for m in members if m.get('role') != 'account-owner']
-        Team.update_member_count(team_id, len(non_owner_members))
-
-        # 同步每个成员到 member_notes
-        current_user_ids = []
-        for member in members:
-            user_id = member.get('id')
-            if not user_id:
-                continue
-            
-            current_user_ids.append(user_id)
-            
-            email = member.get('email')
-            role = member.get('role')
-            # API 返回的是 created_time (ISO 8601 string)，例如 "2025-12-11T07:45:52.666554Z"
-            # 数据库需要的是 join_time (Unix timestamp int)
-            created_time_str = member.get('created_time')
-            join_time = None
-            if created_time_str:
-                try:
-                    # 处理 Z 结尾
-                    if created_time_str.endswith('Z'):
-                        created_time_str = created_time_str.replace('Z', '+00:00')
-                    dt = datetime.fromisoformat(created_time_str)
-                    join_time = int(dt.timestamp())
-                except Exception as e:
-                    print(f"Error parsing created_time: {e}")
-                    # 如果解析失败，尝试使用 created 字段（旧版API）或当前时间
-                    join_time = member.get('created')
-            else:
-                 join_time = member.get('created')
-
-            MemberNote.sync_member(team_id, user_id, email, role, join_time)
-            
-        # 删除不在当前列表中的成员（即已退出的成员）
-        MemberNote.delete_not_in(team_id, current_user_ids)
-        
-        # 同步清理失效的邀请记录 (修复成员已踢出但邀请记录占位的问题)
-        current_emails = [m.get('email') for m in members if m.get('email')]
-        Invitation.sync_invitations(team_id, current_emails)
-            
+        # 同步成员数量和 member_notes（删除已退出的成员）
+        sync_team_members(team_id, result.get('members', []))
         return jsonify({"success": True, "message": "成员列表已刷新"})
     else:
         return jsonify(result), result.get('status_code', 500)
@@ -1736,7 +1674,7 @@ def public_kick_member(team_id):
         return jsonify({"success": False, "error": "不是你的客户"}), 403
 
     # 获取成员信息以获取 Email (用于日志和清理)
-    members_result = get_team_members(team['access_token'], team['account_id'], team_id)
+    members_result = get_cached_team_members(team)
     member_email = 'unknown'
     if members_result['success']:
         member = next((m for m in members_result['members'] if m.get('id') == user_id), None)
@@ -1744,11 +1682,10 @@ def public_kick_member(team_id):
             member_email = member.get('email', 'unknown')
     
     # 执行踢人
-    result = kick_member(team['access_token'], team['account_id'], user_id)
+    result = kick_member(team['access_token'], team['account_id'], user_id, team_id)
     
     if result['success']:
-        # 清理本地数据
-        MemberNote.delete_by_user_id(team_id, user_id)
+        # 清理本地数据 (member_notes 已在 kick_member 中删除)
         Invitation.delete_by_email(team_id, member_email)
         
         # 记录日志
@@ -1894,7 +1831,7 @@ def kick_team_member(team_id, user_id):
         return jsonify({"success": False, "error": "Team 不存在"}), 404
 
     # 获取成员信息
-    members_result = get_team_members(team['access_token'], team['account_id'], team_id)
+    members_result = get_cached_team_members(team, allow_stale=False)
     if not members_result['success']:
         return jsonify({"success": False, "error": "无法获取成员列表"}), 500
 
@@ -1905,7 +1842,7 @@ def kick_team_member(team_id, user_id):
         return jsonify({"success": False, "error": "成员不存在"}), 404
 
     # 执行踢人
-    result = kick_member(team['access_token'], team['account_id'], user_id)
+    result = kick_member(team['access_token'], team['account_id'], user_id, team_id)
 
     if result['success']:
         # 从invitations表中删除记录，释放位置
@@ -2058,38 +1995,9 @@ def admin_invite_member(team_id):
     members_result = get_team_members(team['access_token'], team['account_id'], team_id)
     
     if members_result['success']:
-        # 获取最新成员列表
+        # 获取最新成员列表，同步成员数量和成员详情到数据库
         members = members_result.get('members', [])
-        non_owner_members = [m for m in members if m.get('role') != 'account-owner']
-        current_count = len(non_owner_members)
-        
-        # 同步更新数据库
-        Team.update_member_count(team_id, current_count)
-        
-        # 同步成员详情
-        current_user_ids = []
-        for member in members:
-            user_id = member.get('id')
-            if user_id:
-                current_user_ids.append(user_id)
-                email_val = member.get('email')
-                role = member.get('role')
-                created_time_str = member.get('created_time')
-                join_time = member.get('created')
-                if created_time_str:
-                    try:
-                        if created_time_str.endswith('Z'):
-                            created_time_str = created_time_str.replace('Z', '+00:00')
-                        dt = datetime.fromisoformat(created_time_str)
-                        join_time = int(dt.timestamp())
-                    except:
-                        pass
-                MemberNote.sync_member(team_id, user_id, email_val, role, join_time)
-        
-        # 清理失效数据
-        MemberNote.delete_not_in(team_id, current_user_ids)
-        current_emails = [m.get('email') for m in members if m.get('email')]
-        Invitation.sync_invitations(team_id, current_emails)
+        current_count = sync_team_members(team_id, members)
         
         # 2. 检查人数
         if current_count >= 4:
@@ -2114,100 +2022,108 @@ def admin_invite_member(team_id):
     # 如果之前有失败记录，先删除（允许重新邀请）
     Invitation.delete_by_email(team_id, email)
 
-    # 执行邀请
-    result = invite_to_team(team['access_token'], team['account_id'], email, team_id)
-
-    if result['success']:
-        # 计算过期时间 - 使用UTC时间
-        temp_expire_at = None
-        if is_temp and temp_hours > 0:
-            now = datetime.utcnow()
-            temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
-
-        # 记录邀请
-        Invitation.create(
-            team_id=team_id,
-            email=email,
-            invite_id=result.get('invite_id'),
-            status='success',
-            is_temp=is_temp,
-            temp_expire_at=temp_expire_at
-        )
+    # 邀请前先预占名额，防止并发邀请超出人数上限
+    with reserve_seat(team_id, email) as reservation_id:
+        if not reservation_id:
+            return jsonify({"success": False, "error": "该 Team 已达到人数上限 (4人)"}), 400
 
-        # 更新team的最后邀请时间（实现轮询）
-        Team.update_last_invite(team_id)
+        # 执行邀请
+        result = invite_to_team(team['access_token'], team['account_id'], email, team_id)
 
-        return jsonify({
-            "success": True,
-            "message": f"已成功邀请 {email}",
-            "invite_id": result.get('invite_id')
-        })
-    else:
-        # 邀请 API 返回失败，验证是否实际成功
-        import time
-        time.sleep(2)  # 等待 API 同步
+        if result['success']:
+            # 计算过期时间 - 使用UTC时间
+            temp_expire_at = None
+            if is_temp and temp_hours > 0:
+                now = datetime.utcnow()
+                temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+            # 记录邀请
+            Invitation.create(
+                team_id=team_id,
+                email=email,
+                invite_id=result.get('invite_id'),
+                status='success',
+                is_temp=is_temp,
+                temp_expire_at=temp_expire_at
+            )
+            SeatReservation.commit(reservation_id)
+
+            # 更新team的最后邀请时间（实现轮询）
+            Team.update_last_invite(team_id)
+
+            return jsonify({
+                "success": True,
+                "message": f"已成功邀请 {email}",
+                "invite_id": result.get('invite_id')
+            })
+        else:
+            # 邀请 API 返回失败，验证是否实际成功
+            import time
+            time.sleep(2)  # 等待 API 同步
         
-        # 1. 检查是否在 pending 列表中
-        pending_result = get_pending_invites(team['access_token'], team['account_id'])
-        if pending_result['success']:
-            pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
-            if email.lower() in pending_emails:
-                # 实际已成功（在 pending 列表中），先删除可能存在的failed记录
-                Invitation.delete_by_email(team_id, email)
+            # 1. 检查是否在 pending 列表中
+            pending_result = get_pending_invites(team['access_token'], team['account_id'])
+            if pending_result['success']:
+                pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
+                if email.lower() in pending_emails:
+                    # 实际已成功（在 pending 列表中），先删除可能存在的failed记录
+                    Invitation.delete_by_email(team_id, email)
                 
-                temp_expire_at = None
-                if is_temp and temp_hours > 0:
-                    now = datetime.utcnow()
-                    temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
+                    temp_expire_at = None
+                    if is_temp and temp_hours > 0:
+                        now = datetime.utcnow()
+                        temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
                 
-                Invitation.create(
-                    team_id=team_id,
-                    email=email,
-                    status='success',
-                    is_temp=is_temp,
-                    temp_expire_at=temp_expire_at
-                )
-                Team.update_last_invite(team_id)
+                    Invitation.create(
+                        team_id=team_id,
+                        email=email,
+                        status='success',
+                        is_temp=is_temp,
+                        temp_expire_at=temp_expire_at
+                    )
+                    SeatReservation.commit(reservation_id)
+                    Team.update_last_invite(team_id)
                 
-                return jsonify({
-                    "success": True,
-                    "message": f"已成功邀请 {email}（验证确认）",
-                    "verified": True
-                })
+                    return jsonify({
+                        "success": True,
+                        "message": f"已成功邀请 {email}（验证确认）",
+                        "verified": True
+                    })
         
-        # 2. 检查是否已在成员列表中
-        members_result = get_team_members(team['access_token'], team['account_id'], team_id)
-        if members_result['success']:
-            member_emails = [m.get('email', '').lower() for m in members_result.get('members', [])]
-            if email.lower() in member_emails:
-                # 已经是成员了，先删除可能存在的failed记录
-                Invitation.delete_by_email(team_id, email)
+            # 2. 检查是否已在成员列表中
+            members_result = get_team_members(team['access_token'], team['account_id'], team_id)
+            if members_result['success']:
+                member_emails = [m.get('email', '').lower() for m in members_result.get('members', [])]
+                if email.lower() in member_emails:
+                    # 已经是成员了，先删除可能存在的failed记录
+                    Invitation.delete_by_email(team_id, email)
                 
-                Invitation.create(
-                    team_id=team_id,
-                    email=email,
-                    status='success',
-                    is_temp=is_temp,
-                    temp_expire_at=None
-                )
-                Team.update_last_invite(team_id)
+                    Invitation.create(
+                        team_id=team_id,
+                        email=email,
+                        status='success',
+                        is_temp=is_temp,
+                        temp_expire_at=None
+                    )
+                    SeatReservation.commit(reservation_id)
+                    Team.update_last_invite(team_id)
                 
-                return jsonify({
-                    "success": True,
-                    "message": f"{email} 已是团队成员",
-                    "already_member": True
-                })
+                    return jsonify({
+                        "success": True,
+                        "message": f"{email} 已是团队成员",
+                        "already_member": True
+                    })
         
-        # 3. 确实失败
-        Invitation.create(
-            team_id=team_id,
-            email=email,
-            status='failed'
-        )
-        return jsonify({
-            "success": False,
-            "error": f"邀请失败: {result.get('error', '未知错误')}"
-        }), 500
+            # 3. 确实失败
+            Invitation.create(
+                team_id=team_id,
+                email=email,
+                status='failed'
+            )
+            return jsonify({
+                "success": False,
+                "error": f"邀请失败: {result.get('error', '未知错误')}"
+            }), 500
 
 
 @app.route('/api/admin/teams/<int:team_id>/cancel-subscription', methods=['POST'])
@@ -2241,7 +2157,7 @@ def kick_member_by_email(team_id):
         return jsonify({"success": False, "error": "Team 不存在"}), 404
 
     # 获取成员列表
-    members_result = get_team_members(team['access_token'], team['account_id'], team_id)
+    members_result = get_cached_team_members(team, allow_stale=False)
     if not members_result['success']:
         return jsonify({"success": False, "error": "无法获取成员列表"}), 500
 
@@ -2267,7 +2183,7 @@ def kick_member_by_email(team_id):
     user_id = member.get('user_id') or member.get('id')
 
     # 执行踢人
-    result = kick_member(team['access_token'], team['account_id'], user_id)
+    result = kick_member(team['access_token'], team['account_id'], user_id, team_id)
 
     if result['success']:
         # 从invitations表中删除记录，释放位置
@@ -2316,8 +2232,9 @@ def admin_invite_auto():
 
     # 2. 只选择通过我们系统邀请的成员数 < 4 的Team
     available_teams = []
+    success_counts = Invitation.get_success_counts()
     for team in all_teams:
-        invited_count = Invitation.get_success_count_by_team(team['id'])
+        invited_count = success_counts.get(team['id'], 0)
         if invited_count < 4:
             team['invited_count'] = invited_count
             available_teams.append(team)
@@ -2328,19 +2245,14 @@ def admin_invite_auto():
     # 3. 按最近邀请时间排序（最近成功的在前）
     available_teams.sort(key=lambda t: t.get('last_invite_at') or '', reverse=True)
 
-    # 4. 最多尝试3个Team
+    # 4. 最多尝试3个Team，并发获取它们的成员列表，按返回顺序挑选有空位的Team
     max_attempts = 3
     tried_teams = []
     last_error = None
 
-    for i, team in enumerate(available_teams):
-        if i >= max_attempts:
-            break
-
+    for team, members_result in probe_team_members(available_teams[:max_attempts]):
         tried_teams.append(team['name'])
 
-        # 检查实际成员数
-        members_result = get_team_members(team['access_token'], team['account_id'], team['id'])
         if not members_result['success']:
             last_error = f"无法获取{team['name']}成员列表"
             continue
@@ -2358,207 +2270,454 @@ def admin_invite_auto():
         if email.lower() in member_emails:
             return jsonify({"success": False, "error": f"该邮箱已在 {team['name']} 团队中"}), 400
 
-        # 执行邀请
-        result = invite_to_team(team['access_token'], team['account_id'], email, team['id'])
+        # 邀请前先预占名额（并发请求可能刚占用了最后一个位置）
+        with reserve_seat(team['id'], email) as reservation_id:
+            if not reservation_id:
+                last_error = f"{team['name']}名额已被占用"
+                continue
 
-        if result['success']:
-            # 邀请成功！计算过期时间
-            temp_expire_at = None
-            if is_temp and temp_hours > 0:
-                now = datetime.utcnow()
-                temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
+            # 执行邀请
+            result = invite_to_team(team['access_token'], team['account_id'], email, team['id'])
 
-            # 记录邀请
-            Invitation.create(
-                team_id=team['id'],
-                email=email,
-                invite_id=result.get('invite_id'),
-                status='success',
-                is_temp=is_temp,
-                temp_expire_at=temp_expire_at
-            )
+            if result['success']:
+                # 邀请成功！计算过期时间
+                temp_expire_at = None
+                if is_temp and temp_hours > 0:
+                    now = datetime.utcnow()
+                    temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
 
-            # 更新team的最后邀请时间
-            Team.update_last_invite(team['id'])
+                # 记录邀请
+                Invitation.create(
+                    team_id=team['id'],
+                    email=email,
+                    invite_id=result.get('invite_id'),
+                    status='success',
+                    is_temp=is_temp,
+                    temp_expire_at=temp_expire_at
+                )
+                SeatReservation.commit(reservation_id)
 
-            message = f"已成功邀请 {email} 加入 {team['name']}"
-            if len(tried_teams) > 1:
-                message += f"（尝试了 {len(tried_teams)} 个Team）"
+                # 更新team的最后邀请时间
+                Team.update_last_invite(team['id'])
 
-            return jsonify({
-                "success": True,
-                "message": message,
-                "team_name": team['name'],
-                "invite_id": result.get('invite_id')
-            })
-        else:
-            # 邀请失败，验证是否实际成功（检查pending列表）
-            import time
-            time.sleep(1)  # 等待API同步
+                message = f"已成功邀请 {email} 加入 {team['name']}"
+                if len(tried_teams) > 1:
+                    message += f"（尝试了 {len(tried_teams)} 个Team）"
 
-            pending_result = get_pending_invites(team['access_token'], team['account_id'])
-            if pending_result['success']:
-                pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
-                if email.lower() in pending_emails:
-                    # 实际已成功（在pending列表中）
-                    temp_expire_at = None
-                    if is_temp and temp_hours > 0:
-                        now = datetime.utcnow()
-                        temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
+                return jsonify({
+                    "success": True,
+                    "message": message,
+                    "team_name": team['name'],
+                    "invite_id": result.get('invite_id')
+                })
+            else:
+                # 邀请失败，验证是否实际成功（检查pending列表）
+                import time
+                time.sleep(1)  # 等待API同步
+
+                pending_result = get_pending_invites(team['access_token'], team['account_id'])
+                if pending_result['success']:
+                    pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
+                    if email.lower() in pending_emails:
+                        # 实际已成功（在pending列表中）
+                        temp_expire_at = None
+                        if is_temp and temp_hours > 0:
+                            now = datetime.utcnow()
+                            temp_expire_at = (now + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+                        Invitation.create(
+                            team_id=team['id'],
+                            email=email,
+                            invite_id=None,
+                            status='success',
+                            is_temp=is_temp,
+                            temp_expire_at=temp_expire_at
+                        )
+                        SeatReservation.commit(reservation_id)
+                        Team.update_last_invite(team['id'])
+
+                        message = f"已成功邀请 {email} 加入 {team['name']}（验证确认）"
+                        if len(tried_teams) > 1:
+                            message += f"（尝试了 {len(tried_teams)} 个Team）"
+
+                        return jsonify({
+                            "success": True,
+                            "message": message,
+                            "team_name": team['name']
+                        })
+
+                # 确实失败，记录错误并尝试下一个Team
+                last_error = f"{team['name']}: {result.get('error', '未知错误')}"
+                continue
+
+    # 所有Team都试过了，仍然失败
+    return jsonify({
+        "success": False,
+        "error": f"尝试了 {len(tried_teams)} 个Team均失败\n最后错误: {last_error}\n尝试的Team: {', '.join(tried_teams)}"
+    }), 500
+
+
+def parse_batch_emails(raw):
+    """解析批量邀请的邮箱：支持列表或按换行/逗号/分号/空白分隔的文本，小写去重并保持顺序"""
+    if isinstance(raw, str):
+        raw = raw.replace(',', ' ').replace(';', ' ').split()
+    emails = []
+    for email in raw or []:
+        email = str(email).strip().lower()
+        if email and email not in emails:
+            emails.append(email)
+    return emails
+
+
+def invite_batch_to_team(team, assignments, is_temp, temp_expire_at):
+    """
+    批量邀请中单个 Team 的任务：一次请求邀请分配到该 Team 的所有邮箱
+    assignments 为 [(email, 预占 id)]，返回每个邮箱的结果
+    """
+    emails = [email for email, _ in assignments]
+    result = invite_to_team(team['access_token'], team['account_id'], emails, team['id'])
 
+    # invited: {email: invite_id}，邀请成功的邮箱
+    invited = {}
+    if result['success']:
+        invite_ids = result.get('invite_ids', {})
+        invited = {email: invite_ids.get(email) for email in emails}
+    else:
+        # 邀请失败，验证是否实际成功（检查pending列表）
+        time.sleep(1)  # 等待API同步
+        pending_result = get_pending_invites(team['access_token'], team['account_id'])
+        if pending_result['success']:
+            pending_emails = {(inv.get('email_address') or '').lower() for inv in pending_result.get('invites', [])}
+            invited = {email: None for email in emails if email in pending_emails}
+
+    # 该 Team 的邀请记录和预占转正在一个事务中提交
+    if invited:
+        with get_db():
+            for email, reservation_id in assignments:
+                if email in invited:
                     Invitation.create(
                         team_id=team['id'],
                         email=email,
-                        invite_id=None,
+                        invite_id=invited[email],
                         status='success',
                         is_temp=is_temp,
                         temp_expire_at=temp_expire_at
                     )
-                    Team.update_last_invite(team['id'])
+                    SeatReservation.commit(reservation_id)
+            Team.update_last_invite(team['id'])
 
-                    message = f"已成功邀请 {email} 加入 {team['name']}（验证确认）"
-                    if len(tried_teams) > 1:
-                        message += f"（尝试了 {len(tried_teams)} 个Team）"
+    results = []
+    for email, reservation_id in assignments:
+        if email in invited:
+            results.append({"email": email, "success": True, "team_name": team['name'], "invite_id": invited[email]})
+        else:
+            SeatReservation.release(reservation_id)
+            results.append({"email": email, "success": False, "team_name": team['name'],
+                            "error": result.get('error', '未知错误')})
+    return results
 
-                    return jsonify({
-                        "success": True,
-                        "message": message,
-                        "team_name": team['name']
-                    })
 
-            # 确实失败，记录错误并尝试下一个Team
-            last_error = f"{team['name']}: {result.get('error', '未知错误')}"
-            continue
+def batch_invite_results(emails, is_temp=False, temp_hours=0):
+    """
+    批量邀请，逐条产出结果 (dict)：
+    1. 先产出 plan: 按占用名额一次性为所有邮箱规划 Team 并预占名额
+    2. 已在某个 Team 中、或没有分配到名额的邮箱直接产出失败结果
+    3. 每个 Team 一次请求邀请分配到它的所有邮箱，多个 Team 并发执行（请求统一经过限流器），完成一个 Team 产出一批结果
+    4. 最后产出 summary
+    """
+    temp_expire_at = None
+    if is_temp and temp_hours > 0:
+        temp_expire_at = (datetime.utcnow() + timedelta(hours=temp_hours)).strftime('%Y-%m-%d %H:%M:%S')
+
+    teams = [t for t in Team.get_all() if t.get('token_status') != 'expired']
+    team_names = {t['id']: t['name'] for t in teams}
+    existing = Invitation.find_teams_by_emails(emails)
+    pending = [email for email in emails if email not in existing]
+
+    # 按最近邀请时间排序（最近成功的在前），只考虑还有名额的 Team
+    occupied = Invitation.get_success_counts()
+    teams = [t for t in teams if occupied.get(t['id'], 0) < TEAM_CAPACITY]
+    teams.sort(key=lambda t: t.get('last_invite_at') or '', reverse=True)
+
+    # 按已占用名额估算需要参与的 Team 数，再按并发数估算排队轮数：
+    # 每轮给一个完整的预占有效期，避免排在后面的 Team 还没开始邀请预占就过期
+    need, planned_teams = len(pending), 0
+    for team in teams:
+        if need <= 0:
+            break
+        need -= TEAM_CAPACITY - occupied.get(team['id'], 0)
+        planned_teams += 1
+    ttl = SEAT_RESERVATION_TTL * max(1, -(-planned_teams // BATCH_INVITE_WORKERS))
+    plan = []  # [(team, [(email, 预占 id)])]
+    for team in teams:
+        if not pending:
+            break
+        claimed = SeatReservation.claim_many(team['id'], pending[:TEAM_CAPACITY], ttl=ttl)
+        if claimed:
+            plan.append((team, claimed))
+            claimed_emails = {email for email, _ in claimed}
+            pending = [email for email in pending if email not in claimed_emails]
 
-    # 所有Team都试过了，仍然失败
-    return jsonify({
-        "success": False,
-        "error": f"尝试了 {len(tried_teams)} 个Team均失败\n最后错误: {last_error}\n尝试的Team: {', '.join(tried_teams)}"
-    }), 500
+    futures = {}
+    try:
+        yield {
+            "type": "plan",
+            "total": len(emails),
+            "teams": [{"team_name": team['name'], "emails": [email for email, _ in claimed]} for team, claimed in plan],
+            "existing": len(existing),
+            "unassigned": len(pending)
+        }
+
+        succeeded = 0
+        for email in emails:
+            if email in existing:
+                yield {"type": "result", "email": email, "success": False,
+                       "error": f"该邮箱已在 {team_names.get(existing[email], '其他')} 团队中"}
+        for email in pending:
+            yield {"type": "result", "email": email, "success": False, "error": "所有 Team 名额已满，请先添加 Team"}
+
+        if plan:
+            # 工作线程有自己的数据库连接，先提交当前线程的写入，避免互相等待写锁
+            flush_unit_of_work()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_INVITE_WORKERS,
+                                                       thread_name_prefix='batch-invite') as executor:
+                futures = {
+                    executor.submit(invite_batch_to_team, team, claimed, is_temp, temp_expire_at): (team, claimed)
+                    for team, claimed in plan
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    team, claimed = futures[future]
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        for _, reservation_id in claimed:
+                            SeatReservation.release(reservation_id)
+                        results = [{"email": email, "success": False, "team_name": team['name'], "error": str(e)}
+                                   for email, _ in claimed]
+                    for item in results:
+                        succeeded += 1 if item['success'] else 0
+                        yield {"type": "result", **item}
+    finally:
+        # 客户端中途断开 (GeneratorExit) 时，还没交给 invite_batch_to_team、或它执行出错的预占立即释放，不必等到过期
+        handled = {id(futures[future][1]) for future in futures if future.exception() is None}
+        for team, claimed in plan:
+            if id(claimed) not in handled:
+                for _, reservation_id in claimed:
+                    SeatReservation.release(reservation_id)
+
+    yield {"type": "summary", "total": len(emails), "success": succeeded, "failed": len(emails) - succeeded}
+
+
+@app.route('/api/admin/invite-batch', methods=['POST'])
+@admin_required
+@no_unit_of_work
+def admin_invite_batch():
+    """
+    管理员批量邀请（自动分配Team）
+    - 参数: emails (列表或换行/逗号分隔的文本), is_temp, temp_hours
+    - 返回: NDJSON 流，每行一个 JSON：plan → 每个邮箱的 result → summary
+    """
+    data = request.json
+    emails = parse_batch_emails(data.get('emails'))
+    is_temp = data.get('is_temp', False)
+    temp_hours = data.get('temp_hours', 24) if is_temp else 0
+
+    if not emails:
+        return jsonify({"success": False, "error": "请输入邮箱"}), 400
+    invalid = [email for email in emails if '@' not in email]
+    if invalid:
+        return jsonify({"success": False, "error": f"邮箱格式不正确: {', '.join(invalid[:5])}"}), 400
+    if len(emails) > BATCH_INVITE_MAX:
+        return jsonify({"success": False, "error": f"单次最多邀请 {BATCH_INVITE_MAX} 个邮箱"}), 400
+
+    def generate():
+        for item in batch_invite_results(emails, is_temp, temp_hours):
+            yield json.dumps(item, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def kick_found_member(team, member, email):
+    """踢出已确认在 Team 中的成员，成功时释放邀请名额并记录日志"""
+    if member.get('role') == 'account-owner':
+        return {"success": False, "error": "不能踢出团队所有者"}
+
+    user_id = member.get('user_id') or member.get('id')
+    result = kick_member(team['access_token'], team['account_id'], user_id, team['id'])
+
+    if result['success']:
+        # 从invitations表中删除记录，释放位置
+        Invitation.delete_by_email(team['id'], email)
+
+        # 记录日志
+        KickLog.create(
+            team_id=team['id'],
+            user_id=user_id,
+            email=email,
+            reason='管理员通过邮箱手动踢出',
+            success=True
+        )
+        return {"success": True, "message": f"已成功从 {team['name']} 踢出 {email}"}
+
+    KickLog.create(
+        team_id=team['id'],
+        user_id=user_id,
+        email=email,
+        reason='管理员通过邮箱手动踢出',
+        success=False,
+        error_message=result.get('error')
+    )
+    return {"success": False, "error": result.get('error')}
+
+
+def find_member_in_team(team, email, allow_stale=False):
+    """在 Team 的成员列表中查找邮箱，返回成员信息或 None"""
+    members_result = get_cached_team_members(team, allow_stale=allow_stale)
+    if not members_result['success']:
+        return None
+    return next((m for m in members_result['members']
+                 if (m.get('email') or '').lower() == email), None)
 
 
 @app.route('/api/admin/kick-by-email-auto', methods=['POST'])
 @admin_required
 def kick_member_by_email_auto():
-    """通过邮箱踢出成员(自动查找所有Team) - 优化版：优先从数据库查询"""
+    """
+    通过邮箱踢出成员(自动查找所有Team)
+    只查本地数据确定候选 Team: member_notes 反向索引 (成员同步/踢人时维护) + 该邮箱的成功邀请记录，
+    再拉取候选 Team 的成员列表确认。本地找不到时不再遍历所有 Team，返回 can_scan，
+    由前端通过 /api/admin/kick-by-email-auto/scan 发起后台全量扫描
+    """
     data = request.json
     email = data.get('email', '').strip().lower()
 
     if not email:
         return jsonify({"success": False, "error": "请输入邮箱"}), 400
 
-    # 性能优化：先从邀请记录中查找该邮箱可能所在的Team
-    candidate_team_ids = Invitation.get_teams_by_email(email)
-
-    found_team = None
-    found_member = None
+    candidate_team_ids = [note['team_id'] for note in MemberNote.find_by_email(email)]
+    for team_id in Invitation.get_teams_by_email(email):
+        if team_id not in candidate_team_ids:
+            candidate_team_ids.append(team_id)
 
-    # 优先检查候选Team（有邀请记录的Team）
-    if candidate_team_ids:
-        for team_id in candidate_team_ids:
-            team = Team.get_by_id(team_id)
-            if not team:
-                continue
-
-            # 获取成员列表
-            members_result = get_team_members(team['access_token'], team['account_id'], team_id)
-            if not members_result['success']:
-                continue
+    for team_id in candidate_team_ids:
+        team = Team.get_by_id(team_id)
+        if not team:
+            continue
 
-            # 查找匹配的成员
-            member = next((m for m in members_result['members']
-                           if m.get('email', '').lower() == email), None)
+        member = find_member_in_team(team, email)
+        if member:
+            result = kick_found_member(team, member, email)
+            if result['success']:
+                return jsonify(result)
+            return jsonify(result), 400 if member.get('role') == 'account-owner' else 500
+
+    # 未找到成员，可能已经离开或拒绝邀请，删除invitations记录释放位置
+    deleted_count = 0
+    for team_id in candidate_team_ids:
+        if Invitation.delete_by_email(team_id, email):
+            deleted_count += 1
+
+    if deleted_count > 0:
+        return jsonify({
+            "success": True,
+            "message": f"未找到 {email}，但已从 {deleted_count} 个Team的邀请记录中删除，释放位置"
+        })
+    return jsonify({
+        "success": False,
+        "error": f"本地记录中未找到邮箱为 {email} 的成员或邀请记录",
+        "can_scan": True
+    }), 404
 
-            if member:
-                found_team = team
-                found_member = member
-                # 确保有 user_id 字段
-                if 'user_id' not in found_member:
-                    found_member['user_id'] = found_member.get('id')
-                break
 
-    # 如果候选Team中没找到，再遍历所有Team（兜底逻辑，处理手动添加的成员）
-    if not found_team or not found_member:
-        teams = Team.get_all()
-        if not teams:
-            return jsonify({"success": False, "error": "当前没有 Team"}), 404
+def scan_teams_for_email(job, email, kick):
+    """
+    后台任务: 并发拉取所有 Team 的成员列表查找邮箱（走后台限流通道，为用户请求让路）
+    拉到的成员列表顺带同步到 member_notes，找到后取消剩余请求；kick 为 True 时直接踢出
+    """
+    from member_sync_service import members_snapshot_hash
 
-        # 排除已检查过的Team
-        checked_team_ids = set(candidate_team_ids)
+    teams = [t for t in Team.get_all() if t.get('token_status') != 'expired']
+    job.set_total(len(teams))
+    found = None
 
-        for team in teams:
-            if team['id'] in checked_team_ids:
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=EMAIL_SCAN_WORKERS, thread_name_prefix='email-scan')
+    try:
+        futures = {
+            executor.submit(get_team_members, team['access_token'], team['account_id'], team['id'], True): team
+            for team in teams
+        }
+        for future in concurrent.futures.as_completed(futures):
+            team = futures[future]
+            job.advance(message=team['name'])
+            try:
+                members_result = future.result()
+            except Exception as e:
+                print(f"⚠️ 扫描 Team {team['name']} 成员失败: {str(e)}")
                 continue
-
-            # 获取成员列表
-            members_result = get_team_members(team['access_token'], team['account_id'], team['id'])
             if not members_result['success']:
                 continue
 
-            # 查找匹配的成员
-            member = next((m for m in members_result['members']
-                           if m.get('email', '').lower() == email), None)
+            members = members_result['members']
+            # 更新本地反向索引，下次按邮箱查找无需再扫描
+            if members_snapshot_hash(members) != team.get('members_hash'):
+                sync_team_members(team['id'], members)
 
+            member = next((m for m in members if (m.get('email') or '').lower() == email), None)
             if member:
-                found_team = team
-                found_member = member
-                # 确保有 user_id 字段
-                if 'user_id' not in found_member:
-                    found_member['user_id'] = found_member.get('id')
+                found = (team, member)
+                break
+            if job.cancelled:
                 break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
-    if not found_team or not found_member:
-        # 未找到成员，可能已经离开或拒绝邀请，删除invitations记录释放位置
-        deleted_count = 0
-        teams = Team.get_all()
-        for team in teams:
-            deleted = Invitation.delete_by_email(team['id'], email)
-            if deleted:
-                deleted_count += 1
+    if not found:
+        return {"found": False, "message": f"所有 Team 中均未找到 {email}"}
 
-        if deleted_count > 0:
-            return jsonify({
-                "success": True,
-                "message": f"未找到 {email}，但已从 {deleted_count} 个Team的邀请记录中删除，释放位置"
-            })
-        else:
-            return jsonify({"success": False, "error": f"未找到邮箱为 {email} 的成员或邀请记录"}), 404
+    team, member = found
+    result = {"found": True, "team_id": team['id'], "team_name": team['name'], "kicked": False}
+    if not kick:
+        result['message'] = f"{email} 在 {team['name']} 中"
+        return result
 
-    # 检查是否为所有者
-    if found_member.get('role') == 'account-owner':
-        return jsonify({"success": False, "error": "不能踢出团队所有者"}), 400
+    kick_result = kick_found_member(team, member, email)
+    result['kicked'] = kick_result['success']
+    result['message'] = kick_result.get('message') or kick_result.get('error')
+    return result
 
-    user_id = found_member.get('user_id') or found_member.get('id')
 
-    # 执行踢人
-    result = kick_member(found_team['access_token'], found_team['account_id'], user_id)
+@app.route('/api/admin/kick-by-email-auto/scan', methods=['POST'])
+@admin_required
+def scan_member_by_email():
+    """发起后台全量扫描：遍历所有 Team 查找邮箱 (kick=true 时找到后直接踢出)，返回任务信息"""
+    data = request.json
+    email = data.get('email', '').strip().lower()
+    if not email:
+        return jsonify({"success": False, "error": "请输入邮箱"}), 400
 
-    if result['success']:
-        # 从invitations表中删除记录，释放位置
-        Invitation.delete_by_email(found_team['id'], email)
+    job = job_registry.start('email_scan', scan_teams_for_email, email, bool(data.get('kick', True)), key=email)
+    return jsonify({"success": True, "job": job.to_dict()})
 
-        # 记录日志
-        KickLog.create(
-            team_id=found_team['id'],
-            user_id=user_id,
-            email=email,
-            reason='管理员通过邮箱手动踢出',
-            success=True
-        )
-        return jsonify({
-            "success": True,
-            "message": f"已成功从 {found_team['name']} 踢出 {email}"
-        })
-    else:
-        KickLog.create(
-            team_id=found_team['id'],
-            user_id=user_id,
-            email=email,
-            reason='管理员通过邮箱手动踢出',
-            success=False,
-            error_message=result.get('error')
-        )
-        return jsonify({"success": False, "error": result.get('error')}), 500
+
+@app.route('/api/admin/jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_job(job_id):
+    """查询后台任务进度和结果"""
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "任务不存在或已过期"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+
+@app.route('/api/admin/jobs/<job_id>/cancel', methods=['POST'])
+@admin_required
+def cancel_job(job_id):
+    """取消后台任务（已发出的请求会完成，未开始的不再执行）"""
+    job = job_registry.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "任务不存在或已过期"}), 404
+    job.cancel()
+    return jsonify({"success": True, "job": job.to_dict()})
 
 
 @app.route('/api/admin/auto-kick/config', methods=['GET'])
@@ -2620,10 +2779,17 @@ def update_auto_kick_config():
 @app.route('/api/admin/auto-kick/logs', methods=['GET'])
 @admin_required
 def get_kick_logs():
-    """获取踢人日志"""
-    limit = request.args.get('limit', 100, type=int)
-    logs = KickLog.get_all(limit)
-    return jsonify({"success": True, "logs": logs})
+    """分页获取踢人日志，支持按 Team、是否成功、时间范围筛选"""
+    success = request.args.get('success')
+    try:
+        page = KickLog.get_page(
+            team_id=get_int_arg(request.args, 'team_id'),
+            success=None if success in (None, '') else success.lower() == 'true',
+            **get_page_args(request.args)
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    return jsonify({"success": True, "logs": page['items'], "next_cursor": page['next_cursor']})
 
 
 @app.route('/api/admin/auto-kick/check-now', methods=['POST'])
@@ -2955,13 +3121,14 @@ def get_public_teams():
         all_teams = Team.get_all(group_type=group_type)
         # 筛选 is_public=True 的 Team
         public_teams = []
+        success_counts = Invitation.get_success_counts()
         for t in all_teams:
             if t.get('is_public'):
                 # 获取该 Team 的成功邀请数量 (用于前端展示进度条: 已加入 vs 已邀请)
                 # member_count 是已加入数量
                 # invite_count 是总的邀请占位数量 (包含已加入和待加入)
                 # 所以待加入数量 = max(0, invite_count - member_count)
-                t['invite_count'] = Invitation.get_success_count_by_team(t['id'])
+                t['invite_count'] = success_counts.get(t['id'], 0)
                 public_teams.append(t)
 
         return jsonify({"success": True, "teams": public_teams})
@@ -3007,39 +3174,9 @@ def public_invite_member(team_id):
     members_result = get_team_members(team['access_token'], team['account_id'], team_id)
     
     if members_result['success']:
-        # 获取最新成员列表
+        # 获取最新成员列表，同步成员数量和成员详情到数据库
         members = members_result.get('members', [])
-        non_owner_members = [m for m in members if m.get('role') != 'account-owner']
-        current_count = len(non_owner_members)
-        
-        # 同步更新数据库
-        Team.update_member_count(team_id, current_count)
-        
-        # 同步成员详情 (可选，为了保持数据一致性)
-        current_user_ids = []
-        for member in members:
-            user_id = member.get('id')
-            if user_id:
-                current_user_ids.append(user_id)
-                email_val = member.get('email')
-                role = member.get('role')
-                # 处理时间格式
-                created_time_str = member.get('created_time')
-                join_time = member.get('created')
-                if created_time_str:
-                    try:
-                        if created_time_str.endswith('Z'):
-                            created_time_str = created_time_str.replace('Z', '+00:00')
-                        dt = datetime.fromisoformat(created_time_str)
-                        join_time = int(dt.timestamp())
-                    except:
-                        pass
-                MemberNote.sync_member(team_id, user_id, email_val, role, join_time)
-        
-        # 清理失效数据
-        MemberNote.delete_not_in(team_id, current_user_ids)
-        current_emails = [m.get('email') for m in members if m.get('email')]
-        Invitation.sync_invitations(team_id, current_emails)
+        current_count = sync_team_members(team_id, members)
         
         # 3. 再次检查人数 (使用最新的实时数据)
         if current_count >= 4:
@@ -3066,91 +3203,99 @@ def public_invite_member(team_id):
     # 如果之前有失败记录，先删除（允许重新邀请）
     Invitation.delete_by_email(team_id, email)
 
-    # 执行邀请
-    result = invite_to_team(team['access_token'], team['account_id'], email, team_id)
+    # 邀请前先预占名额，防止并发邀请超出人数上限
+    with reserve_seat(team_id, email) as reservation_id:
+        if not reservation_id:
+            return jsonify({"success": False, "error": "该 Team 已达到人数上限 (4人)"}), 400
 
-    if result['success']:
-        # 记录邀请 (自动归属 source)
-        Invitation.create(
-            team_id=team_id,
-            email=email,
-            invite_id=result.get('invite_id'),
-            status='success',
-            is_temp=False, # 公开页面邀请默认为永久
-            temp_expire_at=None,
-            source=user['name'] # 记录来源
-        )
+        # 执行邀请
+        result = invite_to_team(team['access_token'], team['account_id'], email, team_id)
 
-        # 更新team的最后邀请时间
-        Team.update_last_invite(team_id)
+        if result['success']:
+            # 记录邀请 (自动归属 source)
+            Invitation.create(
+                team_id=team_id,
+                email=email,
+                invite_id=result.get('invite_id'),
+                status='success',
+                is_temp=False, # 公开页面邀请默认为永久
+                temp_expire_at=None,
+                source=user['name'] # 记录来源
+            )
+            SeatReservation.commit(reservation_id)
 
-        return jsonify({
-            "success": True,
-            "message": f"已成功邀请 {email}",
-            "invite_id": result.get('invite_id')
-        })
-    else:
-        # 邀请 API 返回失败，验证是否实际成功
-        import time
-        time.sleep(2)  # 等待 API 同步
+            # 更新team的最后邀请时间
+            Team.update_last_invite(team_id)
+
+            return jsonify({
+                "success": True,
+                "message": f"已成功邀请 {email}",
+                "invite_id": result.get('invite_id')
+            })
+        else:
+            # 邀请 API 返回失败，验证是否实际成功
+            import time
+            time.sleep(2)  # 等待 API 同步
         
-        # 1. 检查是否在 pending 列表中
-        pending_result = get_pending_invites(team['access_token'], team['account_id'])
-        if pending_result['success']:
-            pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
-            if email.lower() in pending_emails:
-                # 实际已成功
-                Invitation.delete_by_email(team_id, email)
-                Invitation.create(
-                    team_id=team_id,
-                    email=email,
-                    status='success',
-                    is_temp=False,
-                    temp_expire_at=None,
-                    source=user['name'] # 记录来源
-                )
-                Team.update_last_invite(team_id)
+            # 1. 检查是否在 pending 列表中
+            pending_result = get_pending_invites(team['access_token'], team['account_id'])
+            if pending_result['success']:
+                pending_emails = [inv.get('email_address', '').lower() for inv in pending_result.get('invites', [])]
+                if email.lower() in pending_emails:
+                    # 实际已成功
+                    Invitation.delete_by_email(team_id, email)
+                    Invitation.create(
+                        team_id=team_id,
+                        email=email,
+                        status='success',
+                        is_temp=False,
+                        temp_expire_at=None,
+                        source=user['name'] # 记录来源
+                    )
+                    SeatReservation.commit(reservation_id)
+                    Team.update_last_invite(team_id)
                 
-                return jsonify({
-                    "success": True,
-                    "message": f"已成功邀请 {email}（验证确认）",
-                    "verified": True
-                })
+                    return jsonify({
+                        "success": True,
+                        "message": f"已成功邀请 {email}（验证确认）",
+                        "verified": True
+                    })
         
-        # 2. 检查是否已在成员列表中
-        members_result = get_team_members(team['access_token'], team['account_id'], team_id)
-        if members_result['success']:
-            member_emails = [m.get('email', '').lower() for m in members_result.get('members', [])]
-            if email.lower() in member_emails:
-                # 已经是成员了
-                Invitation.delete_by_email(team_id, email)
-                Invitation.create(
-                    team_id=team_id,
-                    email=email,
-                    status='success',
-                    is_temp=False,
-                    temp_expire_at=None,
-                    source=user['name'] # 记录来源
-                )
-                Team.update_last_invite(team_id)
+            # 2. 检查是否已在成员列表中
+            members_result = get_team_members(team['access_token'], team['account_id'], team_id)
+            if members_result['success']:
+                member_emails = [m.get('email', '').lower() for m in members_result.get('members', [])]
+                if email.lower() in member_emails:
+                    # 已经是成员了
+                    Invitation.delete_by_email(team_id, email)
+                    Invitation.create(
+                        team_id=team_id,
+                        email=email,
+                        status='success',
+                        is_temp=False,
+                        temp_expire_at=None,
+                        source=user['name'] # 记录来源
+                    )
+                    SeatReservation.commit(reservation_id)
+                    Team.update_last_invite(team_id)
                 
-                return jsonify({
-                    "success": True,
-                    "message": f"{email} 已是团队成员",
-                    "already_member": True
-                })
+                    return jsonify({
+                        "success": True,
+                        "message": f"{email} 已是团队成员",
+                        "already_member": True
+                    })
         
-        # 3. 确实失败
-        Invitation.create(
-            team_id=team_id,
-            email=email,
-            status='failed',
-            source=user['name'] # 记录来源（即使失败也记录一下是谁操作的）
-        )
-        return jsonify({
-            "success": False,
-            "error": f"邀请失败: {result.get('error', '未知错误')}"
-        }), 500
+            # 3. 确实失败
+            Invitation.create(
+                team_id=team_id,
+                email=email,
+                status='failed',
+                source=user['name'] # 记录来源（即使失败也记录一下是谁操作的）
+            )
+            return jsonify({
+                "success": False,
+                "error": f"邀请失败: {result.get('error', '未知错误')}"
+            }), 500
 
 
 @app.route('/api/public/teams/<int:team_id>/members', methods=['POST'])
@@ -3172,61 +3317,34 @@ def public_get_members(team_id):
     if not team.get('is_public'):
         return jsonify({"success": False, "error": "该 Team 未公开"}), 403
 
-    # 1. 获取已加入成员 (Status: 2)
-    db_members = MemberNote.get_all(team_id)
-    
+    # 与管理端共用 MemberRoster 名册查询，只返回公开字段
     # 使用字典去重，key为小写邮箱
     merged_members = {}
-    
-    for m in db_members:
-        safe_m = {
-            'email': m.get('email'),
-            'role': m.get('role'),
-            'created': m.get('join_time'), # 使用 join_time
-            'source': m.get('source'), # 返回来源
-            'status': 2,
-            'status_text': '已加入'
-        }
-        
-        email_key = safe_m['email'].strip().lower() if safe_m['email'] else ''
-        if email_key:
-            merged_members[email_key] = safe_m
-        else:
-            # 没有邮箱的情况（极少），这里简单处理，如果 public view 必须依赖 email 可能会有问题
-            # 但通常 member 都有 email
-            pass
 
-    # 2. 获取待处理邀请 (Status: 1)
-    invitations = Invitation.get_by_team(team_id)
-    
-    for inv in invitations:
-        email = inv.get('email', '').strip().lower()
-        if not email:
-            continue
-            
-        # 如果该邮箱已经在 merged_members 中，说明已加入，跳过
-        if email in merged_members:
+    for row in MemberRoster.get(team_id):
+        email = (row['email'] or '').strip().lower()
+        # 没有邮箱的成员（极少）不在公开页面展示；已加入的邮箱不再显示邀请记录
+        if not email or email in merged_members:
             continue
-            
-        # 确定状态文本
-        status_text = '已邀请'
-        if inv.get('status') == 'success':
-             status_text = '已发送邀请'
-        elif inv.get('status') == 'failed':
-             status_text = '邀请失败'
-        elif inv.get('status') == 'expired':
-             status_text = '已过期'
-        
-        invite_obj = {
-            'email': inv.get('email'),
-            'role': 'member',
-            'created': inv.get('created_at'),
-            'source': inv.get('source'),
-            'status': 1,
-            'status_text': status_text
-        }
-        
-        merged_members[email] = invite_obj
+
+        if row['kind'] == 'member':
+            merged_members[email] = {
+                'email': row['email'],
+                'role': row['role'],
+                'created': row['join_time'], # 使用 join_time
+                'source': row['source'], # 返回来源
+                'status': 2,
+                'status_text': '已加入'
+            }
+        else:
+            merged_members[email] = {
+                'email': row['email'],
+                'role': 'member',
+                'created': row['invited_at'],
+                'source': row['source'],
+                'status': 1,
+                'status_text': INVITE_STATUS_TEXT.get(row['invite_status'], '已邀请')
+            }
 
     # 转为列表并按时间排序 (倒序)
     safe_members = list(merged_members.values())
@@ -3260,52 +3378,12 @@ def public_refresh_members(team_id):
     if not team.get('is_public'):
         return jsonify({"success": False, "error": "该 Team 未公开"}), 403
 
-    # 调用 admin 中的刷新逻辑 (复用逻辑，避免代码重复)
-    # 这里直接调用内部函数或者复用 refresh_members 的逻辑
-    # 由于 refresh_members 是路由函数，我们最好提取公共逻辑，或者在这里重新实现一遍
-    
+    # 与 refresh_members 共用 sync_team_members 同步逻辑
     result = get_team_members(team['access_token'], team['account_id'], team_id)
 
     if result['success']:
-        members = result.get('members', [])
-        
-        # 更新数据库中的成员数量
-        non_owner_members = [m for m in members if m.get('role') != 'account-owner']
-        Team.update_member_count(team_id, len(non_owner_members))
-
-        # 同步每个成员到 member_notes
-        current_user_ids = []
-        for member in members:
-            user_id = member.get('id')
-            if not user_id:
-                continue
-            
-            current_user_ids.append(user_id)
-            
-            email = member.get('email')
-            role = member.get('role')
-            created_time_str = member.get('created_time')
-            join_time = None
-            if created_time_str:
-                try:
-                    if created_time_str.endswith('Z'):
-                        created_time_str = created_time_str.replace('Z', '+00:00')
-                    dt = datetime.fromisoformat(created_time_str)
-                    join_time = int(dt.timestamp())
-                except Exception as e:
-                    join_time = member.get('created')
-            else:
-                 join_time = member.get('created')
-
-            MemberNote.sync_member(team_id, user_id, email, role, join_time)
-            
-        # 删除不在当前列表中的成员
-        MemberNote.delete_not_in(team_id, current_user_ids)
-        
-        # 同步清理失效的邀请记录
-        current_emails = [m.get('email') for m in members if m.get('email')]
-        Invitation.sync_invitations(team_id, current_emails)
-            
+        # 同步成员数量和 member_notes（删除已退出的成员）
+        sync_team_members(team_id, result.get('members', []))
         return jsonify({"success": True, "message": "成员列表已刷新"})
     else:
         return jsonify(result), result.get('status_code', 500)
@@ -3354,9 +3432,16 @@ def public_my_invitations():
         return jsonify({"success": False, "error": "账号或密码错误"}), 403
 
     try:
-        invitations = Invitation.get_by_source(user['name'])
+        page = Invitation.get_page(
+            source=user['name'],
+            status=data.get('status') or None,
+            team_id=get_int_arg(data, 'team_id'),
+            email=data.get('email') or None,
+            **get_page_args(data)
+        )
+        invitations = page['items']
         
-        # 预加载所有涉及到的 team 的 member emails，用于判断是否已加入
+        # 预加载本页涉及到的 team 的 member emails，用于判断是否已加入
         team_member_emails = {} # {team_id: set(emails)}
         
         # 找出所有涉及的 team_id (只关心 status='success' 的，因为 pending 肯定没加入)
@@ -3408,14 +3493,16 @@ def public_my_invitations():
                 "can_revoke": can_revoke
             })
 
-        return jsonify({"success": True, "invitations": safe_invitations})
+        return jsonify({"success": True, "invitations": safe_invitations, "next_cursor": page['next_cursor']})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route('/api/public/invitations', methods=['POST'])
 def public_get_invitations():
-    """获取所有邀请记录 (需账号密码验证)"""
+    """分页获取邀请记录 (需账号密码验证)，筛选条件同管理端"""
     data = request.json
     username = data.get('username', '')
     password = data.get('password', '')
@@ -3426,10 +3513,16 @@ def public_get_invitations():
         return jsonify({"success": False, "error": "账号或密码错误"}), 403
 
     try:
-        invitations = Invitation.get_all()
+        page = Invitation.get_page(
+            status=data.get('status') or None,
+            team_id=get_int_arg(data, 'team_id'),
+            source=data.get('source') or None,
+            email=data.get('email') or None,
+            **get_page_args(data)
+        )
         # 过滤敏感信息
         safe_invitations = []
-        for inv in invitations:
+        for inv in page['items']:
             safe_invitations.append({
                 "id": inv["id"],
                 "created_at": inv["created_at"],
@@ -3442,7 +3535,9 @@ def public_get_invitations():
                 "status": inv["status"]
             })
 
-        return jsonify({"success": True, "invitations": safe_invitations})
+        return jsonify({"success": True, "invitations": safe_invitations, "next_cursor": page['next_cursor']})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -3459,6 +3554,12 @@ if __name__ == '__main__':
     config = AutoKickConfig.get()
     if config and config['enabled']:
         auto_kick_service.start()
-    
+
+    # 临时邀请到期调度（是否踢出由自动踢人配置决定）
+    temp_expiry_scheduler.start(auto_kick_service.expire_temp_invitations)
+
+    # 后台成员同步
+    if MEMBER_SYNC_ENABLED:
+        member_sync_service.start()
 
     app.run(host=HOST, port=PORT, debug=DEBUG)
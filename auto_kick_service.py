@@ -1,17 +1,31 @@
 """
 自动检测踢人服务
 """
+import asyncio
 import time
 import random
 import threading
 import concurrent.futures
 from datetime import datetime
-from curl_cffi import requests as cf_requests
-from database import Team, Invitation, AutoKickConfig, KickLog
+from database import Team, Invitation, AutoKickConfig, KickLog, SystemConfig, MemberNote
+from chatgpt_client import ChatGPTTeamClient, new_async_session
+from members_cache import members_cache, FRESH
+from rate_limiter import TokenBucket
 from utils import get_proxies_by_account
 import pytz
 
 
+def _config_number(key, default, cast=int, minimum=None):
+    """读取数值型 SystemConfig，非法值回退到默认值"""
+    try:
+        value = cast(SystemConfig.get(key, default))
+    except (TypeError, ValueError):
+        value = default
+    if minimum is not None:
+        value = max(minimum, value)
+    return value
+
+
 class AutoKickService:
     def __init__(self):
         self.running = False
@@ -94,7 +108,7 @@ class AutoKickService:
             return True  # 出错时默认允许运行
     
     def _check_and_kick(self):
-        """检查并踢出非法成员和过期临时成员（并发版本）"""
+        """检查并踢出非法成员（并发版本）"""
         # 1. 尝试获取锁，防止并发执行
         if not self.check_lock.acquire(blocking=False):
             print("⚠️  检测任务已在运行中，跳过本次检测")
@@ -106,10 +120,7 @@ class AutoKickService:
             print(f"🔍 开始并发检测 - {self.check_start_time.strftime('%Y-%m-%d %H:%M:%S')}")
             print(f"{'='*60}")
             
-            # 2. 检查过期的临时邀请（串行）
-            self._check_temp_invitations()
-            
-            # 3. 并发检测所有 Team
+            # 2. 并发检测所有 Team（过期的临时邀请由 temp_expiry 调度在到期时刻处理）
             teams = Team.get_all()
             stats = {
                 'total': len(teams),
@@ -117,23 +128,19 @@ class AutoKickService:
                 'failed': 0,
                 'skipped': 0
             }
+            settings = self._load_sweep_settings()
+
+            # 3. 按配置选择扫描方式，请求节奏由令牌桶控制而不是固定 sleep
+            if settings['mode'] == 'thread':
+                print(f"\n📊 开始并发检测 {stats['total']} 个 Team（使用 {settings['concurrency']} 个线程，"
+                      f"限速 {settings['rate']}/秒）...")
+                self._sweep_threaded(teams, stats, settings)
+            else:
+                print(f"\n📊 开始异步检测 {stats['total']} 个 Team（并发 {settings['concurrency']}，"
+                      f"单代理并发 {settings['proxy_concurrency']}，限速 {settings['rate']}/秒）...")
+                asyncio.run(self._sweep_async(teams, stats, settings))
             
-            print(f"\n📊 开始并发检测 {stats['total']} 个 Team（使用 3 个线程）...")
-            
-            # 4. 使用线程池并发执行
-            with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-                futures = []
-                
-                for team in teams:
-                    # 提交任务前添加随机延迟，避免触发限流
-                    time.sleep(random.uniform(0.3, 0.5))
-                    future = executor.submit(self._check_team_safe, team, stats)
-                    futures.append(future)
-                
-                # 等待所有任务完成
-                concurrent.futures.wait(futures)
-            
-            # 5. 输出统计信息
+            # 4. 输出统计信息
             self.last_check_time = datetime.now()
             duration = (self.last_check_time - self.check_start_time).total_seconds()
             
@@ -148,6 +155,82 @@ class AutoKickService:
             self.check_lock.release()
             self.check_start_time = None
     
+    def _load_sweep_settings(self):
+        """读取扫描并发与限流配置 (SystemConfig)"""
+        return {
+            'mode': SystemConfig.get('auto_kick_sweep_mode', 'async'),
+            'concurrency': _config_number('auto_kick_concurrency', 8, minimum=1),
+            'proxy_concurrency': _config_number('auto_kick_proxy_concurrency', 2, minimum=1),
+            'rate': _config_number('auto_kick_rate_per_second', 2.0, cast=float, minimum=0.1),
+            'burst': _config_number('auto_kick_rate_burst', 4, minimum=1),
+        }
+
+    def _sweep_threaded(self, teams, stats, settings):
+        """线程池扫描"""
+        bucket = TokenBucket(settings['rate'], settings['burst'])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=settings['concurrency']) as executor:
+            futures = []
+            for team in teams:
+                # 提交任务前先拿令牌，避免触发限流
+                bucket.acquire()
+                futures.append(executor.submit(self._check_team_safe, team, stats))
+
+            # 等待所有任务完成
+            concurrent.futures.wait(futures)
+
+    async def _sweep_async(self, teams, stats, settings):
+        """
+        asyncio 扫描：全局并发、单代理并发和令牌桶共同限制请求节奏
+        总耗时取决于限速预算，而不是逐个提交的等待时间
+        """
+        bucket = TokenBucket(settings['rate'], settings['burst'])
+        global_limit = asyncio.Semaphore(settings['concurrency'])
+        proxy_limits = {}
+
+        async def check(team, session):
+            # 代理解析缓存未命中时会查库，放到线程中执行
+            proxies = await asyncio.to_thread(get_proxies_by_account, team['account_id'])
+            proxy_key = (proxies or {}).get('https') or 'direct'
+            if proxy_key not in proxy_limits:
+                proxy_limits[proxy_key] = asyncio.Semaphore(settings['proxy_concurrency'])
+            async with global_limit, proxy_limits[proxy_key]:
+                try:
+                    result = await self._check_team_async(team, session, bucket, proxies)
+                except Exception as e:
+                    print(f"❌ 检测 Team {team['name']} 时出错: {str(e)}")
+                    result = 'failed'
+            stats[result if result in ('success', 'skipped') else 'failed'] += 1
+
+        session = new_async_session(max_clients=settings['concurrency'])
+        try:
+            await asyncio.gather(*(check(team, session) for team in teams))
+        finally:
+            await session.close()
+
+    async def _check_team_async(self, team, session, bucket, proxies):
+        """_check_team 的协程版本，数据库读写放到线程中执行以免阻塞事件循环"""
+        print(f"\n📋 检测 Team: {team['name']}")
+        invited_emails = await asyncio.to_thread(self._get_invited_emails, team)
+
+        client = ChatGPTTeamClient(team['access_token'], team['account_id'], proxies=proxies, background=True)
+        await bucket.acquire_async()
+        generation = members_cache.generation(team['id'])
+        result = await client.get_members_async(session)
+        members = self._members_from_result(result)
+        if members is not None:
+            members_cache.put(team['id'], members, generation)
+        if not members:
+            print(f"   ⚠️  无法获取成员列表 ({team['name']})")
+            return 'skipped'
+
+        for member in self._find_illegal_members(team, members, invited_emails):
+            user_id = member.get('id', '')
+            email = member.get('email', '').lower()
+            await bucket.acquire_async()
+            kick_result = await client.kick_async(session, user_id)
+            await asyncio.to_thread(self._record_kick, team, user_id, email, "未经邀请的成员", kick_result)
+        return 'success'
+
     def _check_team_safe(self, team, stats):
         """线程安全的 Team 检测包装器"""
         try:
@@ -162,72 +245,89 @@ class AutoKickService:
             print(f"❌ 检测 Team {team['name']} 时出错: {str(e)}")
             stats['failed'] += 1
     
-    def _check_temp_invitations(self):
-        """检查并踢出过期的临时邀请成员"""
-        print(f"\n🕐 检查过期的临时邀请...")
-
-        expired_invitations = Invitation.get_temp_expired()
+    def expire_temp_invitations(self, invitation_ids):
+        """
+        踢出到期的临时邀请成员（由临时邀请到期调度在到期时刻调用）
+        返回需要稍后重试的邀请 id：自动踢人未启用/不在运行时间内、成员列表获取失败、成员还未进组或踢出失败
+        """
+        config = AutoKickConfig.get()
+        if not config or not config['enabled'] or not self._is_in_running_time(config):
+            return list(invitation_ids)
 
+        expired_invitations = Invitation.get_temp_expired(invitation_ids)
         if not expired_invitations:
-            print(f"   ✅ 没有过期的临时邀请")
-            return
+            return []
 
-        print(f"   发现 {len(expired_invitations)} 个过期的临时邀请")
+        print(f"\n🕐 {len(expired_invitations)} 个临时邀请已到期")
 
+        # 按 Team 分组，每个 Team 只取一次成员列表
+        by_team = {}
         for invitation in expired_invitations:
-            team = Team.get_by_id(invitation['team_id'])
+            by_team.setdefault(invitation['team_id'], []).append(invitation)
+
+        retry_ids = []
+        kicks = []  # (team, user_id, email, invitation_id)
+        for team_id, invitations in by_team.items():
+            team = Team.get_by_id(team_id)
             if not team:
                 continue
 
-            email = invitation['email']
-            print(f"   ⏰ {email} 的临时邀请已过期,准备踢出")
-
-            # 获取成员列表,找到对应的 user_id
-            members = self._get_team_members(team['access_token'], team['account_id'])
+            # 新鲜的缓存可以直接用
+            members, state = members_cache.lookup(team_id)
+            if state != FRESH:
+                members = self._get_team_members(team)
             if not members:
+                retry_ids.extend(invitation['id'] for invitation in invitations)
                 continue
 
-            member = next((m for m in members if m.get('email', '').lower() == email.lower()), None)
-            if member:
-                user_id = member.get('id', '')
-                self._kick_member(team, user_id, email, "临时邀请已过期")
+            members_by_email = {m.get('email', '').lower(): m for m in members}
+            for invitation in invitations:
+                email = invitation['email']
+                member = members_by_email.get(email.lower())
+                if not member:
+                    # 成员还没接受邀请，稍后再试
+                    retry_ids.append(invitation['id'])
+                    continue
+                print(f"   ⏰ {email} 的临时邀请已过期,准备踢出")
+                kicks.append((team, member.get('id', ''), email, invitation['id']))
 
-    def _check_team(self, team):
-        """检查单个 Team"""
-        team_id = team['id']
-        team_name = team['name']
-        account_id = team['account_id']
-        access_token = team['access_token']
+        if not kicks:
+            return retry_ids
+
+        # 并发踢出，请求节奏由后台限流通道控制
+        def kick(item):
+            team, user_id = item[0], item[1]
+            return ChatGPTTeamClient(team['access_token'], team['account_id'], background=True).kick(user_id)
 
-        print(f"\n📋 检测 Team: {team_name}")
+        workers = min(len(kicks), self._load_sweep_settings()['concurrency'])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(kick, kicks))
 
-        # 1. 获取所有已邀请的邮箱 (从 invitations 表)
-        invited_emails = set(email.lower() for email in Invitation.get_all_emails_by_team(team_id))
+        logs = []
+        for (team, user_id, email, invitation_id), result in zip(kicks, results):
+            logs.append(self._apply_kick(team, user_id, email, "临时邀请已过期", result))
+            if not result.success:
+                retry_ids.append(invitation_id)
+        KickLog.create_many(logs)
+        return retry_ids
 
-        # 添加 Team 所有者邮箱
+    def _get_invited_emails(self, team):
+        """已邀请的邮箱 (invitations 表) 加上 Team 所有者邮箱"""
+        invited_emails = set(email.lower() for email in Invitation.get_all_emails_by_team(team['id']))
         if team['email']:
             invited_emails.add(team['email'].lower())
+        return invited_emails
 
-        print(f"   已邀请邮箱数: {len(invited_emails)}")
-
-        # 2. 获取当前 Team 成员
-        members = self._get_team_members(access_token, account_id)
-
-        if not members:
-            print(f"   ⚠️  无法获取成员列表")
-            return 'skipped'
-
-        print(f"   当前成员数: {len(members)}")
+    def _find_illegal_members(self, team, members, invited_emails):
+        """找出不在邀请列表中的成员（所有者除外）"""
+        print(f"   [{team['name']}] 已邀请邮箱数: {len(invited_emails)}, 当前成员数: {len(members)}")
 
-        # 3. 检查每个成员
-        kicked_count = 0
+        illegal = []
         legal_count = 0
         owner_count = 0
-        
         for member in members:
             member_email = member.get('email', '').lower()
             member_role = member.get('role', '')
-            member_user_id = member.get('id', '')
 
             # 跳过所有者
             if member_role == 'account-owner':
@@ -242,91 +342,78 @@ class AutoKickService:
             else:
                 # 非法成员,踢出
                 print(f"   ⚠️  {member_email} (非法成员,准备踢出)")
-                self._kick_member(team, member_user_id, member_email, "未经邀请的成员")
-                kicked_count += 1
-        
-        print(f"   📊 统计: 所有者={owner_count}, 合法成员={legal_count}, 踢出={kicked_count}")
+                illegal.append(member)
+
+        print(f"   📊 [{team['name']}] 统计: 所有者={owner_count}, 合法成员={legal_count}, 踢出={len(illegal)}")
+        return illegal
+
+    def _check_team(self, team):
+        """检查单个 Team"""
+        print(f"\n📋 检测 Team: {team['name']}")
+
+        # 1. 获取所有已邀请的邮箱
+        invited_emails = self._get_invited_emails(team)
+
+        # 2. 获取当前 Team 成员
+        members = self._get_team_members(team)
+
+        if not members:
+            print(f"   ⚠️  无法获取成员列表")
+            return 'skipped'
+
+        # 3. 踢出非法成员
+        for member in self._find_illegal_members(team, members, invited_emails):
+            self._kick_member(team, member.get('id', ''), member.get('email', '').lower(), "未经邀请的成员")
         return 'success'
-    
-    def _get_team_members(self, access_token, account_id):
-        """获取 Team 成员列表"""
-        url = f"https://chatgpt.com/backend-api/accounts/{account_id}/users"
-        
-        headers = {
-            "accept": "*/*",
-            "accept-language": "zh-CN,zh;q=0.9",
-            "authorization": f"Bearer {access_token}",
-            "chatgpt-account-id": account_id,
-            "content-type": "application/json",
-            "oai-device-id": "a9c9e9a0-f72d-4fbc-800e-2d0e1e3c3b54",
-            "oai-language": "zh-CN",
-            "origin": "https://chatgpt.com",
-            "referer": "https://chatgpt.com/admin",
-            "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-        }
-        
-        try:
-            # 降低超时时间从 10 秒到 5 秒
-            proxies = get_proxies_by_account(account_id)
-            response = cf_requests.get(url, headers=headers, impersonate="chrome110", timeout=5, proxies=proxies)
-
-            if response.status_code == 200:
-                data = response.json()
-                # 使用 items 字段（API 实际返回的字段名）
-                return data.get('items', [])
-            elif response.status_code == 429:
-                # 不再阻塞，直接跳过该 Team
-                print(f"   ⚠️  请求过于频繁 (429)，跳过该 Team")
-                return None
-            elif response.status_code == 401:
-                print(f"   ❌ Token 已过期 (401)")
-                return None
-            else:
-                print(f"   ❌ 获取成员列表失败: {response.status_code}")
-                return None
-        except Exception as e:
-            print(f"   ❌ 获取成员列表出错: {str(e)}")
-            return None
-    
-    def _kick_member(self, team, user_id, email, reason):
-        """踢出成员"""
+
+    def _members_from_result(self, result):
+        """把 get_members 的 ApiResult 转换为成员列表，失败时打印原因并返回 None"""
+        if result.success:
+            return result.data
+        if result.rate_limited:
+            # 客户端已按 Retry-After 重试过，仍然 429 则跳过该 Team
+            print(f"   ⚠️  请求过于频繁 (429)，跳过该 Team")
+        elif result.unauthorized:
+            print(f"   ❌ Token 已过期 (401)")
+        elif result.status_code:
+            print(f"   ❌ 获取成员列表失败: {result.status_code}")
+        else:
+            print(f"   ❌ 获取成员列表出错: {result.error}")
+        return None
+
+    def _get_team_members(self, team):
+        """获取 Team 成员列表（实时请求，结果写入成员缓存）"""
+        generation = members_cache.generation(team['id'])
+        result = ChatGPTTeamClient(team['access_token'], team['account_id'], background=True).get_members()
+        members = self._members_from_result(result)
+        if members is not None:
+            members_cache.put(team['id'], members, generation)
+        return members
+
+    def _apply_kick(self, team, user_id, email, reason, result):
+        """处理踢人结果：成功时释放邀请名额，返回待写入的踢人日志"""
         team_id = team['id']
-        account_id = team['account_id']
-        access_token = team['access_token']
-        
-        url = f"https://chatgpt.com/backend-api/accounts/{account_id}/users/{user_id}"
-        
-        headers = {
-            "accept": "*/*",
-            "accept-language": "zh-CN,zh;q=0.9",
-            "authorization": f"Bearer {access_token}",
-            "chatgpt-account-id": account_id,
-            "content-type": "application/json",
-            "oai-device-id": "a9c9e9a0-f72d-4fbc-800e-2d0e1e3c3b54",
-            "oai-language": "zh-CN",
-            "origin": "https://chatgpt.com",
-            "referer": "https://chatgpt.com/admin",
-            "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-        }
-        
-        try:
-            proxies = get_proxies_by_account(account_id)
-            response = cf_requests.delete(url, headers=headers, impersonate="chrome110", timeout=10, proxies=proxies)
+        if result.success:
+            # 从invitations表中删除记录，释放位置
+            Invitation.delete_by_email(team_id, email)
+            MemberNote.delete_by_user_id(team_id, user_id)
+            members_cache.remove_member(team_id, user_id)
 
-            if response.status_code == 200:
-                # 从invitations表中删除记录，释放位置
-                Invitation.delete_by_email(team_id, email)
+            print(f"   ✅ 成功踢出: {email}")
+            return (team_id, user_id, email, reason, True, None)
 
-                print(f"   ✅ 成功踢出: {email}")
-                KickLog.create(team_id, user_id, email, reason, success=True)
-            else:
-                error_msg = f"状态码: {response.status_code}"
-                print(f"   ❌ 踢出失败: {email} - {error_msg}")
-                KickLog.create(team_id, user_id, email, reason, success=False, error_message=error_msg)
-        except Exception as e:
-            error_msg = str(e)
-            print(f"   ❌ 踢出出错: {email} - {error_msg}")
-            KickLog.create(team_id, user_id, email, reason, success=False, error_message=error_msg)
+        error_msg = f"状态码: {result.status_code}" if result.status_code else result.error
+        print(f"   ❌ 踢出失败: {email} - {error_msg}")
+        return (team_id, user_id, email, reason, False, error_msg)
+
+    def _record_kick(self, team, user_id, email, reason, result):
+        """记录踢人结果：成功时释放邀请名额，并写入踢人日志"""
+        KickLog.create(*self._apply_kick(team, user_id, email, reason, result))
+
+    def _kick_member(self, team, user_id, email, reason):
+        """踢出成员"""
+        result = ChatGPTTeamClient(team['access_token'], team['account_id'], background=True).kick(user_id)
+        self._record_kick(team, user_id, email, reason, result)
     
     def is_checking(self):
         """检查是否有检测任务正在运行"""
@@ -0,0 +1,136 @@
+"""
+数据库连接层微基准测试
+
+对比旧的"每次调用新建连接"模式与连接池模式下:
+1. 每个请求打开的连接数
+2. 请求耗时的 p50 / p99
+
+用法: python bench_db.py [--teams 200] [--invites 6] [--rounds 50]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+import database
+from database import init_db, Team, Invitation, MemberNote
+
+
+class LegacyConnectionCounter:
+    """模拟旧版 get_db：每次调用都新建并关闭连接"""
+
+    def __init__(self, path):
+        self.path = path
+        self.opened_count = 0
+
+    @contextmanager
+    def get_db(self):
+        conn = sqlite3.connect(self.path)
+        self.opened_count += 1
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def seed(team_count, invites_per_team):
+    """写入测试数据"""
+    for i in range(team_count):
+        team_id = Team.create(f"bench-team-{i}", f"acct-{i}", "token", organization_id=f"org-{i}")
+        for j in range(invites_per_team):
+            email = f"user{j}@team{i}.example.com"
+            Invitation.create(team_id, email, status='success' if j % 3 else 'failed')
+            if j % 2 == 0:
+                MemberNote.sync_member(team_id, f"user-{i}-{j}", email, 'standard-user', int(time.time()))
+
+
+def admin_teams_request():
+    """模拟 GET /api/admin/teams 的数据库访问"""
+    teams = Team.get_all()
+    for team in teams:
+        team['invitations'] = Invitation.get_by_team(team['id'])
+    return teams
+
+
+def join_request():
+    """模拟 /api/join 选择 Team 时的数据库访问"""
+    teams = Team.get_all()
+    counts = Invitation.get_success_counts()
+    for team in teams:
+        team['invited_count'] = counts.get(team['id'], 0)
+    return teams
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_scenario(name, func, rounds, opened_counter):
+    durations = []
+    connections = []
+    for _ in range(rounds):
+        before = opened_counter()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+        connections.append(opened_counter() - before)
+    return {
+        'name': name,
+        'connections': statistics.mean(connections),
+        'p50': percentile(durations, 50),
+        'p99': percentile(durations, 99),
+    }
+
+
+def print_result(mode, result):
+    print(f"  [{mode:<6}] {result['name']:<18} 连接数/请求={result['connections']:>8.1f}  "
+          f"p50={result['p50']:>8.2f}ms  p99={result['p99']:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库连接层基准测试')
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--invites', type=int, default=6)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        pool = database.reset_pool(path)
+        init_db()
+        seed(args.teams, args.invites)
+
+        print(f"📊 Teams={args.teams}, 每个 Team 邀请数={args.invites}, 轮数={args.rounds}")
+        scenarios = [('GET /api/admin/teams', admin_teams_request), ('POST /api/join', join_request)]
+
+        # 旧模式：临时替换模块内的 get_db
+        legacy = LegacyConnectionCounter(path)
+        pooled_get_db = database.get_db
+        database.get_db = legacy.get_db
+        try:
+            legacy_results = [run_scenario(n, f, args.rounds, lambda: legacy.opened_count) for n, f in scenarios]
+        finally:
+            database.get_db = pooled_get_db
+
+        pool_results = [run_scenario(n, f, args.rounds, lambda: pool.stats()['opened']) for n, f in scenarios]
+
+        for legacy_result, pool_result in zip(legacy_results, pool_results):
+            print_result('legacy', legacy_result)
+            print_result('pool', pool_result)
+
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+登录 PoW (proof of work) 求解基准测试
+
+只测量当前 login_package.proof_of_work.generate_answer:
+1. 固定 nonce 数量下的哈希速度 (次/秒)
+2. 指定难度 (默认 "0fffff") 下的求解耗时 p50 / p99 及平均 nonce
+
+在默认难度下平均十几次哈希就能求出答案，单次求解在毫秒以下，用来复现"这个难度下优化求解循环没有收益"的结论
+
+用法: python bench_pow.py [--iterations 100000] [--seeds 200] [--diff 0fffff]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import pybase64
+
+from login_package import proof_of_work
+from login_package.proof_of_work import generate_answer, get_config, USER_AGENT
+
+# 实际上不可能满足的难度，用来测满 iterations 次哈希
+UNREACHABLE_DIFF = "0000000000"
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def answer_nonce(answer):
+    """从答案中解出 nonce（config 第 4 项）"""
+    return json.loads(pybase64.b64decode(answer))[3]
+
+
+def bench_hash_rate(config, iterations):
+    """固定 nonce 数量下的哈希速度：用达不到的难度让 generate_answer 跑满 iterations 次"""
+    seed = format(random.random())
+    max_iteration = proof_of_work.MAX_ITERATION
+    proof_of_work.MAX_ITERATION = iterations
+    try:
+        start = time.perf_counter()
+        generate_answer(seed, UNREACHABLE_DIFF, config)
+        elapsed = time.perf_counter() - start
+    finally:
+        proof_of_work.MAX_ITERATION = max_iteration
+    print(f"⚡ 哈希速度 ({iterations} 次): {iterations / elapsed:,.0f}/秒")
+
+
+def bench_solve(config, seeds, diff):
+    """指定难度下逐个 seed 求解，统计耗时与 nonce"""
+    times, nonces, failed = [], [], 0
+    for _ in range(seeds):
+        seed = format(random.random())
+        start = time.perf_counter()
+        answer, found = generate_answer(seed, diff, config)
+        times.append((time.perf_counter() - start) * 1000)
+        if found:
+            nonces.append(answer_nonce(answer))
+        else:
+            failed += 1
+
+    print(f"🎯 难度 {diff}, {seeds} 个 seed, 未求出 {failed} 个")
+    if nonces:
+        print(f"   平均 nonce {statistics.mean(nonces):.1f}, 最大 nonce {max(nonces)}")
+    print(f"   求解耗时: p50={percentile(times, 50):.3f}ms  p99={percentile(times, 99):.3f}ms  "
+          f"max={max(times):.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录 PoW 求解基准测试')
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--seeds', type=int, default=200)
+    parser.add_argument('--diff', default='0fffff')
+    args = parser.parse_args()
+
+    config = get_config(USER_AGENT)
+    bench_hash_rate(config, args.iterations)
+    bench_solve(config, args.seeds, args.diff)
+
+
+if __name__ == '__main__':
+    main()
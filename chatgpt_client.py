@@ -0,0 +1,396 @@
+"""
+ChatGPT backend-api 客户端
+1. 按 (代理, account_id) 复用 curl_cffi Session，避免每次请求都重新经代理做 TCP + TLS 握手
+2. ChatGPTTeamClient 统一请求头、超时、429/5xx 重试和结果结构
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+from curl_cffi import requests as cf_requests
+
+from config import (
+    CHATGPT_SESSION_POOL_SIZE, CHATGPT_SESSION_IDLE_TIMEOUT, CHATGPT_CONNECT_TIMEOUT,
+    CHATGPT_MAX_RETRIES, CHATGPT_RETRY_MAX_DELAY
+)
+from database import flush_unit_of_work
+from rate_limiter import rate_limiter
+from utils import get_proxies_by_account
+
+IMPERSONATE = "chrome110"
+
+
+class SessionPool:
+    """
+    curl_cffi Session 池
+    每个 (代理, account_id) 维护一组空闲 Session，使用时取出、用完归还，
+    同一个 Session 不会被两个线程同时使用，因此可以跨 Flask 请求线程和踢人线程池复用连接。
+    空闲 Session 总数超过上限时按 LRU 淘汰，超过 idle_timeout 未使用的 Session 会被关闭。
+    """
+
+    def __init__(self, max_idle=CHATGPT_SESSION_POOL_SIZE, idle_timeout=CHATGPT_SESSION_IDLE_TIMEOUT,
+                 impersonate=IMPERSONATE):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.impersonate = impersonate
+        # key -> [(session, last_used), ...]，OrderedDict 的顺序即 LRU 顺序
+        self._idle = OrderedDict()
+        self._idle_count = 0
+        self._lock = threading.Lock()
+        # 统计信息 (用于排查连接复用情况)
+        self.created_count = 0
+        self.reused_count = 0
+
+    @staticmethod
+    def _make_key(account_id, proxies):
+        proxy_url = (proxies or {}).get('https') or (proxies or {}).get('http')
+        return proxy_url, account_id
+
+    def _create_session(self, proxies):
+        # 同一时刻只有一个线程使用该 Session，不需要 curl_cffi 的线程局部句柄
+        session = cf_requests.Session(
+            impersonate=self.impersonate,
+            proxies=proxies,
+            use_thread_local_curl=False
+        )
+        with self._lock:
+            self.created_count += 1
+        return session
+
+    def _pop_expired(self, now):
+        """取出所有过期的空闲 Session（调用方持有锁）"""
+        expired = []
+        for key in list(self._idle):
+            entries = self._idle[key]
+            alive = [(s, t) for s, t in entries if now - t < self.idle_timeout]
+            expired.extend(s for s, t in entries if now - t >= self.idle_timeout)
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+        self._idle_count -= len(expired)
+        return expired
+
+    def _pop_lru(self):
+        """空闲数超过上限时，从最久未使用的 key 开始淘汰（调用方持有锁）"""
+        evicted = []
+        while self._idle_count > self.max_idle and self._idle:
+            key, entries = next(iter(self._idle.items()))
+            evicted.append(entries.pop(0)[0])
+            self._idle_count -= 1
+            if not entries:
+                del self._idle[key]
+        return evicted
+
+    @staticmethod
+    def _close_all(sessions):
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+
+    def acquire(self, account_id=None, proxies=None):
+        """取出一个可用 Session，没有空闲的则新建"""
+        key = self._make_key(account_id, proxies)
+        now = time.time()
+        session = None
+        with self._lock:
+            expired = self._pop_expired(now)
+            entries = self._idle.get(key)
+            if entries:
+                session = entries.pop()[0]
+                self._idle_count -= 1
+                self.reused_count += 1
+                if not entries:
+                    del self._idle[key]
+        self._close_all(expired)
+        return session or self._create_session(proxies)
+
+    def release(self, session, account_id=None, proxies=None):
+        """归还 Session 以便复用"""
+        key = self._make_key(account_id, proxies)
+        with self._lock:
+            self._idle.setdefault(key, []).append((session, time.time()))
+            self._idle.move_to_end(key)
+            self._idle_count += 1
+            evicted = self._pop_lru()
+        self._close_all(evicted)
+
+    @contextmanager
+    def session(self, account_id=None, proxies=None):
+        """借用一个 Session，请求出错时丢弃该 Session（连接状态可能已损坏）"""
+        session = self.acquire(account_id, proxies)
+        try:
+            yield session
+        except Exception:
+            self._close_all([session])
+            raise
+        self.release(session, account_id, proxies)
+
+    def request(self, method, url, account_id=None, proxies=None, **kwargs):
+        """通过池中的 Session 发送请求，参数与 curl_cffi Session.request 一致"""
+        with self.session(account_id, proxies) as session:
+            return session.request(method, url, **kwargs)
+
+    def close(self):
+        """关闭所有空闲 Session"""
+        with self._lock:
+            sessions = [s for entries in self._idle.values() for s, _ in entries]
+            self._idle.clear()
+            self._idle_count = 0
+        self._close_all(sessions)
+
+    def stats(self):
+        """连接池统计"""
+        with self._lock:
+            return {
+                'created': self.created_count,
+                'reused': self.reused_count,
+                'idle': self._idle_count,
+                'keys': len(self._idle)
+            }
+
+
+# 全局 Session 池
+session_pool = SessionPool()
+
+
+def new_async_session(max_clients=10):
+    """创建 asyncio 版 Session（用于批量扫描），max_clients 为同时使用的 curl 句柄数"""
+    return cf_requests.AsyncSession(impersonate=IMPERSONATE, max_clients=max_clients)
+
+
+# 各操作的 (连接超时, 读取超时)，读操作快速失败，写操作给服务端多留一些处理时间
+OPERATION_TIMEOUTS = {
+    'invite': (CHATGPT_CONNECT_TIMEOUT, 20),
+    'cancel_invite': (CHATGPT_CONNECT_TIMEOUT, 15),
+    'get_subscription': (CHATGPT_CONNECT_TIMEOUT, 10),
+    'cancel_subscription': (CHATGPT_CONNECT_TIMEOUT, 20),
+    'get_members': (CHATGPT_CONNECT_TIMEOUT, 10),
+    'get_pending_invites': (CHATGPT_CONNECT_TIMEOUT, 10),
+    'kick': (CHATGPT_CONNECT_TIMEOUT, 15),
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# 网络异常时只有幂等请求可以安全重试（POST 可能已被服务端处理）
+IDEMPOTENT_METHODS = {'GET', 'DELETE'}
+
+
+@dataclass
+class ApiResult:
+    """backend-api 调用结果"""
+    success: bool
+    status_code: Optional[int] = None
+    data: Any = None
+    error: Optional[str] = None
+    attempts: int = 1
+
+    @property
+    def unauthorized(self):
+        return self.status_code == 401
+
+    @property
+    def rate_limited(self):
+        return self.status_code == 429
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class ChatGPTTeamClient:
+    """
+    ChatGPT Team 管理接口客户端
+    所有请求都经过 Session 池，带每个操作的超时，并对 429/5xx 做有限次数的退避重试
+    每次发送 (包括重试) 前都要从中央限流器取令牌；background=True 的请求会为交互请求让路
+    """
+
+    BASE_URL = "https://chatgpt.com/backend-api"
+    DEVICE_ID = "a9c9e9a0-f72d-4fbc-800e-2d0e1e3c3b54"
+    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+
+    def __init__(self, access_token, account_id, proxies=None, max_retries=CHATGPT_MAX_RETRIES,
+                 retry_max_delay=CHATGPT_RETRY_MAX_DELAY, pool=None, background=False):
+        self.access_token = access_token
+        self.account_id = account_id
+        self.proxies = proxies if proxies is not None else get_proxies_by_account(account_id)
+        self.proxy_key = (self.proxies or {}).get('https') or (self.proxies or {}).get('http')
+        self.background = background
+        self.max_retries = max_retries
+        self.retry_max_delay = retry_max_delay
+        self.pool = pool or session_pool
+
+    def _headers(self, referer="https://chatgpt.com/admin", has_body=False):
+        headers = {
+            "accept": "*/*",
+            "accept-language": "zh-CN,zh;q=0.9",
+            "authorization": f"Bearer {self.access_token}",
+            "chatgpt-account-id": self.account_id,
+            "oai-device-id": self.DEVICE_ID,
+            "oai-language": "zh-CN",
+            "origin": "https://chatgpt.com",
+            "referer": referer,
+            "user-agent": self.USER_AGENT
+        }
+        if has_body:
+            headers["content-type"] = "application/json"
+        return headers
+
+    def _retry_delay(self, attempt, response=None):
+        """
+        计算第 attempt 次重试前的等待时间
+        优先使用 Retry-After；超过上限时返回 None 表示放弃重试
+        """
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('retry-after'))
+            if retry_after is not None:
+                return retry_after if retry_after <= self.retry_max_delay else None
+        # 指数退避 + 抖动，避免多个线程同时重试
+        backoff = min(self.retry_max_delay, 0.5 * (2 ** attempt))
+        return random.uniform(backoff / 2, backoff)
+
+    def _prepare(self, operation, path, json=None, referer="https://chatgpt.com/admin"):
+        """构造 (url, 请求参数)"""
+        return f"{self.BASE_URL}{path}", {
+            'headers': self._headers(referer=referer, has_body=json is not None),
+            'json': json,
+            'timeout': OPERATION_TIMEOUTS[operation],
+            'proxies': self.proxies,
+        }
+
+    def _handle(self, operation, method, attempt, response=None, error=None):
+        """
+        根据一次请求的结果决定下一步
+        返回 (重试前等待秒数, None) 或 (None, ApiResult)
+        """
+        if error is not None:
+            if method in IDEMPOTENT_METHODS and attempt <= self.max_retries:
+                return self._retry_delay(attempt), None
+            return None, ApiResult(success=False, error=str(error), attempts=attempt)
+
+        if response.status_code in RETRY_STATUS_CODES and attempt <= self.max_retries:
+            delay = self._retry_delay(attempt, response)
+            if delay is not None:
+                print(f"⚠️ {operation} 返回 {response.status_code}，{delay:.1f} 秒后重试 ({attempt}/{self.max_retries})")
+                return delay, None
+
+        if 200 <= response.status_code < 300:
+            try:
+                data = response.json() if response.content else None
+            except ValueError:
+                data = None
+            return None, ApiResult(success=True, status_code=response.status_code, data=data, attempts=attempt)
+        return None, ApiResult(success=False, status_code=response.status_code, error=response.text, attempts=attempt)
+
+    def _request(self, operation, method, path, json=None, referer="https://chatgpt.com/admin"):
+        """发送请求并返回 ApiResult，不抛出异常"""
+        # 发起网络请求前提交当前请求中挂起的写入，避免等待网络时持有 SQLite 写锁
+        flush_unit_of_work()
+
+        url, kwargs = self._prepare(operation, path, json=json, referer=referer)
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+            rate_limiter.acquire(self.proxy_key, self.account_id, background=self.background)
+            try:
+                response = self.pool.request(method, url, account_id=self.account_id, **kwargs)
+            except Exception as e:
+                error = e
+            delay, result = self._handle(operation, method, attempt, response, error)
+            if result is not None:
+                return result
+            time.sleep(delay)
+
+    async def _request_async(self, session, operation, method, path, json=None, referer="https://chatgpt.com/admin"):
+        """_request 的协程版本，使用调用方提供的 curl_cffi AsyncSession"""
+        url, kwargs = self._prepare(operation, path, json=json, referer=referer)
+        attempt = 0
+        while True:
+            attempt += 1
+            response, error = None, None
+            await rate_limiter.acquire_async(self.proxy_key, self.account_id, background=self.background)
+            try:
+                response = await session.request(method, url, **kwargs)
+            except Exception as e:
+                error = e
+            delay, result = self._handle(operation, method, attempt, response, error)
+            if result is not None:
+                return result
+            await asyncio.sleep(delay)
+
+    def invite(self, emails, role="standard-user"):
+        """邀请成员，emails 可以是单个邮箱或邮箱列表"""
+        if isinstance(emails, str):
+            emails = [emails]
+        payload = {
+            "email_addresses": list(emails),
+            "role": role,
+            "resend_emails": False
+        }
+        return self._request('invite', 'POST', f"/accounts/{self.account_id}/invites", json=payload)
+
+    def cancel_invite(self, email):
+        """撤销邀请"""
+        payload = {"email_address": email}
+        return self._request('cancel_invite', 'DELETE', f"/accounts/{self.account_id}/invites", json=payload)
+
+    def get_subscription(self):
+        """获取订阅信息"""
+        return self._request('get_subscription', 'GET', f"/subscriptions?account_id={self.account_id}")
+
+    def cancel_subscription(self):
+        """取消订阅"""
+        payload = {"account_id": self.account_id}
+        return self._request('cancel_subscription', 'POST', "/subscriptions/cancel", json=payload,
+                             referer="https://chatgpt.com/admin/billing")
+
+    def get_members(self):
+        """获取成员列表，data 为 items 列表"""
+        result = self._request('get_members', 'GET', f"/accounts/{self.account_id}/users")
+        if result.success:
+            result.data = (result.data or {}).get('items', [])
+        return result
+
+    async def get_members_async(self, session):
+        """get_members 的协程版本"""
+        result = await self._request_async(session, 'get_members', 'GET', f"/accounts/{self.account_id}/users")
+        if result.success:
+            result.data = (result.data or {}).get('items', [])
+        return result
+
+    def get_pending_invites(self):
+        """获取待处理邀请列表，data 为 items 列表"""
+        result = self._request('get_pending_invites', 'GET', f"/accounts/{self.account_id}/invites")
+        if result.success:
+            result.data = (result.data or {}).get('items', [])
+        return result
+
+    def kick(self, user_id):
+        """踢出成员"""
+        return self._request('kick', 'DELETE', f"/accounts/{self.account_id}/users/{user_id}")
+
+    async def kick_async(self, session, user_id):
+        """kick 的协程版本"""
+        return await self._request_async(session, 'kick', 'DELETE', f"/accounts/{self.account_id}/users/{user_id}")
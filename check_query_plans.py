@@ -0,0 +1,164 @@
+"""
+热点查询执行计划检查
+
+在临时数据库上执行各个热点模型方法，捕获实际发出的 SQL，
+逐条做 EXPLAIN QUERY PLAN，出现未走索引的全表扫描 (SCAN <table>) 时以非零状态退出。
+新增或修改热点查询后运行一次，防止索引失效导致查询退化为全表扫描。
+
+用法: python check_query_plans.py [-v]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+import database
+from database import (
+    init_db, get_db, begin_unit_of_work, end_unit_of_work,
+    encode_page_cursor, Team, AccessKey, Invitation, MemberNote, MemberRoster, KickLog, MaterialShare
+)
+
+EMAIL = 'Someone@Example.com'
+PAGE_CURSOR = encode_page_cursor('2999-01-01 00:00:00', 1 << 30)
+
+# (名称, 调用, 允许全表扫描的表/别名)
+# 允许扫描的只有本身就需要遍历全部 Team 的查询
+HOT_QUERIES = [
+    ('Invitation.get_by_email', lambda ctx: Invitation.get_by_email(ctx['team_id'], EMAIL), ()),
+    ('Invitation.get_teams_by_email', lambda ctx: Invitation.get_teams_by_email(EMAIL), ()),
+    ('Invitation.find_teams_by_emails', lambda ctx: Invitation.find_teams_by_emails([EMAIL, 'other@example.com']), ()),
+    ('Invitation.delete_by_email', lambda ctx: Invitation.delete_by_email(ctx['team_id'], EMAIL), ()),
+    ('Invitation.get_by_team', lambda ctx: Invitation.get_by_team(ctx['team_id']), ()),
+    ('Invitation.get_by_user_id', lambda ctx: Invitation.get_by_user_id(ctx['team_id'], 'user-1'), ()),
+    ('Invitation.get_page', lambda ctx: Invitation.get_page(PAGE_CURSOR), ()),
+    ('Invitation.get_page(source)', lambda ctx: Invitation.get_page(PAGE_CURSOR, source='bench'), ()),
+    ('Invitation.get_page(status)', lambda ctx: Invitation.get_page(PAGE_CURSOR, status='success'), ()),
+    ('Invitation.get_page(team)', lambda ctx: Invitation.get_page(PAGE_CURSOR, team_id=ctx['team_id']), ()),
+    ('Invitation.get_all_emails_by_team', lambda ctx: Invitation.get_all_emails_by_team(ctx['team_id']), ()),
+    ('Invitation.get_team_summaries', lambda ctx: Invitation.get_team_summaries(5), ('t',)),
+    ('Invitation.get_temp_expired', lambda ctx: Invitation.get_temp_expired(), ()),
+    ('Invitation.get_temp_expired(ids)', lambda ctx: Invitation.get_temp_expired([1, 2, 3]), ()),
+    ('Invitation.get_temp_pending', lambda ctx: Invitation.get_temp_pending(), ()),
+    ('Invitation.get_success_count_by_team', lambda ctx: Invitation.get_success_count_by_team(ctx['team_id']), ()),
+    ('Invitation.get_success_counts', lambda ctx: Invitation.get_success_counts(), ('t',)),
+    ('Team.get_recently_active_ids', lambda ctx: Team.get_recently_active_ids(3600), ('t',)),
+    ('AccessKey.get_by_code', lambda ctx: AccessKey.get_by_code(ctx['key_code']), ()),
+    ('MemberNote.sync_member', lambda ctx: MemberNote.sync_member(ctx['team_id'], 'user-1', EMAIL, 'standard-user', 0), ()),
+    ('MemberNote.sync_team', lambda ctx: MemberNote.sync_team(ctx['team_id'], [
+        {'user_id': 'user-1', 'email': EMAIL, 'role': 'standard-user', 'join_time': 1}]), ()),
+    ('MemberNote.get_all', lambda ctx: MemberNote.get_all(ctx['team_id']), ()),
+    ('MemberNote.find_by_email', lambda ctx: MemberNote.find_by_email(EMAIL), ()),
+    ('MemberRoster.get', lambda ctx: MemberRoster.get(ctx['team_id']), ()),
+    ('KickLog.get_by_team', lambda ctx: KickLog.get_by_team(ctx['team_id']), ()),
+    ('KickLog.get_page', lambda ctx: KickLog.get_page(PAGE_CURSOR), ()),
+    ('KickLog.get_page(team)', lambda ctx: KickLog.get_page(PAGE_CURSOR, team_id=ctx['team_id']), ()),
+    ('MaterialShare.get_page', lambda ctx: MaterialShare.get_page(PAGE_CURSOR), ()),
+    ('MaterialShare.get_page(category)', lambda ctx: MaterialShare.get_page(PAGE_CURSOR, category='bench'), ()),
+]
+
+SCAN_PATTERN = re.compile(r'^SCAN (\S+)(.*)$')
+CHECKED_PREFIXES = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def seed():
+    """写入少量数据，让优化器拿到非空表"""
+    team_ids = []
+    for i in range(20):
+        team_id = Team.create(f"plan-team-{i}", f"acct-{i}", "token", organization_id=f"org-{i}")
+        team_ids.append(team_id)
+        for j in range(5):
+            email = f"user{j}@team{i}.example.com"
+            Invitation.create(team_id, email, user_id=f"user-{j}", status='success', source='bench',
+                              is_temp=j == 0, temp_expire_at='2000-01-01 00:00:00' if j == 0 else None)
+            MemberNote.sync_member(team_id, f"user-{j}", email, 'standard-user', int(time.time()))
+        KickLog.create(team_id, 'user-0', f"user0@team{i}.example.com", 'plan check')
+        MaterialShare.create(f"/uploads/plan-{i}.png", 'bench', 'bench', 1024, 'image/png')
+    key = AccessKey.create(team_id=team_ids[0])
+    with get_db() as conn:
+        conn.execute('ANALYZE')
+    return {'team_id': team_ids[0], 'key_code': key['key_code']}
+
+
+def capture_statements(func, ctx):
+    """在一个会回滚的工作单元内执行 func，返回期间发出的 SQL"""
+    statements = []
+    begin_unit_of_work()
+    try:
+        with get_db() as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                func(ctx)
+            finally:
+                conn.set_trace_callback(None)
+    finally:
+        # 传入异常对象使工作单元回滚，避免写操作影响后续检查
+        end_unit_of_work(RuntimeError('rollback'))
+    return [sql for sql in statements if sql.lstrip().upper().startswith(CHECKED_PREFIXES)]
+
+
+def explain(sql):
+    """返回 EXPLAIN QUERY PLAN 的 detail 列表"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[3] for row in cursor.fetchall()]
+
+
+def find_table_scans(plan, allowed):
+    """找出未使用索引的全表扫描"""
+    scans = []
+    for detail in plan:
+        match = SCAN_PATTERN.match(detail)
+        if not match:
+            continue
+        target, rest = match.groups()
+        # (subquery-N) 是已经按索引取出的子查询结果，不是表
+        if 'INDEX' in rest or target == 'CONSTANT' or target.startswith('(') or target in allowed:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='热点查询执行计划检查')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每条 SQL 的执行计划')
+    args = parser.parse_args()
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = database.reset_pool(os.path.join(tmp, 'plans.db'))
+        init_db()
+        ctx = seed()
+
+        for name, func, allowed in HOT_QUERIES:
+            statements = capture_statements(func, ctx)
+            if not statements:
+                print(f"⚠️ {name}: 未捕获到 SQL")
+                continue
+            bad = []
+            for sql in statements:
+                plan = explain(sql)
+                if args.verbose:
+                    print(f"   {' '.join(sql.split())}")
+                    for detail in plan:
+                        print(f"      {detail}")
+                bad.extend(find_table_scans(plan, allowed))
+            if bad:
+                failures += 1
+                print(f"❌ {name}: {'; '.join(bad)}")
+            else:
+                print(f"✅ {name}")
+
+        pool.close()
+
+    if failures:
+        print(f"❌ {failures} 个热点查询出现全表扫描")
+        return 1
+    print("✅ 所有热点查询均使用索引")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
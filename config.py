@@ -10,6 +10,46 @@ ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '123456')  # 部署时请修
 # 数据库配置
 DATABASE_PATH = 'chatgpt_team.db'
 
+# 数据库连接池配置
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 16))  # 最多保留的空闲连接数
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))  # 遇到写锁时最长等待时间
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 8192))  # 每个连接的页缓存大小
+
+# ChatGPT 请求 Session 池配置
+CHATGPT_SESSION_POOL_SIZE = int(os.environ.get('CHATGPT_SESSION_POOL_SIZE', 64))  # 最多保留的空闲 Session 数
+CHATGPT_SESSION_IDLE_TIMEOUT = int(os.environ.get('CHATGPT_SESSION_IDLE_TIMEOUT', 300))  # 空闲超过该秒数的 Session 会被关闭
+CHATGPT_CONNECT_TIMEOUT = float(os.environ.get('CHATGPT_CONNECT_TIMEOUT', 5))  # 建立连接(含代理)超时秒数
+CHATGPT_MAX_RETRIES = int(os.environ.get('CHATGPT_MAX_RETRIES', 2))  # 429/5xx 最多重试次数
+CHATGPT_RETRY_MAX_DELAY = float(os.environ.get('CHATGPT_RETRY_MAX_DELAY', 8))  # 单次重试最长等待秒数
+PROXY_CACHE_TTL = int(os.environ.get('PROXY_CACHE_TTL', 600))  # 代理解析缓存兜底过期秒数 (变更时会主动失效)
+RATE_LIMIT_CONFIG_TTL = int(os.environ.get('RATE_LIMIT_CONFIG_TTL', 30))  # 限流配置重新读取间隔秒数
+MEMBERS_CACHE_TTL = int(os.environ.get('MEMBERS_CACHE_TTL', 30))  # 成员列表缓存新鲜期秒数，过期后后台刷新
+MEMBERS_CACHE_STALE_TTL = int(os.environ.get('MEMBERS_CACHE_STALE_TTL', 300))  # 超过该秒数的缓存不再使用，同步重新拉取
+SEAT_RESERVATION_TTL = int(os.environ.get('SEAT_RESERVATION_TTL', 120))  # 邀请前的席位预占有效秒数，超时未转正自动释放
+TEAM_PROBE_WORKERS = int(os.environ.get('TEAM_PROBE_WORKERS', 16))  # 加入/自动邀请时并发探测候选 Team 的线程数
+BATCH_INVITE_MAX = int(os.environ.get('BATCH_INVITE_MAX', 500))  # 批量邀请单次最多邮箱数
+BATCH_INVITE_WORKERS = int(os.environ.get('BATCH_INVITE_WORKERS', 8))  # 批量邀请时同时发起邀请的 Team 数
+
+# 列表分页配置 (邀请记录、踢人日志、素材列表)
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 50))  # 每页默认条数
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 200))  # 每页最多条数
+
+# 后台成员同步配置
+MEMBER_SYNC_ENABLED = os.environ.get('MEMBER_SYNC_ENABLED', 'True').lower() == 'true'
+MEMBER_SYNC_TICK = int(os.environ.get('MEMBER_SYNC_TICK', 30))  # 检查到期 Team 的间隔秒数
+MEMBER_SYNC_ACTIVE_INTERVAL = int(os.environ.get('MEMBER_SYNC_ACTIVE_INTERVAL', 300))  # 活跃 Team 的同步间隔秒数
+MEMBER_SYNC_IDLE_INTERVAL = int(os.environ.get('MEMBER_SYNC_IDLE_INTERVAL', 3600))  # 空闲 Team 的最长同步间隔秒数
+MEMBER_SYNC_ACTIVE_WINDOW = int(os.environ.get('MEMBER_SYNC_ACTIVE_WINDOW', 6 * 3600))  # 多少秒内有邀请/踢人/临时邀请到期视为活跃
+MEMBER_SYNC_WORKERS = int(os.environ.get('MEMBER_SYNC_WORKERS', 4))  # 成员同步并发线程数
+
+# 后台任务配置
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 3600))  # 已结束的后台任务保留秒数，供前端查询结果
+EMAIL_SCAN_WORKERS = int(os.environ.get('EMAIL_SCAN_WORKERS', 4))  # 按邮箱全量扫描所有 Team 时的并发线程数
+RELOGIN_WORKERS = int(os.environ.get('RELOGIN_WORKERS', 2))  # 同时进行的 Team 重新登录任务数，其余排队
+
+# 临时邀请到期调度配置
+TEMP_EXPIRY_RETRY = int(os.environ.get('TEMP_EXPIRY_RETRY', 300))  # 到期处理未完成（成员未进组、请求失败等）时多少秒后重试
+
 # 每个 Team 最多生成的密钥数量
 MAX_KEYS_PER_TEAM = 4
 
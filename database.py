@@ -1,12 +1,16 @@
 """
 数据库模型
 """
+import base64
 import sqlite3
 import secrets
+import threading
 import time
+from collections import deque
 from datetime import datetime
 from contextlib import contextmanager
-from config import DATABASE_PATH, MAX_KEYS_PER_TEAM, KEY_LENGTH
+from config import DATABASE_PATH, MAX_KEYS_PER_TEAM, KEY_LENGTH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB
+from config import SEAT_RESERVATION_TTL, PAGE_SIZE, PAGE_SIZE_MAX
 
 
 def execute_with_retry(func, max_retries=3):
@@ -23,341 +27,778 @@ def execute_with_retry(func, max_retries=3):
     return None
 
 
-@contextmanager
-def get_db():
-    """数据库连接上下文管理器"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    # 开启外键约束支持
-    conn.execute("PRAGMA foreign_keys = ON")
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
+class ConnectionPool:
+    """
+    SQLite 连接池
+    连接只在第一次使用时打开并设置 PRAGMA，之后在 Flask 请求线程、
+    自动踢人线程池以及后台推送/邮件线程之间复用。
+    同一线程内嵌套的 get_db() 调用复用同一个连接，避免两个连接互相等待写锁。
+    """
+
+    def __init__(self, database, max_size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+                 cache_size_kb=DB_CACHE_SIZE_KB):
+        self.database = database
+        self.max_size = max_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+        # 统计信息 (用于基准测试和排查)
+        self.opened_count = 0
+        self.checkout_count = 0
+
+    def _connect(self):
+        """打开一个新连接并完成一次性的 PRAGMA 设置"""
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        # 开启外键约束支持
+        conn.execute("PRAGMA foreign_keys = ON")
+        # WAL 模式下读写互不阻塞，synchronous=NORMAL 在 WAL 下是安全的
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        # 负数表示以 KB 为单位
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        with self._lock:
+            self.opened_count += 1
+        return conn
+
+    def acquire(self):
+        """从池中取出一个空闲连接，没有则新建"""
+        with self._lock:
+            self.checkout_count += 1
+            conn = self._idle.pop() if self._idle else None
+        return conn or self._connect()
+
+    def release(self, conn):
+        """归还连接，超过池容量或连接池已关闭时直接关闭"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if not self._closed and len(self._idle) < self.max_size:
+                self._idle.append(conn)
+                return
         conn.close()
 
+    def close(self):
+        """关闭所有空闲连接（正在使用的连接会在归还时关闭）"""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            conn.close()
+
+    @property
+    def local(self):
+        """当前线程持有的连接状态"""
+        return self._local
+
+    def stats(self):
+        """连接池统计"""
+        with self._lock:
+            return {
+                'opened': self.opened_count,
+                'checkouts': self.checkout_count,
+                'idle': len(self._idle)
+            }
 
-def init_db():
-    """初始化数据库"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Teams 表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS teams (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                account_id TEXT NOT NULL,
-                access_token TEXT NOT NULL,
-                organization_id TEXT,
-                email TEXT,
-                last_invite_at TIMESTAMP,
-                token_error_count INTEGER DEFAULT 0,
-                token_status TEXT DEFAULT 'active',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                proxy_id INTEGER,
-                group_type TEXT
-            )
-        ''')
-        
-        # 为已存在的表添加新字段（如果不存在）
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN group_type TEXT')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
-        
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN token_error_count INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
-        
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN token_status TEXT DEFAULT "active"')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
-
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN member_check_error_count INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
 
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN member_check_first_error_at TIMESTAMP')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
+_pool = None
+_pool_lock = threading.Lock()
 
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN active_start TIMESTAMP')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
 
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN active_until TIMESTAMP')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
+def get_pool():
+    """获取全局连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH)
+    return _pool
 
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN member_count INTEGER DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
 
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN note TEXT')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
+def reset_pool(database=None, **kwargs):
+    """关闭当前连接池并按新参数重建（用于切换数据库文件或基准测试）"""
+    global _pool
+    with _pool_lock:
+        old_pool = _pool
+        _pool = ConnectionPool(database or DATABASE_PATH, **kwargs)
+    if old_pool is not None:
+        old_pool.close()
+    return _pool
 
-        try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN is_public BOOLEAN DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
 
+@contextmanager
+def get_db(autonomous=False):
+    """
+    数据库连接上下文管理器（基于连接池，同一线程内可重入）
+    :param autonomous: True 时跳出当前工作单元，单独使用一个连接并立即提交
+                       (用于 Token 错误计数、日志等无论请求成败都必须落库的写入)
+                       注意：进入前会先提交当前工作单元已挂起的写入（SQLite 同一时刻只有一个写事务，
+                       不提交的话两个连接会互相等待写锁）。所以请求中一旦调用了 KickLog.create、
+                       LoginAttempt.record、Team 的错误计数、SeatReservation.claim/release 等 autonomous 写入，
+                       之前的写入就已落库，之后出错只会回滚之后的部分——邀请、踢人路径上的请求并不是整体原子的
+    """
+    pool = get_pool()
+    local = pool.local
+    conn = getattr(local, 'conn', None)
+    in_unit_of_work = getattr(local, 'unit_of_work', False)
+
+    if autonomous and (conn is not None or in_unit_of_work):
+        # 先提交当前线程已挂起的写入，避免同一线程的两个连接互相等待写锁
+        if conn is not None and conn.in_transaction:
+            conn.commit()
+            _run_after_transaction(local)
+        saved = (conn, getattr(local, 'depth', 0), in_unit_of_work)
+        local.conn, local.depth, local.unit_of_work = None, 0, False
         try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN allow_public_manage BOOLEAN DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
-
+            with get_db() as own_conn:
+                yield own_conn
+        finally:
+            local.conn, local.depth, local.unit_of_work = saved
+        return
+
+    if conn is None and in_unit_of_work:
+        # 工作单元内第一次访问数据库：连接保留到请求结束时统一提交
+        conn = pool.acquire()
+        local.conn = conn
+        local.depth = 0
+
+    if conn is not None:
+        # 嵌套调用：复用外层连接，由最外层负责提交
+        local.depth += 1
         try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN will_renew BOOLEAN DEFAULT 1')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
-
+            yield conn
+        finally:
+            local.depth -= 1
+        return
+
+    conn = pool.acquire()
+    local.conn = conn
+    local.depth = 1
+    committed = False
+    try:
+        yield conn
+        conn.commit()
+        committed = True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        local.conn = None
+        local.depth = 0
+        pool.release(conn)
+        _run_after_transaction(local, committed)
+
+
+def on_transaction_end(func):
+    """
+    在当前线程的事务提交后执行 func，事务回滚时丢弃；没有进行中的事务时立即执行
+    用于缓存失效、到期调度登记：其他线程读到的已经是提交后的数据，回滚掉的写入不会触发
+    """
+    local = get_pool().local
+    conn = getattr(local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        if not hasattr(local, 'after_transaction'):
+            local.after_transaction = []
+        local.after_transaction.append(func)
+    else:
+        func()
+
+
+def _run_after_transaction(local, committed=True):
+    """事务结束：提交时执行 on_transaction_end 注册的回调，回滚时直接丢弃"""
+    callbacks = getattr(local, 'after_transaction', None)
+    if not callbacks:
+        return
+    local.after_transaction = []
+    if not committed:
+        return
+    for func in callbacks:
         try:
-            cursor.execute('ALTER TABLE teams ADD COLUMN proxy_id INTEGER')
-        except sqlite3.OperationalError:
-            pass  # 字段已存在
+            func()
+        except Exception as e:
+            print(f"⚠️ 事务结束回调执行失败: {e}")
 
-        # Access Keys 表 (重构: 每个邀请码对应一个 Team)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS access_keys (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                team_id INTEGER,
-                key_code TEXT NOT NULL UNIQUE,
-                is_temp BOOLEAN DEFAULT 0,
-                temp_hours INTEGER DEFAULT 0,
-                is_cancelled BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE SET NULL
-            )
-        ''')
-        
-        # Invitations 表（记录所有邀请）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS invitations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                team_id INTEGER NOT NULL,
-                key_id INTEGER,
-                email TEXT NOT NULL,
-                user_id TEXT,
-                invite_id TEXT,
-                status TEXT DEFAULT 'pending',
-                is_temp BOOLEAN DEFAULT 0,
-                temp_expire_at TIMESTAMP,
-                is_confirmed BOOLEAN DEFAULT 0,
-                source TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE,
-                FOREIGN KEY (key_id) REFERENCES access_keys (id) ON DELETE SET NULL
-            )
-        ''')
 
-        # 为 invitations 表自动补全字段（如果不存在）
-        try:
-            cursor.execute('ALTER TABLE invitations ADD COLUMN source TEXT')
-        except sqlite3.OperationalError:
-            pass
+def _invalidate_proxy_cache():
+    """Team 或代理变更后清空代理解析缓存"""
+    from utils import invalidate_proxy_cache
+    invalidate_proxy_cache()
 
-        # 自动检测配置表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS auto_kick_config (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                enabled BOOLEAN DEFAULT 0,
-                check_interval_min INTEGER DEFAULT 90,
-                check_interval_max INTEGER DEFAULT 120,
-                start_time TEXT DEFAULT '09:00',
-                end_time TEXT DEFAULT '22:00',
-                timezone TEXT DEFAULT 'Asia/Shanghai',
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
 
-        # 插入默认配置（如果不存在）
-        cursor.execute('SELECT COUNT(*) FROM auto_kick_config')
-        if cursor.fetchone()[0] == 0:
-            cursor.execute('''
-                INSERT INTO auto_kick_config (enabled, check_interval_min, check_interval_max, start_time, end_time)
-                VALUES (0, 90, 120, '09:00', '22:00')
-            ''')
+def _schedule_temp_expiry(invitation_id, temp_expire_at):
+    """临时邀请写入后登记到期时间"""
+    from temp_expiry import temp_expiry_scheduler
+    temp_expiry_scheduler.schedule(invitation_id, temp_expire_at)
 
-        # 踢人日志表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS kick_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                team_id INTEGER NOT NULL,
-                user_id TEXT NOT NULL,
-                email TEXT NOT NULL,
-                reason TEXT,
-                success BOOLEAN DEFAULT 1,
-                error_message TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE
-            )
-        ''')
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS member_notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                team_id INTEGER NOT NULL,
-                user_id TEXT NOT NULL,
-                note TEXT,
-                email TEXT,
-                role TEXT,
-                source TEXT,
-                join_time INTEGER,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(team_id, user_id),
-                FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE
-            )
-        ''')
+def _cancel_temp_expiry(invitation_id):
+    """临时邀请确认后取消到期处理"""
+    from temp_expiry import temp_expiry_scheduler
+    temp_expiry_scheduler.cancel(invitation_id)
 
-        # 为 member_notes 表自动补全字段（如果不存在）
-        try:
-            cursor.execute('ALTER TABLE member_notes ADD COLUMN email TEXT')
-        except sqlite3.OperationalError:
-            pass
-            
-        try:
-            cursor.execute('ALTER TABLE member_notes ADD COLUMN role TEXT')
-        except sqlite3.OperationalError:
-            pass
-            
-        try:
-            cursor.execute('ALTER TABLE member_notes ADD COLUMN source TEXT')
-        except sqlite3.OperationalError:
-            pass
 
-        try:
-            cursor.execute('ALTER TABLE member_notes ADD COLUMN join_time INTEGER')
-        except sqlite3.OperationalError:
-            pass
+def _invalidate_rate_limits():
+    """系统配置变更后让限流器重新读取速率配置"""
+    from rate_limiter import rate_limiter
+    rate_limiter.invalidate()
 
-        # 来源字典表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                username TEXT UNIQUE,
-                password TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 为 sources 表自动补全字段
-        try:
-            cursor.execute('ALTER TABLE sources ADD COLUMN username TEXT')
-        except sqlite3.OperationalError:
-            pass
-        
-        try:
-            cursor.execute('ALTER TABLE sources ADD COLUMN password TEXT')
-        except sqlite3.OperationalError:
-            pass
 
-        # 创建索引
-        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sources_username ON sources(username)")
+def begin_unit_of_work():
+    """
+    开启当前线程的工作单元（一个 HTTP 请求一个连接、一个事务）
+    之后所有 get_db() 调用共享同一连接，直到 commit_unit_of_work() / end_unit_of_work() 时统一提交
+    flush_unit_of_work() 和 get_db(autonomous=True) 会提前提交已挂起的写入，见 get_db 的说明
+    """
+    local = get_pool().local
+    if getattr(local, 'unit_of_work', False) or getattr(local, 'conn', None) is not None:
+        return False
+    local.unit_of_work = True
+    return True
 
 
-        # 登录失败记录表 (fail2ban)
+def flush_unit_of_work():
+    """
+    提交当前工作单元中已挂起的写入（不结束工作单元）
+    在发起外部网络请求前调用，避免在等待网络期间长时间持有 SQLite 写锁
+    """
+    local = get_pool().local
+    conn = getattr(local, 'conn', None)
+    if getattr(local, 'unit_of_work', False) and conn is not None and conn.in_transaction:
+        conn.commit()
+        _run_after_transaction(local)
+
+
+def commit_unit_of_work():
+    """
+    提交当前工作单元已挂起的写入（在响应发出前调用，不结束工作单元）
+    提交失败时回滚并抛出 sqlite3.Error，由调用方把响应改为失败
+    """
+    local = get_pool().local
+    conn = getattr(local, 'conn', None)
+    if not getattr(local, 'unit_of_work', False) or conn is None or not conn.in_transaction:
+        return
+    try:
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        _run_after_transaction(local, committed=False)
+        raise
+    _run_after_transaction(local)
+
+
+def end_unit_of_work(exc=None):
+    """
+    结束当前线程的工作单元：无异常则提交，有异常则回滚，并归还连接
+    正常请求在 commit_unit_of_work() 中已经提交，这里通常只剩归还连接
+    """
+    pool = get_pool()
+    local = pool.local
+    if not getattr(local, 'unit_of_work', False):
+        return
+
+    conn = getattr(local, 'conn', None)
+    local.unit_of_work = False
+    local.conn = None
+    local.depth = 0
+    if conn is None:
+        return
+
+    committed = False
+    try:
+        if exc is None:
+            conn.commit()
+            committed = True
+        else:
+            conn.rollback()
+    except sqlite3.Error as e:
+        print(f"❌ 工作单元提交失败: {e}")
+        conn.rollback()
+    finally:
+        pool.release(conn)
+        _run_after_transaction(local, committed)
+
+
+def _get_schema_version(conn):
+    """读取数据库结构版本 (PRAGMA user_version)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _add_column(cursor, table, column, definition):
+    """字段不存在时才添加（兼容迁移机制引入前创建的旧数据库）"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _migrate_baseline(cursor):
+    """v1: 基础表结构、旧版本补全的字段以及默认配置"""
+    # Teams 表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS teams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            account_id TEXT NOT NULL,
+            access_token TEXT NOT NULL,
+            organization_id TEXT,
+            email TEXT,
+            last_invite_at TIMESTAMP,
+            token_error_count INTEGER DEFAULT 0,
+            token_status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            proxy_id INTEGER,
+            group_type TEXT
+        )
+    ''')
+    
+    # 为已存在的表添加新字段（如果不存在）
+    _add_column(cursor, 'teams', 'group_type', 'TEXT')
+    _add_column(cursor, 'teams', 'token_error_count', 'INTEGER DEFAULT 0')
+    _add_column(cursor, 'teams', 'token_status', "TEXT DEFAULT 'active'")
+    _add_column(cursor, 'teams', 'member_check_error_count', 'INTEGER DEFAULT 0')
+    _add_column(cursor, 'teams', 'member_check_first_error_at', 'TIMESTAMP')
+    _add_column(cursor, 'teams', 'active_start', 'TIMESTAMP')
+    _add_column(cursor, 'teams', 'active_until', 'TIMESTAMP')
+    _add_column(cursor, 'teams', 'member_count', 'INTEGER DEFAULT 0')
+    _add_column(cursor, 'teams', 'note', 'TEXT')
+    _add_column(cursor, 'teams', 'is_public', 'BOOLEAN DEFAULT 0')
+    _add_column(cursor, 'teams', 'allow_public_manage', 'BOOLEAN DEFAULT 0')
+    _add_column(cursor, 'teams', 'will_renew', 'BOOLEAN DEFAULT 1')
+    _add_column(cursor, 'teams', 'proxy_id', 'INTEGER')
+
+    # Access Keys 表 (重构: 每个邀请码对应一个 Team)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS access_keys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER,
+            key_code TEXT NOT NULL UNIQUE,
+            is_temp BOOLEAN DEFAULT 0,
+            temp_hours INTEGER DEFAULT 0,
+            is_cancelled BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE SET NULL
+        )
+    ''')
+    
+    # Invitations 表（记录所有邀请）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS invitations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            key_id INTEGER,
+            email TEXT NOT NULL,
+            user_id TEXT,
+            invite_id TEXT,
+            status TEXT DEFAULT 'pending',
+            is_temp BOOLEAN DEFAULT 0,
+            temp_expire_at TIMESTAMP,
+            is_confirmed BOOLEAN DEFAULT 0,
+            source TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE,
+            FOREIGN KEY (key_id) REFERENCES access_keys (id) ON DELETE SET NULL
+        )
+    ''')
+
+    # 为 invitations 表自动补全字段（如果不存在）
+    _add_column(cursor, 'invitations', 'source', 'TEXT')
+
+    # 自动检测配置表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS auto_kick_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            enabled BOOLEAN DEFAULT 0,
+            check_interval_min INTEGER DEFAULT 90,
+            check_interval_max INTEGER DEFAULT 120,
+            start_time TEXT DEFAULT '09:00',
+            end_time TEXT DEFAULT '22:00',
+            timezone TEXT DEFAULT 'Asia/Shanghai',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 插入默认配置（如果不存在）
+    cursor.execute('SELECT COUNT(*) FROM auto_kick_config')
+    if cursor.fetchone()[0] == 0:
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS login_attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ip_address TEXT NOT NULL,
-                username TEXT,
-                success BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            INSERT INTO auto_kick_config (enabled, check_interval_min, check_interval_max, start_time, end_time)
+            VALUES (0, 90, 120, '09:00', '22:00')
         ''')
 
-        # 创建索引加速查询
+    # 踢人日志表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS kick_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            email TEXT NOT NULL,
+            reason TEXT,
+            success BOOLEAN DEFAULT 1,
+            error_message TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS member_notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            note TEXT,
+            email TEXT,
+            role TEXT,
+            source TEXT,
+            join_time INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(team_id, user_id),
+            FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE
+        )
+    ''')
+
+    # 为 member_notes 表自动补全字段（如果不存在）
+    _add_column(cursor, 'member_notes', 'email', 'TEXT')
+    _add_column(cursor, 'member_notes', 'role', 'TEXT')
+    _add_column(cursor, 'member_notes', 'source', 'TEXT')
+    _add_column(cursor, 'member_notes', 'join_time', 'INTEGER')
+
+    # 来源字典表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            username TEXT UNIQUE,
+            password TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 为 sources 表自动补全字段
+    _add_column(cursor, 'sources', 'username', 'TEXT')
+    _add_column(cursor, 'sources', 'password', 'TEXT')
+
+    # 创建索引
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_sources_username ON sources(username)")
+
+
+    # 登录失败记录表 (fail2ban)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS login_attempts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ip_address TEXT NOT NULL,
+            username TEXT,
+            success BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 创建索引加速查询
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_login_attempts_ip
+        ON login_attempts(ip_address, created_at)
+    ''')
+
+    # 系统配置表 (System Config)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_configs (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            description TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 素材共享表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS material_shares (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            category TEXT,
+            source TEXT,
+            file_size INTEGER,
+            mime_type TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 代理地址表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS proxy_addresses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            protocol TEXT NOT NULL,
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            username TEXT,
+            password TEXT,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # 初始化默认配置 (邮件相关)
+    default_configs = [
+        ('team_popup_content', """<p>！！！劳烦各位拉了人进组之后点一下刷新，确定进组了。</p>
+<p>（不刷新数据没同步可能导致超员）</p>
+<p>刷新之后没有来源找我改一下。</p>
+<p>！！！没有来源的账号我会踢出去</p>
+<p>！！！发现有超过5个的组，请立刻联系我。</p>""", 'Team页面弹窗内容'),
+        ('mail_smtp_server', '', 'SMTP 服务器地址 (如 smtp.qq.com)'),
+        ('mail_smtp_port', '465', 'SMTP 端口 (SSL通常为465, TLS通常为587)'),
+        ('mail_smtp_user', '', 'SMTP 用户名/邮箱'),
+        ('mail_smtp_password', '', 'SMTP 密码/授权码'),
+        ('mail_sender_name', 'ChatGPT Team Admin', '发件人显示名称'),
+        ('mail_use_ssl', 'true', '是否使用 SSL (true/false)'),
+        ('mail_enabled', 'false', '是否启用邮件功能 (true/false)'),
+        ('mail_template_export_tutorial', '<h2>ChatGPT Team 使用教程</h2><p>您好，</p><p>欢迎加入我们的 Team！以下是导出数据的详细教程...</p>', '导出教程邮件模板'),
+        ('bark_server', 'https://api.day.app', 'Bark 服务器地址'),
+        ('bark_key', '', 'Bark Key'),
+        ('team_full_warning_enabled', 'false', '是否开启满员预警 (true/false)'),
+        ('team_full_warning_template', 'Team [{team_name}] 即将满员！当前成员数: {current_count}, 新邀请: {email}', '满员预警消息模板'),
+        ('enable_smtp', 'false', '开关自建邮件服务 (true/false)'),
+        ('request_base_url', '', '请求baseUrl'),
+        ('site_password', '', '网站密码'),
+        ('admin_password', '', '管理密码'),
+        ('email_domain', '', '邮箱域名'),
+    ]
+
+    for key, value, desc in default_configs:
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_login_attempts_ip
-            ON login_attempts(ip_address, created_at)
-        ''')
-
-        # 系统配置表 (System Config)
+            INSERT OR IGNORE INTO system_configs (key, value, description)
+            VALUES (?, ?, ?)
+        ''', (key, value, desc))
+
+
+def _migrate_hot_indexes(cursor):
+    """v2: 热点查询索引 (邮箱统一按 LOWER(email) 比较，使用表达式索引)"""
+    hot_indexes = [
+        'CREATE INDEX IF NOT EXISTS idx_invitations_team_email ON invitations(team_id, LOWER(email))',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_email ON invitations(LOWER(email))',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_team_status ON invitations(team_id, status)',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_team_user ON invitations(team_id, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_source_created ON invitations(source, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_key_status ON invitations(key_id, status)',
+        '''CREATE INDEX IF NOT EXISTS idx_invitations_temp_pending ON invitations(temp_expire_at)
+           WHERE is_temp = 1 AND is_confirmed = 0''',
+        'CREATE INDEX IF NOT EXISTS idx_kick_logs_team_created ON kick_logs(team_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_kick_logs_created ON kick_logs(created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_member_notes_team_email ON member_notes(team_id, LOWER(email))',
+    ]
+    for sql in hot_indexes:
+        cursor.execute(sql)
+
+
+def _migrate_sweep_settings(cursor):
+    """v3: 自动踢人扫描的并发与限流配置"""
+    sweep_configs = [
+        ('auto_kick_sweep_mode', 'async', '自动检测扫描方式 (async/thread)'),
+        ('auto_kick_concurrency', '8', '自动检测全局并发数'),
+        ('auto_kick_proxy_concurrency', '2', '自动检测单个代理的并发数'),
+        ('auto_kick_rate_per_second', '2', '自动检测请求速率 (每秒请求数)'),
+        ('auto_kick_rate_burst', '4', '自动检测请求突发上限'),
+    ]
+    for key, value, desc in sweep_configs:
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_configs (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                description TEXT,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # 素材共享表
+            INSERT OR IGNORE INTO system_configs (key, value, description)
+            VALUES (?, ?, ?)
+        ''', (key, value, desc))
+
+
+def _migrate_rate_limit_settings(cursor):
+    """v4: chatgpt.com 请求的中央限流配置"""
+    rate_limit_configs = [
+        ('rate_limit_proxy_per_second', '5', '单个代理每秒最多请求数'),
+        ('rate_limit_proxy_burst', '10', '单个代理请求突发上限'),
+        ('rate_limit_account_per_second', '2', '单个 Team 账号每秒最多请求数'),
+        ('rate_limit_account_burst', '4', '单个 Team 账号请求突发上限'),
+        ('rate_limit_background_reserve', '2', '后台任务需为交互请求预留的令牌数'),
+    ]
+    for key, value, desc in rate_limit_configs:
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS material_shares (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT NOT NULL,
-                category TEXT,
-                source TEXT,
-                file_size INTEGER,
-                mime_type TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+            INSERT OR IGNORE INTO system_configs (key, value, description)
+            VALUES (?, ?, ?)
+        ''', (key, value, desc))
+
+
+def _migrate_seat_reservations(cursor):
+    """v5: 席位预占表（邀请前先原子地占住一个名额，邀请完成后转正或释放）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS seat_reservations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            email TEXT,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_seat_reservations_team_expires ON seat_reservations(team_id, expires_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_seat_reservations_expires ON seat_reservations(expires_at)')
+
+
+def _migrate_members_snapshot(cursor):
+    """v6: 记录最近一次同步的成员快照哈希，成员未变化时后台同步跳过写库"""
+    _add_column(cursor, 'teams', 'members_hash', 'TEXT')
+    _add_column(cursor, 'teams', 'members_synced_at', 'TIMESTAMP')
+
+
+def _migrate_team_invitations_index(cursor):
+    """v7: 按 Team 倒序读取邀请记录的索引（团队列表的最近邀请、Team 邀请列表）"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_invitations_team_created ON invitations(team_id, created_at, id)')
+
+
+def _migrate_page_indexes(cursor):
+    """
+    v8: 列表键集分页索引，均以 (created_at, id) 结尾，按筛选条件各建一个
+    原 (source, created_at) 和 kick_logs 的两个索引被新索引覆盖，一并删除
+    """
+    page_indexes = [
+        'CREATE INDEX IF NOT EXISTS idx_invitations_created ON invitations(created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_status_created ON invitations(status, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_invitations_source_created_id ON invitations(source, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_kick_logs_created_id ON kick_logs(created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_kick_logs_team_created_id ON kick_logs(team_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_material_shares_created ON material_shares(created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_material_shares_category_created ON material_shares(category, created_at, id)',
+    ]
+    for sql in page_indexes:
+        cursor.execute(sql)
+    for name in ('idx_invitations_source_created', 'idx_kick_logs_team_created', 'idx_kick_logs_created'):
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+def _migrate_member_email_index(cursor):
+    """v9: member_notes 按邮箱查找所在 Team 的索引（邮箱 → (team_id, user_id) 反向索引）"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_member_notes_email ON member_notes(LOWER(email))')
+
+
+# 数据库迁移列表: (版本号, 说明, 迁移函数)
+# 只能在末尾追加新版本，已发布的迁移不要修改
+MIGRATIONS = [
+    (1, '基础表结构', _migrate_baseline),
+    (2, '热点查询索引', _migrate_hot_indexes),
+    (3, '自动检测扫描配置', _migrate_sweep_settings),
+    (4, '请求限流配置', _migrate_rate_limit_settings),
+    (5, '席位预占表', _migrate_seat_reservations),
+    (6, '成员快照哈希', _migrate_members_snapshot),
+    (7, 'Team 邀请列表索引', _migrate_team_invitations_index),
+    (8, '列表分页索引', _migrate_page_indexes),
+    (9, '成员邮箱反向索引', _migrate_member_email_index),
+]
+
+
+# Team 占用名额的 SQL 表达式（t 为 teams 表别名），各处判断满员都使用同一统计口径:
+# member_notes 中的实际成员数（排除 Owner）
+# + invitations 中状态为 'success' 且邮箱不在 member_notes 中的数量 (即 Pending 邀请)
+# + 尚未过期的席位预占数
+# 相关子查询按 team_id 走索引，单个 Team 查询时不会扫描全表
+OCCUPIED_SEATS_SQL = '''
+    (SELECT COUNT(*) FROM member_notes m
+     WHERE m.team_id = t.id AND m.role != 'account-owner')
+  + (SELECT COUNT(DISTINCT i.email) FROM invitations i
+     WHERE i.team_id = t.id
+       AND i.status = 'success'
+       AND i.email IS NOT NULL AND i.email != ''
+       AND NOT EXISTS (
+           SELECT 1 FROM member_notes mn
+           WHERE mn.team_id = i.team_id
+             AND LOWER(mn.email) = LOWER(i.email)
+             AND mn.role != 'account-owner'
+       ))
+  + (SELECT COUNT(*) FROM seat_reservations r
+     WHERE r.team_id = t.id AND r.expires_at > datetime('now'))
+'''
+
+# 每个 Team 的名额上限（不含 Owner）
+TEAM_CAPACITY = 4
+
+
+def encode_page_cursor(created_at, row_id):
+    """把一页最后一行的 (created_at, id) 编码为翻页游标"""
+    raw = f"{created_at}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_page_cursor(page_cursor):
+    """解析翻页游标，返回 (created_at, id)，格式不正确时抛出 ValueError"""
+    try:
+        padded = page_cursor + '=' * (-len(page_cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').rsplit('|', 1)
+        return created_at, int(row_id)
+    except Exception:
+        raise ValueError('无效的翻页游标')
+
+
+def _keyset_page(cursor, select_sql, alias, conditions, params, limit=None, page_cursor=None,
+                 date_from=None, date_to=None):
+    """
+    按 (created_at, id) 倒序做键集分页，返回 {'items': 本页记录, 'next_cursor': 下一页游标，没有下一页时为 None}
+    - select_sql 为不带 WHERE/ORDER BY 的查询，alias 为带 created_at/id 列的表别名
+    - 时间范围为 UTC 的 [date_from, date_to)，格式与 created_at 相同 (YYYY-MM-DD[ HH:MM:SS])
+    - 多取一行判断是否还有下一页；翻页条件按行值比较，配合以 (created_at, id) 结尾的索引不需要排序
+    """
+    limit = max(1, min(int(limit or PAGE_SIZE), PAGE_SIZE_MAX))
+    conditions = list(conditions)
+    params = list(params)
+    if date_from:
+        conditions.append(f'{alias}.created_at >= ?')
+        params.append(date_from)
+    if date_to:
+        conditions.append(f'{alias}.created_at < ?')
+        params.append(date_to)
+    if page_cursor:
+        conditions.append(f'({alias}.created_at, {alias}.id) < (?, ?)')
+        params.extend(decode_page_cursor(page_cursor))
+
+    sql = select_sql
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += f' ORDER BY {alias}.created_at DESC, {alias}.id DESC LIMIT ?'
+    cursor.execute(sql, params + [limit + 1])
+    items = [dict(row) for row in cursor.fetchall()]
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_page_cursor(items[-1]['created_at'], items[-1]['id'])
+    return {'items': items, 'next_cursor': next_cursor}
 
-        # 代理地址表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS proxy_addresses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                protocol TEXT NOT NULL,
-                ip TEXT NOT NULL,
-                port INTEGER NOT NULL,
-                username TEXT,
-                password TEXT,
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
 
-        # 初始化默认配置 (邮件相关)
-        default_configs = [
-            ('team_popup_content', """<p>！！！劳烦各位拉了人进组之后点一下刷新，确定进组了。</p>
-<p>（不刷新数据没同步可能导致超员）</p>
-<p>刷新之后没有来源找我改一下。</p>
-<p>！！！没有来源的账号我会踢出去</p>
-<p>！！！发现有超过5个的组，请立刻联系我。</p>""", 'Team页面弹窗内容'),
-            ('mail_smtp_server', '', 'SMTP 服务器地址 (如 smtp.qq.com)'),
-            ('mail_smtp_port', '465', 'SMTP 端口 (SSL通常为465, TLS通常为587)'),
-            ('mail_smtp_user', '', 'SMTP 用户名/邮箱'),
-            ('mail_smtp_password', '', 'SMTP 密码/授权码'),
-            ('mail_sender_name', 'ChatGPT Team Admin', '发件人显示名称'),
-            ('mail_use_ssl', 'true', '是否使用 SSL (true/false)'),
-            ('mail_enabled', 'false', '是否启用邮件功能 (true/false)'),
-            ('mail_template_export_tutorial', '<h2>ChatGPT Team 使用教程</h2><p>您好，</p><p>欢迎加入我们的 Team！以下是导出数据的详细教程...</p>', '导出教程邮件模板'),
-            ('bark_server', 'https://api.day.app', 'Bark 服务器地址'),
-            ('bark_key', '', 'Bark Key'),
-            ('team_full_warning_enabled', 'false', '是否开启满员预警 (true/false)'),
-            ('team_full_warning_template', 'Team [{team_name}] 即将满员！当前成员数: {current_count}, 新邀请: {email}', '满员预警消息模板'),
-            ('enable_smtp', 'false', '开关自建邮件服务 (true/false)'),
-            ('request_base_url', '', '请求baseUrl'),
-            ('site_password', '', '网站密码'),
-            ('admin_password', '', '管理密码'),
-            ('email_domain', '', '邮箱域名'),
-        ]
-
-        for key, value, desc in default_configs:
-            cursor.execute('''
-                INSERT OR IGNORE INTO system_configs (key, value, description)
-                VALUES (?, ?, ?)
-            ''', (key, value, desc))
+def init_db():
+    """
+    初始化数据库：按 PRAGMA user_version 只执行尚未应用的迁移
+    数据库已是最新版本时只读取一次 user_version，不做任何结构变更
+    """
+    latest = MIGRATIONS[-1][0]
+    with get_db(autonomous=True) as conn:
+        if _get_schema_version(conn) >= latest:
+            return
 
-        conn.commit()
+        for version, description, migrate in MIGRATIONS:
+            # 每个版本单独一个写事务，失败时整体回滚，user_version 不会前进
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 拿到写锁后重新读取版本，多个进程同时启动时只有一个会执行迁移
+                if _get_schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                migrate(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {int(version)}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"✅ 数据库迁移 v{version}: {description}")
 
 
 class Team:
@@ -372,6 +813,7 @@ class Team:
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (name, account_id, access_token, organization_id, email, is_public, allow_public_manage, proxy_id, group_type))
             team_id = cursor.lastrowid
+            on_transaction_end(_invalidate_proxy_cache)
 
             return team_id
     
@@ -468,6 +910,7 @@ class Team:
                 params.append(team_id)
                 sql = f"UPDATE teams SET {', '.join(updates)} WHERE id = ?"
                 cursor.execute(sql, params)
+                on_transaction_end(_invalidate_proxy_cache)
 
     @staticmethod
     def update_subscription_info(team_id, active_start, active_until, will_renew=None):
@@ -507,6 +950,43 @@ class Team:
                 WHERE id = ?
             ''', (count, team_id))
 
+    @staticmethod
+    def update_members_snapshot(team_id, members_hash):
+        """记录成员快照哈希和同步时间"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE teams
+                SET members_hash = ?,
+                    members_synced_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', (members_hash, team_id))
+
+    @staticmethod
+    def get_recently_active_ids(window_seconds):
+        """
+        最近 window_seconds 秒内有成员变动迹象的 Team id 集合：
+        有过邀请、有踢人记录，或有临时邀请在此期间到期/即将到期
+        """
+        window = f'{int(window_seconds)} seconds'
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT t.id FROM teams t
+                WHERE t.last_invite_at >= datetime('now', '-' || ?)
+                   OR EXISTS (
+                       SELECT 1 FROM kick_logs k
+                       WHERE k.team_id = t.id AND k.created_at >= datetime('now', '-' || ?)
+                   )
+                   OR EXISTS (
+                       SELECT 1 FROM invitations i
+                       WHERE i.team_id = t.id
+                         AND i.is_temp = 1 AND i.is_confirmed = 0
+                         AND i.temp_expire_at BETWEEN datetime('now', '-' || ?) AND datetime('now', '+' || ?)
+                   )
+            ''', (window, window, window, window))
+            return {row[0] for row in cursor.fetchall()}
+
     @staticmethod
     def update_note(team_id, note):
         """更新 Team 的备注"""
@@ -525,6 +1005,7 @@ class Team:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM teams WHERE id = ?', (team_id,))
+            on_transaction_end(_invalidate_proxy_cache)
 
     @staticmethod
     def get_total_count():
@@ -538,10 +1019,10 @@ class Team:
     def get_available_teams():
         """获取所有未满员的 Team (轮询机制: 按最后邀请时间排序，最久未使用的优先)"""
         teams = Team.get_all()
+        counts = Invitation.get_success_counts()
         available = []
         for team in teams:
-            invitations = Invitation.get_by_team(team['id'])
-            member_count = len({inv['email'] for inv in invitations if inv['status'] == 'success'})
+            member_count = counts.get(team['id'], 0)
             if member_count < 4:
                 team_copy = dict(team)
                 team_copy['member_count'] = member_count
@@ -572,7 +1053,7 @@ class Team:
     @staticmethod
     def increment_token_error(team_id):
         """增加token错误计数，如果达到5次则标记为expired"""
-        with get_db() as conn:
+        with get_db(autonomous=True) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE teams
@@ -592,7 +1073,7 @@ class Team:
     @staticmethod
     def reset_token_error(team_id):
         """重置token错误计数（当token更新或请求成功时）"""
-        with get_db() as conn:
+        with get_db(autonomous=True) as conn:
             cursor = conn.cursor()
 
             # 获取检查成员的错误状态，判断是否应该保持expired
@@ -649,7 +1130,7 @@ class Team:
     @staticmethod
     def increment_member_check_error(team_id):
         """增加检查成员时的token错误计数（10分钟内超过3次则标记为expired）"""
-        with get_db() as conn:
+        with get_db(autonomous=True) as conn:
             cursor = conn.cursor()
 
             # 获取当前状态
@@ -739,7 +1220,7 @@ class Team:
     @staticmethod
     def reset_member_check_error(team_id):
         """重置检查成员的错误计数（当请求成功时）"""
-        with get_db() as conn:
+        with get_db(autonomous=True) as conn:
             cursor = conn.cursor()
 
             # 获取邀请成员的错误计数，判断是否应该保持expired状态
@@ -807,6 +1288,7 @@ class Team:
                     deleted_teams.append(team)
                 except Exception as e:
                     print(f"删除Team {team['id']} 失败: {e}")
+            on_transaction_end(_invalidate_proxy_cache)
 
         return {
             'deleted_count': deleted_count,
@@ -904,21 +1386,38 @@ class Invitation:
                                         status, is_temp, temp_expire_at, source)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (team_id, key_id, email, user_id, invite_id, status, is_temp, temp_expire_at, source))
-            return cursor.lastrowid
+            invitation_id = cursor.lastrowid
+            if is_temp and temp_expire_at:
+                # 事务提交后再登记到期调度，回滚掉的邀请不会进入调度
+                on_transaction_end(lambda: _schedule_temp_expiry(invitation_id, temp_expire_at))
+            return invitation_id
 
     @staticmethod
-    def get_by_source(source):
-        """获取指定来源的所有邀请"""
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+    def get_page(page_cursor=None, limit=None, status=None, team_id=None, source=None,
+                 email=None, date_from=None, date_to=None):
+        """
+        分页获取邀请记录（带 team_name），按创建时间倒序，email 为邮箱包含的关键字
+        返回 {'items': [...], 'next_cursor': ...}，把 next_cursor 传回 page_cursor 取下一页
+        """
+        conditions, params = [], []
+        if status:
+            conditions.append('i.status = ?')
+            params.append(status)
+        if team_id:
+            conditions.append('i.team_id = ?')
+            params.append(team_id)
+        if source:
+            conditions.append('i.source = ?')
+            params.append(source)
+        if email:
+            conditions.append('LOWER(i.email) LIKE ?')
+            params.append(f"%{email.strip().lower()}%")
+        with get_db() as conn:
+            return _keyset_page(conn.cursor(), '''
                 SELECT i.*, t.name as team_name
                 FROM invitations i
                 JOIN teams t ON i.team_id = t.id
-                WHERE i.source = ?
-                ORDER BY i.created_at DESC
-            ''', (source,))
-            return [dict(row) for row in cursor.fetchall()]
+            ''', 'i', conditions, params, limit, page_cursor, date_from, date_to)
 
     @staticmethod
     def get_by_team(team_id):
@@ -933,17 +1432,40 @@ class Invitation:
             return [dict(row) for row in cursor.fetchall()]
 
     @staticmethod
-    def get_all():
-        """获取所有邀请"""
+    def get_team_summaries(latest=5):
+        """
+        所有 Team 的邀请概况: {team_id: {'total': 总数, 'counts': {状态: 数量}, 'latest': 最近 latest 条邀请}}
+        按状态计数走 (team_id, status) 索引分组，最近记录按 Team 走索引各取 latest 条，查询次数与 Team 数量无关
+        """
+        summaries = {}
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT i.*, t.name as team_name
-                FROM invitations i
-                JOIN teams t ON i.team_id = t.id
-                ORDER BY i.created_at DESC
+                SELECT team_id, status, COUNT(*) FROM invitations
+                GROUP BY team_id, status
             ''')
-            return [dict(row) for row in cursor.fetchall()]
+            for team_id, status, count in cursor.fetchall():
+                summary = summaries.setdefault(team_id, {'total': 0, 'counts': {}, 'latest': []})
+                summary['counts'][status] = count
+                summary['total'] += count
+
+            if latest > 0:
+                # CROSS JOIN 固定以 teams 为外层，每个 Team 沿 (team_id, created_at, id) 索引只读最近 latest 条
+                cursor.execute('''
+                    SELECT i.* FROM teams t
+                    CROSS JOIN invitations i ON i.id IN (
+                        SELECT id FROM invitations
+                        WHERE team_id = t.id
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    )
+                    ORDER BY i.team_id, i.created_at DESC, i.id DESC
+                ''', (latest,))
+                for row in cursor.fetchall():
+                    invitation = dict(row)
+                    summary = summaries.setdefault(invitation['team_id'], {'total': 0, 'counts': {}, 'latest': []})
+                    summary['latest'].append(invitation)
+        return summaries
 
     @staticmethod
     def get_all_emails_by_team(team_id):
@@ -957,58 +1479,71 @@ class Invitation:
             return [row[0] for row in cursor.fetchall()]
 
     @staticmethod
-    def get_success_count_by_team(team_id):
+    def get_success_counts(team_ids=None):
         """
-        获取 Team 的成功邀请数量（用于判断Team是否已满）
-        逻辑修正：
-        1. 获取 member_notes 中的实际成员数量
-        2. 获取 invitations 中状态为 'success' 且不在 member_notes 中的数量 (即 Pending 邀请)
-        3. 两者相加才是真正的占用名额
+        一次查询获取多个 Team 的占用名额（用于判断Team是否已满），统计口径见 OCCUPIED_SEATS_SQL
+        team_ids 为 None 时统计全部 Team，返回 {team_id: 占用名额}
         """
+        params = []
+        where = ''
+        if team_ids is not None:
+            team_ids = list(team_ids)
+            if not team_ids:
+                return {}
+            where = f"WHERE t.id IN ({','.join('?' * len(team_ids))})"
+            params = team_ids
+
         with get_db() as conn:
             cursor = conn.cursor()
-            
-            # 1. 实际成员数 (排除 Owner)
-            cursor.execute('''
-                SELECT COUNT(*) FROM member_notes 
-                WHERE team_id = ? AND role != 'account-owner'
-            ''', (team_id,))
-            member_count = cursor.fetchone()[0]
-            
-            # 2. 获取实际成员邮箱集合
-            cursor.execute('''
-                SELECT email FROM member_notes 
-                WHERE team_id = ? AND role != 'account-owner'
-            ''', (team_id,))
-            member_emails = {row[0].lower() for row in cursor.fetchall() if row[0]}
-            
-            # 3. 获取邀请中(success)但未加入的记录
-            cursor.execute('''
-                SELECT DISTINCT email FROM invitations
-                WHERE team_id = ? AND status = 'success'
-            ''', (team_id,))
-            
-            pending_count = 0
-            for row in cursor.fetchall():
-                email = row[0]
-                if email and email.lower() not in member_emails:
-                    pending_count += 1
-            
-            return member_count + pending_count
+            cursor.execute(f'''
+                SELECT t.id, {OCCUPIED_SEATS_SQL}
+                FROM teams t
+                {where}
+            ''', params)
+            return {row[0]: row[1] for row in cursor.fetchall()}
 
     @staticmethod
-    def get_temp_expired():
-        """获取所有已过期的临时邀请（使用UTC时间比较）"""
+    def get_success_count_by_team(team_id):
+        """获取单个 Team 的占用名额，统计口径见 get_success_counts"""
+        return Invitation.get_success_counts([team_id]).get(team_id, 0)
+
+    @staticmethod
+    def get_temp_pending():
+        """获取所有未确认临时邀请的 id 和到期时间（启动时重建到期调度堆）"""
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('''
+                SELECT id, temp_expire_at FROM invitations
+                WHERE is_temp = 1
+                  AND is_confirmed = 0
+                  AND temp_expire_at IS NOT NULL
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_temp_expired(invitation_ids=None):
+        """
+        获取已过期的临时邀请（使用UTC时间比较）
+        invitation_ids 不为空时只查这些邀请（到期调度触发时按主键读取）
+        """
+        where, params = '', []
+        if invitation_ids is not None:
+            invitation_ids = list(invitation_ids)
+            if not invitation_ids:
+                return []
+            where = f"AND id IN ({','.join('?' * len(invitation_ids))})"
+            params = invitation_ids
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
                 SELECT * FROM invitations
                 WHERE is_temp = 1
                   AND is_confirmed = 0
                   AND temp_expire_at IS NOT NULL
-                  AND datetime(temp_expire_at) < datetime('now')
+                  AND temp_expire_at <= datetime('now')
+                  {where}
                 ORDER BY temp_expire_at
-            ''')
+            ''', params)
             return [dict(row) for row in cursor.fetchall()]
 
     @staticmethod
@@ -1021,6 +1556,7 @@ class Invitation:
                 SET is_confirmed = 1
                 WHERE id = ?
             ''', (invitation_id,))
+            on_transaction_end(lambda: _cancel_temp_expiry(invitation_id))
 
     @staticmethod
     def update_user_id(invitation_id, user_id):
@@ -1062,6 +1598,30 @@ class Invitation:
 
 
 
+    @staticmethod
+    def find_teams_by_emails(emails):
+        """
+        批量查找邮箱已所在（已加入或已成功邀请）的 Team，返回 {小写邮箱: team_id}
+        同时查 member_notes 和成功的邀请记录，两边都走 LOWER(email) 索引；按 500 个一组查询
+        """
+        emails = list({email.lower() for email in emails if email})
+        found = {}
+        with get_db() as conn:
+            cursor = conn.cursor()
+            for start in range(0, len(emails), 500):
+                chunk = emails[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    SELECT LOWER(email), team_id FROM member_notes
+                    WHERE LOWER(email) IN ({placeholders})
+                    UNION ALL
+                    SELECT LOWER(email), team_id FROM invitations
+                    WHERE LOWER(email) IN ({placeholders}) AND status = 'success'
+                ''', chunk + chunk)
+                for email, team_id in cursor.fetchall():
+                    found.setdefault(email, team_id)
+        return found
+
     @staticmethod
     def delete_by_email(team_id, email):
         """删除指定team中指定email的邀请记录（线程安全版本，带重试机制）"""
@@ -1134,6 +1694,68 @@ class Invitation:
         #     return deleted_count
 
 
+class SeatReservation:
+    """
+    席位预占：邀请前先占住一个名额，避免并发请求同时邀请进同一个 Team 的最后一个位置
+    预占在独立事务中立即提交，对其他请求（包括其他进程）立刻可见；
+    邀请成功后与邀请记录在同一事务中转正 (commit)，失败时释放 (release)，异常退出的预占到期后自动失效
+    """
+
+    @staticmethod
+    def claim(team_id, email=None, capacity=TEAM_CAPACITY, ttl=SEAT_RESERVATION_TTL):
+        """占用名额未达上限时插入一条预占并返回其 id，已满返回 None"""
+        with get_db(autonomous=True) as conn:
+            # 先拿写锁，"统计名额 + 插入预占"在同一个写事务中完成
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM seat_reservations WHERE expires_at <= datetime('now')")
+            cursor.execute(f'''
+                INSERT INTO seat_reservations (team_id, email, expires_at)
+                SELECT t.id, ?, datetime('now', ?)
+                FROM teams t
+                WHERE t.id = ? AND ({OCCUPIED_SEATS_SQL}) < ?
+            ''', (email, f'+{int(ttl)} seconds', team_id, capacity))
+            return cursor.lastrowid if cursor.rowcount else None
+
+    @staticmethod
+    def claim_many(team_id, emails, capacity=TEAM_CAPACITY, ttl=SEAT_RESERVATION_TTL):
+        """
+        在一个写事务中为多个邮箱依次预占名额，名额用完即停止
+        返回 [(email, 预占 id)]，只包含占到名额的邮箱（按传入顺序）
+        """
+        claimed = []
+        with get_db(autonomous=True) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM seat_reservations WHERE expires_at <= datetime('now')")
+            for email in emails:
+                cursor.execute(f'''
+                    INSERT INTO seat_reservations (team_id, email, expires_at)
+                    SELECT t.id, ?, datetime('now', ?)
+                    FROM teams t
+                    WHERE t.id = ? AND ({OCCUPIED_SEATS_SQL}) < ?
+                ''', (email, f'+{int(ttl)} seconds', team_id, capacity))
+                if not cursor.rowcount:
+                    break
+                claimed.append((email, cursor.lastrowid))
+        return claimed
+
+    @staticmethod
+    def commit(reservation_id):
+        """
+        预占转正：删除预占（名额改由邀请记录占用）
+        在当前工作单元内执行，与 Invitation.create 一起提交，中间不会出现名额空档
+        """
+        with get_db() as conn:
+            conn.execute('DELETE FROM seat_reservations WHERE id = ?', (reservation_id,))
+
+    @staticmethod
+    def release(reservation_id):
+        """释放预占（邀请失败或放弃时调用，立即提交）"""
+        with get_db(autonomous=True) as conn:
+            conn.execute('DELETE FROM seat_reservations WHERE id = ?', (reservation_id,))
+
+
 class AutoKickConfig:
     @staticmethod
     def get():
@@ -1170,10 +1792,10 @@ class AutoKickConfig:
                 updates.append('end_time = ?')
                 params.append(end_time)
 
-        if updates:
-            updates.append('updated_at = CURRENT_TIMESTAMP')
-            sql = f"UPDATE auto_kick_config SET {', '.join(updates)}"
-            cursor.execute(sql, params)
+            if updates:
+                updates.append('updated_at = CURRENT_TIMESTAMP')
+                sql = f"UPDATE auto_kick_config SET {', '.join(updates)}"
+                cursor.execute(sql, params)
 
 
 class MemberNote:
@@ -1192,6 +1814,21 @@ class MemberNote:
             cursor.execute('SELECT * FROM member_notes WHERE team_id = ? ORDER BY updated_at DESC', (team_id,))
             return [dict(row) for row in cursor.fetchall()]
 
+    @staticmethod
+    def find_by_email(email):
+        """
+        通过邮箱查找成员所在的 Team，返回 [{'team_id', 'user_id', 'email', 'role'}]
+        member_notes 由成员同步写入、踢人时删除，可作为邮箱 → (team_id, user_id) 的本地反向索引
+        """
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT team_id, user_id, email, role FROM member_notes
+                WHERE LOWER(email) = LOWER(?)
+                ORDER BY updated_at DESC
+            ''', (email,))
+            return [dict(row) for row in cursor.fetchall()]
+
     @staticmethod
     def get_public_notes(page=1, per_page=10, search_email=None, source_filter=None):
         """分页获取所有成员备注，支持邮箱搜索和来源过滤"""
@@ -1299,6 +1936,70 @@ class MemberNote:
                         ''', (new_source, team_id, user_id))
         return execute_with_retry(_exec)
 
+    @staticmethod
+    def sync_team(team_id, members):
+        """
+        用 API 返回的成员快照整体同步一个 Team 的 member_notes（不覆盖 note 和 source）
+        members: [{'user_id', 'email', 'role', 'join_time'}, ...]
+        与库中现有记录比对后只写入新增/变化的成员 (executemany)，一条 UPDATE 为缺少 source 的成员回填来源，
+        再删除已离开的成员，全部在同一个事务中完成
+        返回 {'upserted': 写入数, 'sourced': 回填来源数, 'deleted': 删除数}
+        """
+        snapshot = {}
+        for member in members:
+            if member.get('user_id'):
+                snapshot[member['user_id']] = (member.get('email'), member.get('role'), member.get('join_time'))
+
+        def _exec():
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT user_id, email, role, join_time FROM member_notes WHERE team_id = ?
+                ''', (team_id,))
+                stored = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+                # 1. 新增或信息有变化的成员
+                changed = [(team_id, user_id) + values for user_id, values in snapshot.items()
+                           if stored.get(user_id) != values]
+                if changed:
+                    cursor.executemany('''
+                        INSERT INTO member_notes (team_id, user_id, email, role, join_time, updated_at)
+                        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(team_id, user_id)
+                        DO UPDATE SET email = excluded.email, role = excluded.role, join_time = excluded.join_time, updated_at = CURRENT_TIMESTAMP
+                    ''', changed)
+
+                # 2. source 为空的成员从 invitations 表回填（取该邮箱最近一条带来源的邀请）
+                cursor.execute('''
+                    UPDATE member_notes
+                    SET source = (
+                            SELECT i.source FROM invitations i
+                            WHERE i.team_id = member_notes.team_id
+                              AND LOWER(i.email) = LOWER(member_notes.email)
+                              AND i.source IS NOT NULL AND i.source != ''
+                            ORDER BY i.created_at DESC LIMIT 1
+                        ),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE team_id = ?
+                      AND (source IS NULL OR source = '')
+                      AND email IS NOT NULL
+                      AND EXISTS (
+                          SELECT 1 FROM invitations i
+                          WHERE i.team_id = member_notes.team_id
+                            AND LOWER(i.email) = LOWER(member_notes.email)
+                            AND i.source IS NOT NULL AND i.source != ''
+                      )
+                ''', (team_id,))
+                sourced = cursor.rowcount
+
+                # 3. 删除已离开的成员
+                departed = [(team_id, user_id) for user_id in stored if user_id not in snapshot]
+                if departed:
+                    cursor.executemany('DELETE FROM member_notes WHERE team_id = ? AND user_id = ?', departed)
+
+                return {'upserted': len(changed), 'sourced': sourced, 'deleted': len(departed)}
+        return execute_with_retry(_exec)
+
     @staticmethod
     def delete_by_user_id(team_id, user_id):
         """删除指定Team中指定user_id的成员记录"""
@@ -1374,12 +2075,74 @@ class MemberNote:
             return [dict(row) for row in cursor.fetchall()]
 
 
+class MemberRoster:
+    """
+    Team 成员名册：已加入成员 (member_notes) 与待进组邀请 (invitations) 合并后的视图
+    一条 UNION ALL 查询得到整个名册:
+    - kind='member': member_notes 每行 LEFT JOIN 该成员 (按 user_id 或邮箱匹配) 最近的一条邀请
+    - kind='invitation': 每个邮箱最近的一条邀请，且该邮箱不在 member_notes 中
+    """
+
+    @staticmethod
+    def get(team_id):
+        """返回名册行列表，已加入成员在前（按 updated_at 倒序），邀请在后（按创建时间倒序）"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM (
+                    SELECT 'member' AS kind, m.user_id, m.email, m.role, m.note, m.source,
+                           m.join_time, m.updated_at,
+                           i.id AS invitation_id, i.status AS invite_status, i.is_temp, i.is_confirmed,
+                           i.temp_expire_at, i.created_at AS invited_at,
+                           0 AS section, m.updated_at AS sort_key
+                    FROM member_notes m
+                    LEFT JOIN invitations i ON i.id = (
+                        SELECT i2.id FROM invitations i2
+                        WHERE i2.team_id = m.team_id
+                          AND (i2.user_id = m.user_id OR LOWER(i2.email) = LOWER(m.email))
+                        ORDER BY i2.created_at DESC, i2.id DESC
+                        LIMIT 1
+                    )
+                    WHERE m.team_id = :team_id
+
+                    UNION ALL
+
+                    SELECT 'invitation' AS kind, i.user_id, i.email, NULL, NULL, i.source,
+                           NULL, NULL,
+                           i.id, i.status, i.is_temp, i.is_confirmed,
+                           i.temp_expire_at, i.created_at,
+                           1, i.created_at
+                    FROM invitations i
+                    WHERE i.team_id = :team_id
+                      AND i.email IS NOT NULL AND i.email != ''
+                      AND i.id = (
+                          SELECT i2.id FROM invitations i2
+                          WHERE i2.team_id = i.team_id AND LOWER(i2.email) = LOWER(i.email)
+                          ORDER BY i2.created_at DESC, i2.id DESC
+                          LIMIT 1
+                      )
+                      AND NOT EXISTS (
+                          SELECT 1 FROM member_notes m
+                          WHERE m.team_id = i.team_id AND LOWER(m.email) = LOWER(i.email)
+                      )
+                )
+                ORDER BY section, sort_key DESC
+            ''', {'team_id': team_id})
+            rows = []
+            for row in cursor.fetchall():
+                item = dict(row)
+                item.pop('section', None)
+                item.pop('sort_key', None)
+                rows.append(item)
+            return rows
+
+
 class KickLog:
     @staticmethod
     def create(team_id, user_id, email, reason, success=True, error_message=None):
         """创建踢人日志（线程安全版本，带重试机制）"""
         def _create():
-            with get_db() as conn:
+            with get_db(autonomous=True) as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                     INSERT INTO kick_logs (team_id, user_id, email, reason, success, error_message)
@@ -1390,18 +2153,39 @@ class KickLog:
         return execute_with_retry(_create)
 
     @staticmethod
-    def get_all(limit=100):
-        """获取所有踢人日志"""
+    def create_many(logs):
+        """
+        批量写入踢人日志（一个事务），logs 为 (team_id, user_id, email, reason, success, error_message) 列表
+        """
+        logs = list(logs)
+        if not logs:
+            return
+
+        def _create():
+            with get_db(autonomous=True) as conn:
+                conn.executemany('''
+                    INSERT INTO kick_logs (team_id, user_id, email, reason, success, error_message)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', logs)
+
+        execute_with_retry(_create)
+
+    @staticmethod
+    def get_page(page_cursor=None, limit=None, team_id=None, success=None, date_from=None, date_to=None):
+        """分页获取踢人日志（带 team_name），按创建时间倒序，返回 {'items': [...], 'next_cursor': ...}"""
+        conditions, params = [], []
+        if team_id:
+            conditions.append('k.team_id = ?')
+            params.append(team_id)
+        if success is not None:
+            conditions.append('k.success = ?')
+            params.append(1 if success else 0)
         with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            return _keyset_page(conn.cursor(), '''
                 SELECT k.*, t.name as team_name
                 FROM kick_logs k
                 JOIN teams t ON k.team_id = t.id
-                ORDER BY k.created_at DESC
-                LIMIT ?
-            ''', (limit,))
-            return [dict(row) for row in cursor.fetchall()]
+            ''', 'k', conditions, params, limit, page_cursor, date_from, date_to)
 
     @staticmethod
     def get_by_team(team_id, limit=50):
@@ -1423,7 +2207,7 @@ class LoginAttempt:
     @staticmethod
     def record(ip_address, username=None, success=False):
         """记录登录尝试"""
-        with get_db() as conn:
+        with get_db(autonomous=True) as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 INSERT INTO login_attempts (ip_address, username, success)
@@ -1570,6 +2354,7 @@ class SystemConfig:
                      cursor.execute('''
                         INSERT INTO system_configs (key, value) VALUES (?, ?)
                     ''', (key, value))
+                on_transaction_end(_invalidate_rate_limits)
         return execute_with_retry(_exec)
         
     @staticmethod
@@ -1586,6 +2371,7 @@ class SystemConfig:
                         value = excluded.value,
                         updated_at = excluded.updated_at
                     ''', (key, value))
+                on_transaction_end(_invalidate_rate_limits)
         return execute_with_retry(_exec)
 
 
@@ -1602,25 +2388,18 @@ class MaterialShare:
             return cursor.lastrowid
 
     @staticmethod
-    def get_all(category=None, source=None):
-        """获取素材列表，支持按分类和来源筛选"""
+    def get_page(page_cursor=None, limit=None, category=None, source=None, date_from=None, date_to=None):
+        """分页获取素材列表，支持按分类和来源筛选，返回 {'items': [...], 'next_cursor': ...}"""
+        conditions, params = [], []
+        if category and category != '全部':
+            conditions.append('m.category = ?')
+            params.append(category)
+        if source:
+            conditions.append('m.source LIKE ?')
+            params.append(f"%{source}%")
         with get_db() as conn:
-            cursor = conn.cursor()
-            query = "SELECT * FROM material_shares WHERE 1=1"
-            params = []
-            
-            if category and category != '全部':
-                query += " AND category = ?"
-                params.append(category)
-            
-            if source:
-                query += " AND source LIKE ?"
-                params.append(f"%{source}%")
-            
-            query += " ORDER BY created_at DESC"
-            
-            cursor.execute(query, params)
-            return [dict(row) for row in cursor.fetchall()]
+            return _keyset_page(conn.cursor(), 'SELECT m.* FROM material_shares m', 'm',
+                                conditions, params, limit, page_cursor, date_from, date_to)
 
     @staticmethod
     def delete(material_id):
@@ -1669,6 +2448,7 @@ class ProxyAddress:
                 SET protocol = ?, ip = ?, port = ?, username = ?, password = ?, description = ?, updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (protocol, ip, port, username, password, description, id))
+            on_transaction_end(_invalidate_proxy_cache)
 
     @staticmethod
     def delete(id):
@@ -1676,6 +2456,7 @@ class ProxyAddress:
         with get_db() as conn:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM proxy_addresses WHERE id = ?', (id,))
+            on_transaction_end(_invalidate_proxy_cache)
 
     @staticmethod
     def get_by_id(id):
@@ -0,0 +1,162 @@
+"""
+后台任务登记
+1. 耗时的管理操作（遍历所有 Team 调用 API 等）放到后台线程执行，接口立即返回 job_id
+2. 前端通过 /api/admin/jobs/<job_id> 轮询进度 (done/total) 和结果
+3. 同一个 key 的任务正在运行时不重复启动，直接返回已有任务
+4. 结束超过 JOB_RETENTION 秒的任务会被清理
+5. set_limit 限制某类任务同时运行的数量，超出的任务排队 (queued) 等待
+"""
+import threading
+import time
+import uuid
+
+from config import JOB_RETENTION
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class Job:
+    """单个后台任务的状态，进度字段由任务函数在执行过程中更新"""
+
+    def __init__(self, kind, key=None, total=0, status=RUNNING):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.key = key
+        self.status = status
+        self.total = total
+        self.done = 0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def advance(self, count=1, message=None):
+        """完成 count 个子任务"""
+        with self._lock:
+            self.done += count
+            if message is not None:
+                self.message = message
+
+    def cancel(self):
+        """请求取消，任务函数通过 cancelled 检查后自行退出"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    @property
+    def finished(self):
+        return self.status not in (QUEUED, RUNNING)
+
+    def mark_running(self):
+        with self._lock:
+            self.status = RUNNING
+
+    def finish(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'total': self.total,
+                'done': self.done,
+                'message': self.message,
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class JobRegistry:
+    """进程内的后台任务表"""
+
+    def __init__(self, retention=JOB_RETENTION):
+        self.retention = retention
+        self._jobs = {}
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def set_limit(self, kind, max_running):
+        """限制 kind 类任务最多同时运行 max_running 个"""
+        with self._lock:
+            self._limits[kind] = threading.BoundedSemaphore(max(1, max_running))
+
+    def start(self, kind, func, *args, key=None, total=0):
+        """
+        在后台线程中执行 func(job, *args)，返回 Job
+        func 的返回值作为任务结果；抛出异常时任务标记为失败
+        key 不为空时，同 kind + key 的任务还在运行（或排队）就直接返回它
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.kind == kind and job.key == key and not job.finished:
+                        return job
+            limit = self._limits.get(kind)
+            job = Job(kind, key, total, status=QUEUED if limit else RUNNING)
+            self._jobs[job.id] = job
+
+        def run():
+            if limit:
+                limit.acquire()
+            try:
+                if job.cancelled:
+                    # 排队期间被取消，不再执行
+                    job.finish(CANCELLED)
+                    return
+                job.mark_running()
+                result = func(job, *args)
+                job.finish(CANCELLED if job.cancelled else DONE, result=result)
+            except Exception as e:
+                print(f"❌ 后台任务 {kind} ({job.id}) 失败: {str(e)}")
+                job.finish(FAILED, error=str(e))
+            finally:
+                if limit:
+                    limit.release()
+
+        threading.Thread(target=run, daemon=True, name=f"job-{kind}-{job.id}").start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind=None):
+        """按创建时间倒序返回任务（可按 kind 过滤）"""
+        with self._lock:
+            self._prune()
+            jobs = [job for job in self._jobs.values() if kind is None or job.kind == kind]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)
+
+    def _prune(self):
+        """清理已结束且超过保留时间的任务（调用方持有锁）"""
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.retention]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+
+
+# 全局任务表
+job_registry = JobRegistry()
@@ -37,12 +37,13 @@ data = {
     "screen_hint": "login_or_signup"
 }
 
-headers['openai-sentinel-token'] = get_sentinel_token()
-
 def auth_continue(cookie_str,email, proxies=None):
-    headers['cookie'] = cookie_str
-    data['username']['value'] = email
-    response = requests.post(url, headers=headers, json=data, proxies=proxies)
+    # 每次调用使用独立的 headers / data，并发登录时互不覆盖
+    request_headers = dict(headers)
+    request_headers['cookie'] = cookie_str
+    request_headers['openai-sentinel-token'] = get_sentinel_token()
+    request_data = dict(data, username=dict(data['username'], value=email))
+    response = requests.post(url, headers=request_headers, json=request_data, proxies=proxies)
 
     print(response.text)
     cookie_str = "; ".join([f"{k}={v}" for k, v in response.cookies.items()])
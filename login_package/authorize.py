@@ -1,7 +1,6 @@
 import requests
 from cloudscraper import CloudScraper
 
-scraper = CloudScraper()
 
 
 headers = {
@@ -23,6 +22,8 @@ headers = {
 
 
 def authorize(url, proxies=None):
+    # 每次登录使用独立的 scraper (cookie jar)，并发登录时互不干扰
+    scraper = CloudScraper()
     response = scraper.get(url, headers=headers, allow_redirects=False, proxies=proxies)
 
     cookie_str = "; ".join([f"{k}={v}" for k, v in response.cookies.items()])
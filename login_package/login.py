@@ -4,6 +4,7 @@ from . import login_verify
 from . import session
 from . import red
 from . import openai
+from .sentinel_token import prewarm_tokens
 import time
 import json
 from collections import OrderedDict
@@ -64,6 +65,9 @@ def merge_cookie_str(*cookie_strs: str) -> str:
 
 def login(email, password, proxy_str=None):
     print('开始 login 流程')
+
+    # 后台预生成 sentinel token，auth_continue / login_verify 用到时通常已就绪
+    prewarm_tokens()
     
     proxies = parse_proxy_str(proxy_str)
     if proxies:
@@ -30,15 +30,16 @@ headers = {
 }
 url = "https://auth.openai.com/api/accounts/password/verify"
 
-headers['openai-sentinel-token'] = get_sentinel_token_by_flow('password_verify')
-
 def login_verify(cookies,email,password, proxies=None):
-    headers['cookie'] = cookies
+    # 每次调用使用独立的 headers，并发登录时互不覆盖
+    request_headers = dict(headers)
+    request_headers['cookie'] = cookies
+    request_headers['openai-sentinel-token'] = get_sentinel_token_by_flow('password_verify')
     data = {
         "username": email,
         "password": password
     }
-    response = requests.post(url, headers=headers,  json=data, proxies=proxies)
+    response = requests.post(url, headers=request_headers,  json=data, proxies=proxies)
 
     print(response.text)
     print(response)
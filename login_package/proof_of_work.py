@@ -3,6 +3,7 @@ from datetime import datetime, timedelta, timezone
 from .config import cores, cached_scripts, cached_dpl, navigator_key, document_key, window_key
 
 
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36"
 MAX_ITERATION = 500000
 
 def get_parse_time():
@@ -63,9 +64,9 @@ def get_requirements_token(config):
     solution, found = generate_answer(seed, diff, config)
     return 'gAAAAAC' + solution
 
-def get_pow_token():
-    config = get_config("Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36")
+def get_pow_token(user_agent=USER_AGENT):
+    config = get_config(user_agent)
     return get_requirements_token(config)
 
 if __name__ == "__main__":
-    print(get_pow_token())
\ No newline at end of file
+    print(get_pow_token())
@@ -2,7 +2,6 @@ import requests
 from cloudscraper import create_scraper
 from collections import OrderedDict
 
-scraper = create_scraper()
 
 headers = {
     "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
@@ -52,9 +51,12 @@ def merge_cookie_str(*cookie_strs: str) -> str:
 def redirect(url, cookies, proxies=None):
     full_url = url
     full_cookies = cookies
+    # 每次登录使用独立的 scraper (cookie jar) 和 headers，并发登录时互不干扰
+    scraper = create_scraper()
+    request_headers = dict(headers)
     for i in range(6):
-        headers["cookie"] = full_cookies
-        resp = scraper.get(full_url, headers=headers,allow_redirects=False, proxies=proxies)
+        request_headers["cookie"] = full_cookies
+        resp = scraper.get(full_url, headers=request_headers,allow_redirects=False, proxies=proxies)
         # 1) 抓原始 Set-Cookie（最完整）
         cookies = "; ".join([f"{k}={v}" for k, v in resp.cookies.items()])
         print(f'[{i}] {cookies}')
@@ -73,7 +75,7 @@ def redirect(url, cookies, proxies=None):
             break
 
         if 'https://chatgpt.com/api/auth/callback/openai?code' in location:
-            headers["referer"] = 'https://auth.openai.com/'
+            request_headers["referer"] = 'https://auth.openai.com/'
 
         # 4) 拼出下一跳绝对 URL
         full_url = location
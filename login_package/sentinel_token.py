@@ -1,9 +1,21 @@
-import requests, json
+"""
+sentinel token 生成
+token 只用于一次登录，取走即从缓存删除，不在多次登录之间复用；
+缓存只是登录开始时的预生成 (prewarm_tokens)，让后续步骤用到 token 时大多已经算好
+"""
+import requests, json, threading, time
 from uuid import uuid4
-from .proof_of_work import get_pow_token
+from .proof_of_work import get_pow_token, USER_AGENT
 
 current_parameters = None
 
+# sentinel token 缓存有效秒数，超时的 token 不再使用
+TOKEN_TTL = 300
+# take() 等待进行中的预生成最多多少秒，超时后自行同步计算
+PREWARM_WAIT = 3
+# 请求 /sentinel/req 的超时秒数
+REQUEST_TIMEOUT = 10
+
 
 def generate_id():
     return str(uuid4())
@@ -20,19 +32,21 @@ def fetch_requirements(flow, pow_token):
             response = requests.post(
                 url = "https://chatgpt.com/backend-api/sentinel/req",
                 data = generate_payload({'p': pow_token}, flow),
+                timeout = REQUEST_TIMEOUT,
             )
-            
+
             result = response.json()
             return result, True
         except requests.exceptions.RequestException as err:
             if attempt >= 2:
                 return generate_payload({'e': str(err)}, flow), False
 
-def refresh_token(flow):
-    pow_token = get_pow_token()
+def build_token(flow, user_agent=USER_AGENT):
+    """计算 PoW 并请求 /sentinel/req，返回 (token, 是否成功)；失败时 token 为带错误信息的 payload"""
+    pow_token = get_pow_token(user_agent)
     response,_ = fetch_requirements(flow, pow_token)
     if not _:
-        return response
+        return response, False
 
     try:
 
@@ -41,19 +55,85 @@ def refresh_token(flow):
             't': response.get("turnstile", {}).get('dx', ""),
             'c': response.get('token')
         }, flow)
-        return payload
+        return payload, True
     except Exception as err:
         failure = generate_payload({'e': str(err), 'p': pow_token}, flow)
-        return failure
+        return failure, False
+
+def refresh_token(flow):
+    token, _ = build_token(flow)
+    return token
+
+
+class SentinelTokenCache:
+    """
+    sentinel token 缓存
+    1. 以 (flow, user_agent) 为键，每个键最多缓存一个 TOKEN_TTL 内的 token
+    2. 只有 prewarm() 会在后台生成 token（登录开始时由 prewarm_tokens 调用），take() 取走后不自动补充
+    3. take() 取走缓存的 token（每个 token 只用于一次登录），正在预生成时等它完成，没有可用缓存时同步计算，失败的结果不缓存
+    """
+
+    def __init__(self, ttl=TOKEN_TTL):
+        self.ttl = ttl
+        # (flow, user_agent) -> (token, 生成时间)
+        self._tokens = {}
+        self._refreshing = set()
+        self._cond = threading.Condition()
+
+    def take(self, flow, user_agent=USER_AGENT):
+        key = (flow, user_agent)
+        with self._cond:
+            # 登录开始时已经在预生成，等它完成而不是再算一个
+            self._cond.wait_for(lambda: key not in self._refreshing, timeout=PREWARM_WAIT)
+            entry = self._tokens.pop(key, None)
+        if entry and time.time() - entry[1] < self.ttl:
+            token = entry[0]
+        else:
+            token, _ = build_token(flow, user_agent)
+        return token
+
+    def prewarm(self, flow, user_agent=USER_AGENT):
+        """缓存中没有可用 token 时在后台线程生成一个，返回是否启动了新任务"""
+        key = (flow, user_agent)
+        with self._cond:
+            entry = self._tokens.get(key)
+            if key in self._refreshing or (entry and time.time() - entry[1] < self.ttl):
+                return False
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                token, ok = build_token(flow, user_agent)
+                if ok:
+                    with self._cond:
+                        self._tokens[key] = (token, time.time())
+            except Exception as e:
+                print(f"预生成 sentinel token 失败 ({flow}): {e}")
+            finally:
+                with self._cond:
+                    self._refreshing.discard(key)
+                    self._cond.notify_all()
+
+        threading.Thread(target=run, daemon=True, name=f"sentinel-{flow}").start()
+        return True
+
+
+token_cache = SentinelTokenCache()
+
+
+def prewarm_tokens(flows=('authorize_continue', 'password_verify'), user_agent=USER_AGENT):
+    """登录开始时调用，后续步骤用到 token 时大多已经算好"""
+    for flow in flows:
+        token_cache.prewarm(flow, user_agent)
 
 def get_sentinel_token():
     flow = 'authorize_continue'
-    token = refresh_token(flow) #This can be used now in 'OpenAI-Sentinel-Token' header
+    token = token_cache.take(flow) #This can be used now in 'OpenAI-Sentinel-Token' header
     return token
 
 def get_sentinel_token_by_flow(flow):
-    token = refresh_token(flow)  # This can be used now in 'OpenAI-Sentinel-Token' header
+    token = token_cache.take(flow)  # This can be used now in 'OpenAI-Sentinel-Token' header
     return token
 
 if __name__ == "__main__":
-    print(get_sentinel_token())
\ No newline at end of file
+    print(get_sentinel_token())
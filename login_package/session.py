@@ -38,8 +38,8 @@ cookies = {
 url = "https://chatgpt.com/api/auth/session"
 
 def get_session(cookies, proxies=None):
-    headers['cookie'] = cookies
-    response = requests.get(url, headers=headers, proxies=proxies)
+    request_headers = dict(headers, cookie=cookies)
+    response = requests.get(url, headers=request_headers, proxies=proxies)
 
     print(response.text)
     print(response)
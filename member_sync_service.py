@@ -0,0 +1,223 @@
+"""
+成员同步服务
+1. sync_team_members: 把 API 返回的成员列表同步到数据库（成员数量 + member_notes + 快照哈希）
+   get_team_members: 拉取成员列表，维护检查成员的错误计数并写入成员缓存
+2. MemberSyncService: 后台按自适应节奏轮询所有 Team 的成员列表
+   - 最近有邀请、踢人或临时邀请到期的 Team 按 MEMBER_SYNC_ACTIVE_INTERVAL 同步
+   - 其他 Team 每次成员未变化间隔翻倍，最长 MEMBER_SYNC_IDLE_INTERVAL
+   - 成员快照哈希与上次相同时跳过写库
+"""
+import concurrent.futures
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+from config import (
+    MEMBER_SYNC_TICK, MEMBER_SYNC_ACTIVE_INTERVAL, MEMBER_SYNC_IDLE_INTERVAL,
+    MEMBER_SYNC_ACTIVE_WINDOW, MEMBER_SYNC_WORKERS
+)
+from database import get_db, Team, MemberNote, Invitation
+from chatgpt_client import ChatGPTTeamClient
+from members_cache import members_cache
+
+
+def parse_member_join_time(member):
+    """
+    API 返回的是 created_time (ISO 8601 string)，例如 "2025-12-11T07:45:52.666554Z"
+    数据库需要的是 join_time (Unix timestamp int)，解析失败时使用 created 字段（旧版API）
+    """
+    created_time_str = member.get('created_time')
+    if created_time_str:
+        try:
+            # 处理 Z 结尾
+            if created_time_str.endswith('Z'):
+                created_time_str = created_time_str.replace('Z', '+00:00')
+            return int(datetime.fromisoformat(created_time_str).timestamp())
+        except Exception as e:
+            print(f"Error parsing created_time: {e}")
+    return member.get('created')
+
+
+def members_snapshot_hash(members):
+    """成员快照哈希：只包含写入数据库的字段，与成员顺序无关"""
+    snapshot = sorted(
+        (member.get('id') or '', member.get('email') or '', member.get('role') or '',
+         str(member.get('created_time') or member.get('created') or ''))
+        for member in members
+    )
+    return hashlib.sha1(json.dumps(snapshot).encode('utf-8')).hexdigest()
+
+
+def sync_team_members(team_id, members):
+    """
+    把 API 返回的成员列表同步到数据库（成员数量 + member_notes），返回非所有者成员数
+    所有写入共用一个连接，在同一个事务中完成
+    """
+    non_owner_count = len([m for m in members if m.get('role') != 'account-owner'])
+    snapshot = [{
+        'user_id': member.get('id'),
+        'email': member.get('email'),
+        'role': member.get('role'),
+        'join_time': parse_member_join_time(member)
+    } for member in members if member.get('id')]
+
+    with get_db():
+        Team.update_member_count(team_id, non_owner_count)
+        # 新增/变化的成员批量写入，已退出的成员删除
+        MemberNote.sync_team(team_id, snapshot)
+        # 同步清理失效的邀请记录 (修复成员已踢出但邀请记录占位的问题)
+        current_emails = [m.get('email') for m in members if m.get('email')]
+        Invitation.sync_invitations(team_id, current_emails)
+        Team.update_members_snapshot(team_id, members_snapshot_hash(members))
+    return non_owner_count
+
+
+def get_team_members(access_token, account_id, team_id=None, background=False):
+    """获取 Team 成员列表（实时请求，传入 team_id 时结果同时写入成员缓存）"""
+    generation = members_cache.generation(team_id) if team_id else None
+    result = ChatGPTTeamClient(access_token, account_id, background=background).get_members()
+    if result.success:
+        # 成功时重置检查成员的错误计数
+        if team_id:
+            Team.reset_member_check_error(team_id)
+            members_cache.put(team_id, result.data, generation)
+        return {"success": True, "members": result.data}
+    if result.status_code is None:
+        return {"success": False, "error": result.error}
+    if result.unauthorized and team_id:
+        # 检测到401，增加检查成员的错误计数（10分钟内超过3次才标记为过期）
+        status = Team.increment_member_check_error(team_id)
+        if status and status['token_status'] == 'expired':
+            return {
+                "success": False,
+                "error": "Token已过期（检查成员失败次数过多），请更新该Team的Token",
+                "error_code": "TOKEN_EXPIRED",
+                "status_code": 401
+            }
+    return {"success": False, "error": result.error, "status_code": result.status_code}
+
+
+class MemberSyncService:
+    def __init__(self):
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+        # team_id -> 下次同步时间 / 连续未变化次数
+        self._next_sync = {}
+        self._unchanged = {}
+        self.stats = {'synced': 0, 'unchanged': 0, 'failed': 0}
+
+    def start(self):
+        """启动成员同步服务"""
+        if self.running:
+            print("⚠️  成员同步服务已在运行中")
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.thread.start()
+        print("✅ 成员同步服务已启动")
+
+    def stop(self):
+        """停止成员同步服务"""
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+        print("🛑 成员同步服务已停止")
+
+    def _run_loop(self):
+        """主循环：每 MEMBER_SYNC_TICK 秒检查一次哪些 Team 到了同步时间"""
+        while self.running:
+            try:
+                self.sync_due_teams()
+            except Exception as e:
+                print(f"❌ 成员同步服务出错: {str(e)}")
+            self._stop_event.wait(MEMBER_SYNC_TICK)
+
+    def sync_due_teams(self):
+        """同步所有到期的 Team，返回本轮同步的 Team 数"""
+        now = time.time()
+        teams = [t for t in Team.get_all() if t.get('token_status') != 'expired']
+        # 清理已删除/已过期 Team 的调度状态
+        team_ids = {t['id'] for t in teams}
+        for team_id in list(self._next_sync):
+            if team_id not in team_ids:
+                self._next_sync.pop(team_id, None)
+                self._unchanged.pop(team_id, None)
+        for team in teams:
+            if team['id'] not in self._next_sync:
+                # 首次发现的 Team 随机错开，避免启动时集中请求
+                self._next_sync[team['id']] = now + random.uniform(0, MEMBER_SYNC_ACTIVE_INTERVAL)
+
+        due = [t for t in teams if self._next_sync[t['id']] <= now]
+        if not due:
+            return 0
+
+        active_ids = Team.get_recently_active_ids(MEMBER_SYNC_ACTIVE_WINDOW)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MEMBER_SYNC_WORKERS) as executor:
+            results = list(executor.map(self._sync_team_safe, due))
+
+        for team, changed in zip(due, results):
+            self._schedule(team['id'], changed, team['id'] in active_ids)
+            self.stats[{True: 'synced', False: 'unchanged', None: 'failed'}[changed]] += 1
+        return len(due)
+
+    def _schedule(self, team_id, changed, active):
+        """根据活跃程度和本次是否有变化安排下次同步时间"""
+        if changed or active:
+            self._unchanged[team_id] = 0
+        else:
+            self._unchanged[team_id] = self._unchanged.get(team_id, 0) + 1
+
+        if active:
+            interval = MEMBER_SYNC_ACTIVE_INTERVAL
+        else:
+            interval = min(MEMBER_SYNC_IDLE_INTERVAL,
+                           MEMBER_SYNC_ACTIVE_INTERVAL * 2 ** self._unchanged[team_id])
+        # 加 10% 抖动，避免大量 Team 在同一时刻到期
+        self._next_sync[team_id] = time.time() + interval * random.uniform(1.0, 1.1)
+
+    def _sync_team_safe(self, team):
+        """线程安全的单个 Team 同步包装器，返回 True(有变化) / False(无变化) / None(失败)"""
+        try:
+            changed = self._sync_team(team)
+        except Exception as e:
+            print(f"❌ 同步 Team {team['name']} 成员时出错: {str(e)}")
+            changed = None
+        return changed
+
+    def _sync_team(self, team):
+        """拉取一个 Team 的成员列表，快照变化时写库"""
+        # 经由 get_team_members：401 计入错误计数（Token 过期会被标记），成功时重置计数并写入成员缓存
+        result = get_team_members(team['access_token'], team['account_id'], team['id'], background=True)
+        if not result['success']:
+            error_msg = f"状态码: {result['status_code']}" if result.get('status_code') else result['error']
+            print(f"   ⚠️  同步 Team {team['name']} 成员失败: {error_msg}")
+            return None
+
+        members = result['members'] or []
+        if members_snapshot_hash(members) == team.get('members_hash'):
+            return False
+
+        sync_team_members(team['id'], members)
+        print(f"   🔄 Team {team['name']} 成员已同步 ({len(members)} 人)")
+        return True
+
+    def get_status(self):
+        """获取同步服务状态"""
+        now = time.time()
+        return {
+            'running': self.running,
+            'tracked_teams': len(self._next_sync),
+            'due_teams': len([t for t in self._next_sync.values() if t <= now]),
+            'stats': dict(self.stats)
+        }
+
+
+# 全局实例
+member_sync_service = MemberSyncService()
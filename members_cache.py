@@ -0,0 +1,125 @@
+"""
+Team 成员列表缓存
+1. 以 team_id 为键，保存最近一次从 chatgpt.com 拉取的成员列表和拉取时间
+2. 新鲜期 (MEMBERS_CACHE_TTL) 内直接使用；过了新鲜期但未超过 MEMBERS_CACHE_STALE_TTL 时先返回旧数据，再在后台线程刷新
+3. 踢人成功后从缓存中移除该成员，邀请成功后把缓存标记为过期，刷新接口拉取后直接写入
+"""
+import threading
+import time
+
+from config import MEMBERS_CACHE_TTL, MEMBERS_CACHE_STALE_TTL
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+
+class MembersCache:
+    """
+    进程内的成员列表缓存
+    每个 Team 维护一个版本号，失效/移除成员时加一；
+    拉取开始前记下版本号，写回时版本号已变化则丢弃结果，避免旧数据覆盖踢人后的缓存
+    """
+
+    def __init__(self, ttl=MEMBERS_CACHE_TTL, stale_ttl=MEMBERS_CACHE_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = max(ttl, stale_ttl)
+        # team_id -> {'members': [...], 'fetched_at': 时间戳, 'expired': 是否被标记过期}
+        self._entries = {}
+        self._generations = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def generation(self, team_id):
+        """返回 Team 当前的缓存版本号，拉取成员前调用"""
+        with self._lock:
+            return self._generations.get(team_id, 0)
+
+    def _bump(self, team_id):
+        self._generations[team_id] = self._generations.get(team_id, 0) + 1
+
+    def put(self, team_id, members, generation=None):
+        """
+        写入拉取结果
+        generation 为拉取前的版本号，期间缓存被修改过则不写入，返回是否写入
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations.get(team_id, 0):
+                return False
+            self._entries[team_id] = {
+                'members': [dict(m) for m in members or []],
+                'fetched_at': time.time(),
+                'expired': False,
+            }
+            return True
+
+    def lookup(self, team_id):
+        """
+        返回 (成员列表副本, 状态)
+        状态为 FRESH / STALE；没有缓存或缓存太旧时返回 (None, None)
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(team_id)
+            if not entry:
+                return None, None
+            age = now - entry['fetched_at']
+            if age >= self.stale_ttl:
+                return None, None
+            state = STALE if entry['expired'] or age >= self.ttl else FRESH
+            return [dict(m) for m in entry['members']], state
+
+    def remove_member(self, team_id, user_id):
+        """踢人成功后把该成员从缓存中移除"""
+        with self._lock:
+            self._bump(team_id)
+            entry = self._entries.get(team_id)
+            if entry:
+                entry['members'] = [m for m in entry['members'] if m.get('id') != user_id]
+
+    def expire(self, team_id):
+        """
+        标记缓存过期（邀请成功后调用）
+        旧数据仍可在过期窗口内返回，但下次读取会触发后台刷新
+        """
+        with self._lock:
+            self._bump(team_id)
+            entry = self._entries.get(team_id)
+            if entry:
+                entry['expired'] = True
+
+    def invalidate(self, team_id=None):
+        """删除缓存，team_id 为空时清空全部"""
+        with self._lock:
+            if team_id is None:
+                for key in list(self._generations):
+                    self._bump(key)
+                self._entries.clear()
+            else:
+                self._bump(team_id)
+                self._entries.pop(team_id, None)
+
+    def revalidate(self, team_id, fetch):
+        """
+        在后台线程中调用 fetch() 刷新缓存（fetch 负责写回）
+        同一个 Team 同时只会有一个刷新任务，返回是否启动了新任务
+        """
+        with self._lock:
+            if team_id in self._refreshing:
+                return False
+            self._refreshing.add(team_id)
+
+        def run():
+            try:
+                fetch()
+            except Exception as e:
+                print(f"⚠️ 后台刷新 Team {team_id} 成员列表失败: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(team_id)
+
+        threading.Thread(target=run, daemon=True, name=f"members-refresh-{team_id}").start()
+        return True
+
+
+# 全局成员缓存
+members_cache = MembersCache()
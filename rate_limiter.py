@@ -0,0 +1,228 @@
+"""
+令牌桶限流
+1. TokenBucket: 同一个桶既可以在线程中阻塞等待 (acquire)，也可以在 asyncio 协程中等待 (acquire_async)
+2. RateLimiter: 所有 chatgpt.com 请求共用的限流器，按代理和 account_id 分桶，后台任务为交互请求让路
+"""
+import asyncio
+import threading
+import time
+
+from config import RATE_LIMIT_CONFIG_TTL
+
+
+class TokenBucket:
+    """
+    令牌桶：以 rate 个/秒的速度补充令牌，最多积攒 capacity 个
+    取令牌时如果不够，返回/等待到下一个令牌可用的时间
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        # 最近一次取走令牌的时间，用于清理长期空闲的桶
+        self._used_at = self._updated_at
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def update(self, rate, capacity=None):
+        """调整速率（配置变更后调用，已积攒的令牌按新容量截断）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+            self._tokens = min(self._tokens, self.capacity)
+
+    def reserve(self, tokens=1):
+        """
+        预定令牌，返回需要等待的秒数（0 表示立即可用）
+        令牌被预先扣除，调用方等待返回的时间后即可发送请求
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            self._used_at = now
+            if self._tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self, tokens=1, keep=0):
+        """
+        桶内至少剩余 tokens + keep 个令牌时才取走，返回 0；否则不扣令牌，返回建议等待的秒数
+        keep 为给交互请求预留的令牌数；交互请求预定造成的欠账 (令牌为负) 也会让这里失败
+        keep 最多按 capacity - tokens 计算，突发上限不大于预留值时桶满也能取到令牌
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            keep = min(keep, max(0.0, self.capacity - tokens))
+            if self.rate <= 0 or self._tokens >= tokens + keep:
+                self._tokens -= tokens
+                self._used_at = now
+                return 0.0
+            return (tokens + keep - self._tokens) / self.rate
+
+    def refund(self, tokens=1):
+        """归还已取走的令牌，最多补到 capacity"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def idle_for(self, now):
+        """桶已补满时返回距最近一次取令牌的秒数，未补满返回 0"""
+        with self._lock:
+            self._refill(now)
+            if self._tokens < self.capacity:
+                return 0.0
+            return now - self._used_at
+
+    def acquire(self, tokens=1):
+        """阻塞直到拿到令牌"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """协程版本的 acquire"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# SystemConfig 中的限流配置及默认值（配置项由数据库迁移 v4 写入）
+RATE_LIMIT_DEFAULTS = {
+    'rate_limit_proxy_per_second': 5,
+    'rate_limit_proxy_burst': 10,
+    'rate_limit_account_per_second': 2,
+    'rate_limit_account_burst': 4,
+    'rate_limit_background_reserve': 2,
+}
+
+
+class RateLimiter:
+    """
+    chatgpt.com 请求的中央限流器
+    每个请求发送前都要同时从"代理桶"和"账号桶"各取一个令牌。
+    交互请求 (用户加入、管理员操作) 直接预定令牌，必要时排队等待；
+    后台请求 (自动检测扫描等) 只有在桶内余量超过预留值、且没有交互请求排队时才能取到令牌，
+    因此扫描与用户请求同时打到同一代理时，扫描会自动让路。
+    """
+
+    # 后台请求单次等待的上限，到点后重新检查（期间可能有交互请求插队）
+    BACKGROUND_POLL_MAX = 1.0
+    # 桶补满后空闲超过该秒数即清理（已删除的 Team/代理不再占用内存，重新创建的桶状态相同）
+    BUCKET_IDLE_TIMEOUT = 600
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._settings = None
+        self._settings_loaded_at = 0
+
+    def invalidate(self):
+        """配置变更后调用，下次取令牌时重新读取 SystemConfig"""
+        with self._lock:
+            self._settings = None
+
+    def _load_settings(self):
+        from database import SystemConfig
+        values = SystemConfig.get_all()
+
+        def number(key):
+            default = RATE_LIMIT_DEFAULTS[key]
+            try:
+                return float(values.get(key) or default)
+            except (TypeError, ValueError):
+                return float(default)
+
+        return {
+            'proxy': (number('rate_limit_proxy_per_second'), number('rate_limit_proxy_burst')),
+            'account': (number('rate_limit_account_per_second'), number('rate_limit_account_burst')),
+            'reserve': number('rate_limit_background_reserve'),
+        }
+
+    def _get_settings(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._settings is not None and now - self._settings_loaded_at < RATE_LIMIT_CONFIG_TTL:
+                return self._settings
+        settings = self._load_settings()
+        with self._lock:
+            changed = self._settings != settings
+            self._settings = settings
+            self._settings_loaded_at = now
+            if changed:
+                # 配置变化时同步调整已有的桶
+                for (kind, _), bucket in self._buckets.items():
+                    bucket.update(*settings[kind])
+            # 每次重新读取配置时顺带清理空闲的桶
+            for key, bucket in list(self._buckets.items()):
+                if bucket.idle_for(now) > self.BUCKET_IDLE_TIMEOUT:
+                    del self._buckets[key]
+        return settings
+
+    def _bucket(self, kind, key, settings):
+        with self._lock:
+            bucket = self._buckets.get((kind, key))
+            if bucket is None:
+                bucket = TokenBucket(*settings[kind])
+                self._buckets[(kind, key)] = bucket
+            return bucket
+
+    def _buckets_for(self, proxy_key, account_id):
+        settings = self._get_settings()
+        buckets = [self._bucket('proxy', proxy_key or 'direct', settings)]
+        if account_id:
+            buckets.append(self._bucket('account', account_id, settings))
+        return buckets, settings['reserve']
+
+    @staticmethod
+    def _try_all(buckets, keep):
+        """后台请求：所有桶都有余量时才一起扣令牌，返回需要等待的秒数"""
+        waits = [bucket.try_acquire(keep=keep) for bucket in buckets]
+        if any(waits):
+            # 已经扣掉的桶归还令牌，避免部分占用
+            for bucket, wait in zip(buckets, waits):
+                if not wait:
+                    bucket.refund()
+            return max(waits)
+        return 0.0
+
+    def acquire(self, proxy_key=None, account_id=None, background=False):
+        """线程中阻塞直到可以发送请求"""
+        buckets, keep = self._buckets_for(proxy_key, account_id)
+        if not background:
+            wait = max(bucket.reserve() for bucket in buckets)
+            if wait > 0:
+                time.sleep(wait)
+            return
+        while True:
+            wait = self._try_all(buckets, keep)
+            if not wait:
+                return
+            time.sleep(min(wait, self.BACKGROUND_POLL_MAX))
+
+    async def acquire_async(self, proxy_key=None, account_id=None, background=False):
+        """acquire 的协程版本（配置读取走线程，避免阻塞事件循环）"""
+        buckets, keep = await asyncio.to_thread(self._buckets_for, proxy_key, account_id)
+        if not background:
+            wait = max(bucket.reserve() for bucket in buckets)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return
+        while True:
+            wait = self._try_all(buckets, keep)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, self.BACKGROUND_POLL_MAX))
+
+
+# 全局限流器
+rate_limiter = RateLimiter()
@@ -0,0 +1,157 @@
+"""
+临时邀请到期调度
+1. 内存最小堆保存所有未确认临时邀请的到期时间 (temp_expire_at)，启动时从数据库重建一次
+2. Invitation.create / confirm 提交后通知调度器，不再每轮检测都查询 invitations 表
+3. 专用定时线程睡到最早的到期时间，到点把到期的邀请交给处理函数（自动踢人服务）
+4. 处理函数返回需要稍后再试的邀请 id（成员还没进组、请求失败等），TEMP_EXPIRY_RETRY 秒后再次触发
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
+
+from config import TEMP_EXPIRY_RETRY
+
+
+def parse_expire_at(value):
+    """temp_expire_at (UTC 'YYYY-MM-DD HH:MM:SS') 转为时间戳，已经是数字时原样返回"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.strptime(str(value)[:19].replace('T', ' '), '%Y-%m-%d %H:%M:%S')
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class TempExpiryScheduler:
+    """
+    到期时间最小堆 + 定时线程
+    堆中元素为 (到期时间戳, invitation_id)；取消/改期时只更新 _deadlines，
+    旧的堆元素在弹出时与 _deadlines 对不上即丢弃（惰性删除）
+    """
+
+    def __init__(self, retry_delay=TEMP_EXPIRY_RETRY):
+        self.retry_delay = retry_delay
+        self.running = False
+        self.thread = None
+        self.handler = None
+        self._heap = []
+        self._deadlines = {}
+        self._cond = threading.Condition()
+        self.stats = {'fired': 0, 'retried': 0}
+
+    def start(self, handler):
+        """
+        从数据库重建到期堆并启动定时线程
+        handler(invitation_ids) 处理到期的邀请，返回需要重试的 id 列表
+        """
+        from database import Invitation
+
+        if self.running:
+            print("⚠️  临时邀请到期调度已在运行中")
+            return
+
+        pending = Invitation.get_temp_pending()
+        with self._cond:
+            self.handler = handler
+            self._heap = []
+            self._deadlines = {}
+            for invitation in pending:
+                self._push(invitation['id'], parse_expire_at(invitation['temp_expire_at']))
+            self.running = True
+
+        self.thread = threading.Thread(target=self._run_loop, daemon=True, name='temp-expiry')
+        self.thread.start()
+        print(f"✅ 临时邀请到期调度已启动 ({len(pending)} 个待到期)")
+
+    def stop(self):
+        """停止定时线程"""
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5)
+        print("🛑 临时邀请到期调度已停止")
+
+    def _push(self, invitation_id, deadline):
+        """加入/改期（调用方持有锁），返回是否成为新的最早到期"""
+        self._deadlines[invitation_id] = deadline
+        heapq.heappush(self._heap, (deadline, invitation_id))
+        return self._heap[0] == (deadline, invitation_id)
+
+    def schedule(self, invitation_id, temp_expire_at):
+        """新增或修改一个邀请的到期时间"""
+        try:
+            deadline = parse_expire_at(temp_expire_at)
+        except (TypeError, ValueError):
+            print(f"⚠️ 临时邀请 {invitation_id} 的到期时间无法解析: {temp_expire_at}")
+            return
+        with self._cond:
+            if self._push(invitation_id, deadline):
+                # 最早到期时间提前了，唤醒定时线程重新计算等待时间
+                self._cond.notify()
+
+    def cancel(self, invitation_id):
+        """取消一个邀请的到期处理（确认邀请后调用）"""
+        with self._cond:
+            self._deadlines.pop(invitation_id, None)
+
+    def _pop_due(self, now):
+        """弹出所有已到期的邀请 id（调用方持有锁）"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, invitation_id = heapq.heappop(self._heap)
+            if self._deadlines.get(invitation_id) == deadline:
+                del self._deadlines[invitation_id]
+                due.append(invitation_id)
+        return due
+
+    def _next_wait(self, now):
+        """距离下一个有效到期时间的秒数，堆为空时返回 None（一直等到被通知）"""
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - now)
+
+    def _run_loop(self):
+        """定时线程：睡到最早的到期时间，到点后处理所有到期的邀请"""
+        while True:
+            with self._cond:
+                if not self.running:
+                    return
+                now = time.time()
+                due = self._pop_due(now)
+                if not due:
+                    self._cond.wait(self._next_wait(now))
+                    continue
+                handler = self.handler
+
+            self.stats['fired'] += len(due)
+            try:
+                retry_ids = handler(due) or []
+            except Exception as e:
+                print(f"❌ 处理到期临时邀请出错: {str(e)}")
+                retry_ids = due
+
+            if retry_ids:
+                self.stats['retried'] += len(retry_ids)
+                retry_at = time.time() + self.retry_delay
+                with self._cond:
+                    for invitation_id in retry_ids:
+                        # 处理期间被确认或改期的邀请不再重试
+                        if invitation_id not in self._deadlines:
+                            self._push(invitation_id, retry_at)
+
+    def get_status(self):
+        """获取调度状态"""
+        with self._cond:
+            next_wait = self._next_wait(time.time())
+            return {
+                'running': self.running,
+                'pending': len(self._deadlines),
+                'next_in_seconds': round(next_wait, 1) if next_wait is not None else None,
+                'stats': dict(self.stats)
+            }
+
+
+# 全局实例
+temp_expiry_scheduler = TempExpiryScheduler()
@@ -1,21 +1,46 @@
+import threading
+import time
+
+from config import PROXY_CACHE_TTL
 from database import Team, ProxyAddress
 
-def get_proxies_by_account(account_id):
+# account_id -> (代理字典, 过期时间)
+_proxy_cache = {}
+_proxy_cache_lock = threading.Lock()
+# 每次失效加一，用于丢弃失效前开始、失效后才写回的旧结果
+_proxy_cache_generation = 0
+
+
+def invalidate_proxy_cache(account_id=None):
     """
-    根据 account_id 获取 requests 兼容的代理字典
+    清空代理解析缓存（Team 的代理设置或代理地址变更后调用）
+    account_id 为空时清空全部
     """
-    if not account_id:
-        return None
+    global _proxy_cache_generation
+    with _proxy_cache_lock:
+        _proxy_cache_generation += 1
+        if account_id is None:
+            _proxy_cache.clear()
+        else:
+            _proxy_cache.pop(account_id, None)
+
 
+def _resolve_proxies(account_id):
+    """
+    查库解析代理，返回 (代理字典, 是否可缓存)
+    找不到 Team 时不缓存，避免 Team 刚创建时命中"无代理"的旧结果
+    """
     # 1. 查找 Team
     team = Team.get_by_account_id(account_id)
-    if not team or not team.get('proxy_id'):
-        return None
+    if not team:
+        return None, False
+    if not team.get('proxy_id'):
+        return None, True
 
     # 2. 查找 Proxy
     proxy = ProxyAddress.get_by_id(team['proxy_id'])
     if not proxy:
-        return None
+        return None, True
 
     # 3. 构造代理字符串
     protocol = proxy['protocol']  # http, socks5 等
@@ -34,4 +59,28 @@ def get_proxies_by_account(account_id):
     return {
         "http": proxy_url,
         "https": proxy_url
-    }
+    }, True
+
+
+def get_proxies_by_account(account_id):
+    """
+    根据 account_id 获取 requests 兼容的代理字典
+    结果缓存在进程内，Team/代理变更时显式失效，PROXY_CACHE_TTL 秒后也会自动过期
+    """
+    if not account_id:
+        return None
+
+    now = time.time()
+    with _proxy_cache_lock:
+        cached = _proxy_cache.get(account_id)
+        if cached and cached[1] > now:
+            return dict(cached[0]) if cached[0] else None
+        generation = _proxy_cache_generation
+
+    proxies, cacheable = _resolve_proxies(account_id)
+
+    if cacheable:
+        with _proxy_cache_lock:
+            if generation == _proxy_cache_generation:
+                _proxy_cache[account_id] = (proxies, now + PROXY_CACHE_TTL)
+    return dict(proxies) if proxies else None